@@ -1,27 +1,68 @@
-from flask import Flask, render_template, request, url_for, send_from_directory, jsonify
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Request, Response, g, render_template, request, url_for, send_from_directory, jsonify, make_response
+from werkzeug.exceptions import RequestEntityTooLarge
+import io
 import numpy as np
 import os
 import json
-from utils import get_recommendations, get_production_df, crop_df, CROP_NAMES_HINDI
+from utils import get_recommendations, build_recommendation_table, get_production_df, crop_item
+from entities import crops, states, STATE_NAMES_HINDI, LISTED_STATE_IDS, state_of_subdivision
+from yield_index import build_yield_index
+from datacache import load_frame, source_path, source_signature, CACHE_DIR
+from forecast_cache import FORECAST_ENGINE, ForecastCache
+from rainfall_cube import RainfallCube
+from batching import MicroBatcher
+from work_pool import WorkPool, Overloaded, check_cancelled
+from model_runtime import load_inference_model, TFLiteModel
+from model_registry import ModelRegistry, LoadedModel
+from prediction_cache import PredictionCache, file_version, image_key
+from warmup import Warmup, WARMUP_MODE
+from http_cache import json_response, gzip_response, PageCache
+from instrumentation import timed, observe_request, server_timing, prometheus_text, debug_enabled, log
+from leaf_colors import classify_colors
+from image_pipeline import read_upload, decode_rgb, crop_leaf, wait_for_save, timing_stats, KEEP_UPLOADS
+from upload_store import UploadStore
+from crop_images import load_variants, source_files, is_variant_name, VARIANTS_DIR, IMMUTABLE_MAX_AGE
 import pandas as pd
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-import cv2
-import tensorflow as tf
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Uploads are capped by MAX_CONTENT_LENGTH and read into memory anyway,
+        # so do not spool the larger ones to a temporary file first
+        return io.BytesIO()
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 
 # Get the base directory (where app.py is located)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 app.config['UPLOAD_FOLDER'] = os.path.join(BASE_DIR, 'Uploads')
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Werkzeug stops reading a request body past this size and answers 413
+MAX_UPLOAD_MB = float(os.environ.get('AGRIBUDDY_MAX_UPLOAD_MB', '16'))
+app.config['MAX_CONTENT_LENGTH'] = int(MAX_UPLOAD_MB * 1024 * 1024)
+# Photos shown back to the user, named by content hash and evicted by age and total size
+upload_store = UploadStore(app.config['UPLOAD_FOLDER'])
 
 # --- LOAD MODELS AND INDICES AT STARTUP ---
-print("TensorFlow version:", tf.__version__)
 print(f"Base directory: {BASE_DIR}")
-print("Attempting to load soil model and indices...")
-try:
+# Models are loaded once, on first use or during warmup, and idle ones may be
+# unloaded again under AGRIBUDDY_MODEL_MEMORY_MB
+models = ModelRegistry()
+
+# Repeat uploads of the same photo reuse the earlier prediction
+soil_cache = PredictionCache('soil')
+disease_cache = PredictionCache('disease')
+
+def model_version(model, model_path, indices_path):
+    """Version of a loaded model: its .h5, class indices and TFLite artifact files."""
+    artifact = model.path if isinstance(model, TFLiteModel) else None
+    return file_version(model_path, indices_path, artifact)
+
+def load_soil_model():
+    """Loader for the 'soil' model, with class names by index."""
+    print("Attempting to load soil model and indices...")
     model_path = os.path.join(BASE_DIR, 'models', 'soil_model.h5')
     indices_path = os.path.join(BASE_DIR, 'models', 'class_indices.json')
     print(f"Loading model from: {model_path}")
@@ -30,162 +71,95 @@ try:
         raise FileNotFoundError(f"Model file not found at: {model_path}")
     if not os.path.exists(indices_path):
         raise FileNotFoundError(f"Indices file not found at: {indices_path}")
-    # Try loading with compile=False for TensorFlow 2.20+ compatibility
-    try:
-        soil_model = load_model(model_path, compile=False)
-    except Exception as e1:
-        print(f"Warning: Failed to load with compile=False, trying default: {e1}")
-        soil_model = load_model(model_path)
+    model = load_inference_model(model_path)
     print("Soil model loaded successfully.")
     with open(indices_path, 'r') as f:
         soil_class_indices = json.load(f)
-        soil_class_names = {v: k for k, v in soil_class_indices.items()}
+        class_names = {v: k for k, v in soil_class_indices.items()}
+    soil_cache.set_version(model_version(model, model_path, indices_path))
     print("Soil class indices loaded successfully.")
-except Exception as e:
-    print(f"CRITICAL ERROR: Failed to load soil model or class indices: {e}")
-    import traceback
-    traceback.print_exc()
-    soil_model, soil_class_names = None, {}
+    return LoadedModel(model, class_names)
 
-# Global variables for lazy loading disease model
-disease_model = None
-disease_class_names = None
+# Concurrent predictions for the same model share one batched forward pass
+soil_batcher = MicroBatcher(lambda batch: models.get('soil').model.predict(batch, verbose=0), name='soil')
+disease_batcher = MicroBatcher(lambda batch: models.get('disease').model.predict(batch, verbose=0), name='disease')
 
-# Load rainfall data
-try:
-    df = pd.read_csv(os.path.join(BASE_DIR, "Sub_Division_IMD_2017.csv"))
-    df.columns = df.columns.str.strip()
-    month_columns = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
-    df_melted = df.melt(id_vars=["SUBDIVISION", "YEAR"], var_name="MONTH", value_name="RAINFALL")
-    df_melted = df_melted[df_melted['MONTH'].isin(month_columns)]
-    df_melted = df_melted.dropna(subset=["RAINFALL"])
-    historical_mean = df_melted['RAINFALL'].mean()
-    sub_historical_mean = df_melted.groupby('SUBDIVISION')['RAINFALL'].mean().to_dict()
-    month_num = {'JAN':1, 'FEB':2, 'MAR':3, 'APR':4, 'MAY':5, 'JUN':6, 'JUL':7, 'AUG':8, 'SEP':9, 'OCT':10, 'NOV':11, 'DEC':12}
-except Exception as e:
-    print(f"Warning: Rainfall data not loaded: {e}")
-    df, df_melted, historical_mean = pd.DataFrame(), pd.DataFrame(), 233.30
-    sub_historical_mean = {}
-
-# --- Corrected list of States and UTs ---
-STATE_NAMES_ENGLISH = [
-    'Andaman and Nicobar Islands', 'Andhra Pradesh', 'Arunachal Pradesh', 'Assam', 'Bihar',
-    'Chandigarh', 'Chhattisgarh', 'Dadra and Nagar Haveli and Daman and Diu', 'Delhi', 'Goa',
-    'Gujarat', 'Haryana', 'Himachal Pradesh', 'Jammu and Kashmir', 'Jharkhand', 'Karnataka',
-    'Kerala', 'Ladakh', 'Lakshadweep', 'Madhya Pradesh', 'Maharashtra', 'Manipur', 'Meghalaya',
-    'Mizoram', 'Nagaland', 'Odisha', 'Puducherry', 'Punjab', 'Rajasthan', 'Sikkim', 'Tamil Nadu',
-    'Telangana', 'Tripura', 'Uttar Pradesh', 'Uttarakhand', 'West Bengal'
-]
-
-STATE_NAMES_HINDI = {
-    'Andaman and Nicobar Islands': 'अंडमान और निकोबार द्वीप समूह',
-    'Andhra Pradesh': 'आंध्र प्रदेश',
-    'Arunachal Pradesh': 'अरुणाचल प्रदेश',
-    'Assam': 'असम',
-    'Bihar': 'बिहार',
-    'Chandigarh': 'चंडीगढ़',
-    'Chhattisgarh': 'छत्तीसगढ़',
-    'Dadra and Nagar Haveli and Daman and Diu': 'दादरा और नगर हवेली और दमन और दीव',
-    'Delhi': 'दिल्ली',
-    'Goa': 'गोवा',
-    'Gujarat': 'गुजरात',
-    'Haryana': 'हरियाणा',
-    'Himachal Pradesh': 'हिमाचल प्रदेश',
-    'Jammu and Kashmir': 'जम्मू और कश्मीर',
-    'Jharkhand': 'झारखंड',
-    'Karnataka': 'कर्नाटक',
-    'Kerala': 'केरल',
-    'Ladakh': 'लद्दाख',
-    'Lakshadweep': 'लक्षद्वीप',
-    'Madhya Pradesh': 'मध्य प्रदेश',
-    'Maharashtra': 'महाराष्ट्र',
-    'Manipur': 'मणिपुर',
-    'Meghalaya': 'मेघालय',
-    'Mizoram': 'मिजोरम',
-    'Nagaland': 'नागालैंड',
-    'Odisha': 'ओडिशा',
-    'Puducherry': 'पुडुचेरी',
-    'Punjab': 'पंजाब',
-    'Rajasthan': 'राजस्थान',
-    'Sikkim': 'सिक्किम',
-    'Tamil Nadu': 'तमिलनाडु',
-    'Telangana': 'तेलंगाना',
-    'Tripura': 'त्रिपुरा',
-    'Uttar Pradesh': 'उत्तर प्रदेश',
-    'Uttarakhand': 'उत्तराखंड',
-    'West Bengal': 'पश्चिम बंगाल'
-}
+# Predictions, forecasts and recommendations run here, off the request threads,
+# so a slow fit or model load cannot hold up /healthz and the cached pages
+work_pool = WorkPool(name='cpu')
 
-production_df = get_production_df()
-available_states_in_data = sorted(production_df['State_Name'].str.strip().unique()) if not production_df.empty else []
-STATES_FOR_DROPDOWN = [
-    {'english': eng, 'hindi': STATE_NAMES_HINDI.get(eng, eng)}
-    for eng in STATE_NAMES_ENGLISH if eng in available_states_in_data
-]
+# Rainfall data, filled in by the 'rainfall' startup stage
+df, df_melted, historical_mean, sub_historical_mean = pd.DataFrame(), pd.DataFrame(), 233.30, {}
+rainfall_cube, forecast_cache, SUBDIVISIONS = None, None, []
+# Bumped whenever the data behind the rendered pages is (re)loaded
+data_generation = 0
 
-# Load merged_df
-try:
-    merged_df = pd.read_csv(os.path.join(BASE_DIR, "merged_crop_data.csv"))
-    merged_df.columns = merged_df.columns.str.strip()
-    print("Merged data loaded successfully.")
-except Exception as e:
-    print(f"Warning: Failed to load merged_crop_data.csv: {e}")
-    merged_df = pd.DataFrame()
+def load_rainfall_data():
+    global df, df_melted, historical_mean, sub_historical_mean, rainfall_cube, forecast_cache, SUBDIVISIONS, data_generation
+    try:
+        df = load_frame("Sub_Division_IMD_2017.csv")
+        month_columns = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+        df_melted = df.melt(id_vars=["SUBDIVISION", "YEAR"], var_name="MONTH", value_name="RAINFALL")
+        df_melted = df_melted[df_melted['MONTH'].isin(month_columns)]
+        df_melted = df_melted.dropna(subset=["RAINFALL"])
+        historical_mean = df_melted['RAINFALL'].mean()
+        sub_historical_mean = df_melted.groupby('SUBDIVISION', observed=True)['RAINFALL'].mean().to_dict()
+    except Exception as e:
+        print(f"Warning: Rainfall data not loaded: {e}")
+        df, df_melted, historical_mean = pd.DataFrame(), pd.DataFrame(), 233.30
+        sub_historical_mean = {}
+
+    # Dense [subdivision, year, month] view for exact lookups and climatology
+    rainfall_cube = RainfallCube(df_melted)
+
+    # Holt-Winters fits are cached per subdivision and data version
+    forecast_cache = ForecastCache(
+        df_melted,
+        os.path.join(CACHE_DIR, 'forecasts'),
+        source_signature("Sub_Division_IMD_2017.csv")
+    )
+    if FORECAST_ENGINE == 'numpy':
+        # Every subdivision in one batched fit after a data update; a cache read otherwise
+        forecast_cache.warm()
+    SUBDIVISIONS = df['SUBDIVISION'].unique().tolist() if not df.empty else []
+    data_generation += 1
+
+# Crop data, filled in by the 'crop_data' startup stage
+production_df, STATES_FOR_DROPDOWN, yield_index = pd.DataFrame(), [], None
+
+def load_crop_data():
+    global production_df, STATES_FOR_DROPDOWN, yield_index, data_generation
+    production_df = get_production_df()
+    # States with production data, by entity ID (entities.py)
+    available_state_ids = np.unique(production_df['state_id']) if not production_df.empty else []
+    STATES_FOR_DROPDOWN = [
+        {'english': states.name(state_id), 'hindi': STATE_NAMES_HINDI[states.name(state_id)]}
+        for state_id in LISTED_STATE_IDS if state_id in available_state_ids
+    ]
+
+    # Answer /recommendation and /rainfall lookups from a prebuilt table
+    build_recommendation_table()
+
+    # Pre-aggregated yields from merged_crop_data.csv; the raw frame is not kept in memory
+    yield_index = build_yield_index(
+        source_path("merged_crop_data.csv"),
+        os.path.join(CACHE_DIR, "yield_index.json")
+    )
+    data_generation += 1
 
-# Get static files list with absolute path and create case-insensitive mapping
+# Crop photos by lowercase crop name: the pre-sized, content-hashed variants
+# from `python crop_images.py build`, else the original file
 static_images_dir = os.path.join(BASE_DIR, 'static', 'crop_images')
-static_files = []
-crop_image_map = {}  # Maps lowercase crop name to actual filename
+crop_image_map = {}  # lowercase crop name -> {'source': file name, 'variants': [...]}
 if os.path.exists(static_images_dir):
-    actual_files = [f for f in os.listdir(static_images_dir) if f.endswith('.jpg')]
-    static_files = [f.lower() for f in actual_files]
-    # Create mapping: lowercase name -> actual filename
-    for actual_file in actual_files:
-        crop_image_map[actual_file.lower()] = actual_file
-    print(f"Found {len(static_files)} crop images in {static_images_dir}")
+    crop_variants = load_variants()
+    for actual_file in source_files(static_images_dir):
+        crop_name = os.path.splitext(actual_file)[0].lower()
+        crop_image_map[crop_name] = crop_variants.get(crop_name) or {'source': actual_file, 'variants': []}
+    print(f"Found {len(crop_image_map)} crop images in {static_images_dir}, {len(crop_variants)} with sized variants")
 else:
     print(f"WARNING: Static images directory not found: {static_images_dir}")
 
-# Subdivision to state mapping
-subdivision_to_state = {
-    "Andaman & Nicobar Islands": "Andaman and Nicobar Islands",
-    "Arunachal Pradesh": "Arunachal Pradesh",
-    "Assam & Meghalaya": "Assam",
-    "Naga Manipur Mizoram & Tripura": "Manipur",
-    "Sub Himalayan West Bengal & Sikkim": "West Bengal",
-    "Gangetic West Bengal": "West Bengal",
-    "Orissa": "Odisha",
-    "Jharkhand": "Jharkhand",
-    "Bihar": "Bihar",
-    "East Uttar Pradesh": "Uttar Pradesh",
-    "West Uttar Pradesh": "Uttar Pradesh",
-    "Uttarakhand": "Uttarakhand",
-    "Haryana Delhi & Chandigarh": "Haryana",
-    "Punjab": "Punjab",
-    "Himachal Pradesh": "Himachal Pradesh",
-    "Jammu & Kashmir": "Jammu and Kashmir",
-    "West Rajasthan": "Rajasthan",
-    "East Rajasthan": "Rajasthan",
-    "West Madhya Pradesh": "Madhya Pradesh",
-    "East Madhya Pradesh": "Madhya Pradesh",
-    "Gujarat Region": "Gujarat",
-    "Saurashtra & Kutch": "Gujarat",
-    "Konkan & Goa": "Goa",
-    "Madhya Maharashtra": "Maharashtra",
-    "Marathwada": "Maharashtra",
-    "Vidharbha": "Maharashtra",
-    "Chhattisgarh": "Chhattisgarh",
-    "Coastal Andhra Pradesh": "Andhra Pradesh",
-    "Telangana": "Telangana",
-    "Rayalseema": "Andhra Pradesh",
-    "Tamil Nadu & Pondicherry": "Tamil Nadu",
-    "Coastal Karnataka": "Karnataka",
-    "North Interior Karnataka": "Karnataka",
-    "South Interior Karnataka": "Karnataka",
-    "Kerala": "Kerala",
-    "Lakshadweep": "Kerala"
-}
-
 # Default crops for seasons
 default_crops = {
     'Kharif': ['rice', 'maize', 'cotton'],
@@ -203,76 +177,100 @@ except Exception as e:
     plant_problems = {}
 
 def load_disease_model():
-    global disease_model, disease_class_names
-    if disease_model is None or disease_class_names is None:
-        try:
-            model_path = os.path.join(BASE_DIR, 'models', 'plant_disease_model.h5')
-            json_path = os.path.join(BASE_DIR, 'models', 'disease_class_names.json')
-            print(f"Loading disease model from: {model_path}")
-            print(f"Disease model file exists: {os.path.exists(model_path)}")
-            if not os.path.exists(model_path):
-                raise FileNotFoundError(f"Disease model file not found at: {model_path}")
-            if not os.path.exists(json_path):
-                raise FileNotFoundError(f"Disease class names file not found at: {json_path}")
-            # Try loading with compile=False for TensorFlow 2.20+ compatibility
-            try:
-                disease_model = load_model(model_path, compile=False)
-            except Exception as e1:
-                print(f"Warning: Failed to load with compile=False, trying default: {e1}")
-                disease_model = load_model(model_path)
-            with open(json_path, 'r') as f:
-                disease_class_indices = json.load(f)
-                disease_class_names = list(disease_class_indices.keys())
-            print("Disease model loaded successfully.")
-        except Exception as e:
-            print(f"Error loading disease model: {e}")
-            import traceback
-            traceback.print_exc()
-            disease_model, disease_class_names = None, []
-
-def compute_crop_yields(merged_df, state_name, crop_recs):
-    if merged_df.empty or 'Crop' not in merged_df.columns or 'Yield' not in merged_df.columns or 'State_Name' not in merged_df.columns:
-        for rec in crop_recs:
-            rec['national_yield'] = 0.0
-            rec['state_yield'] = 0.0
-        return
-
-    crop_mapping = {
-        'pigeonpeas': 'arhar/tur',
-        'chickpea': 'gram',
-        'mungbean': 'moong(green gram)',
-        'blackgram': 'urad',
-        'lentil': 'masoor',
-        'mothbeans': 'moth',
-        'groundnut': 'groundnut',
-        'tobacco': 'tobacco',
-        'wheat': 'wheat',
-        'safflower': 'safflower',
-        'banana': 'banana',
-        'sugarcane': 'sugarcane',
-        'coconut': 'coconut',
-    }
+    """Loader for the 'disease' model, with class names in index order."""
+    model_path = os.path.join(BASE_DIR, 'models', 'plant_disease_model.h5')
+    json_path = os.path.join(BASE_DIR, 'models', 'disease_class_names.json')
+    print(f"Loading disease model from: {model_path}")
+    print(f"Disease model file exists: {os.path.exists(model_path)}")
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Disease model file not found at: {model_path}")
+    if not os.path.exists(json_path):
+        raise FileNotFoundError(f"Disease class names file not found at: {json_path}")
+    model = load_inference_model(model_path)
+    with open(json_path, 'r') as f:
+        disease_class_indices = json.load(f)
+        class_names = list(disease_class_indices.keys())
+    disease_cache.set_version(model_version(model, model_path, json_path))
+    print("Disease model loaded successfully.")
+    return LoadedModel(model, class_names)
+
+models.register('soil', load_soil_model)
+models.register('disease', load_disease_model)
+
+# --- STARTUP STAGES ---
+def import_heavy_modules():
+    import tensorflow as tf
+    if FORECAST_ENGINE == 'statsmodels':
+        import statsmodels.tsa.holtwinters  # noqa: F401
+    print("TensorFlow version:", tf.__version__)
+
+def _warm_forward(model, size, batch_size):
+    """Dummy forward passes, so the first real request does not pay for graph tracing."""
+    for n in sorted({1, batch_size}):
+        model.predict(np.zeros((n,) + size + (3,), dtype=np.float32), verbose=0)
+
+def warm_soil_model():
+    soil = models.get('soil')
+    if soil is None:
+        raise RuntimeError("Soil model not loaded")
+    _warm_forward(soil.model, (128, 128), soil_batcher.max_batch_size)
+
+def warm_disease_model():
+    disease = models.get('disease')
+    if disease is None:
+        raise RuntimeError("Disease model not loaded")
+    _warm_forward(disease.model, (224, 224), disease_batcher.max_batch_size)
+
+warmup = Warmup(started=_import_started)
+warmup.add('imports', import_heavy_modules)
+warmup.add('rainfall', load_rainfall_data)
+warmup.add('crop_data', load_crop_data)
+warmup.add('soil_model', warm_soil_model)
+warmup.add('disease_model', warm_disease_model)
+
+# TensorFlow is not fork-safe: with a preloading gunicorn master (gunicorn.conf.py)
+# the master only loads the datasets, and each worker imports TensorFlow and
+# loads the models in its post_fork hook.
+DEFER_MODELS = os.environ.get('AGRIBUDDY_DEFER_MODELS', '0') == '1'
+DATA_STAGES = ('rainfall', 'crop_data') if DEFER_MODELS else ('imports', 'rainfall', 'crop_data')
+# In eager mode the disease model is still loaded on first use
+MODEL_STAGES = ('soil_model', 'disease_model') if WARMUP_MODE == 'background' else ('soil_model',)
+if DEFER_MODELS:
+    MODEL_STAGES = ('imports',) + MODEL_STAGES
+
+def start_warmup(stages):
+    warmup.run(stages, background=WARMUP_MODE == 'background')
+
+if not DEFER_MODELS:
+    start_warmup(DATA_STAGES + MODEL_STAGES)
+else:
+    start_warmup(DATA_STAGES)
 
-    for rec in crop_recs:
-        crop_lower = rec['name'].lower().strip()
-        crop_lower_mapped = crop_mapping.get(crop_lower, crop_lower)
+def _rounded_yield(value):
+    return round(value, 2) if pd.notna(value) and value > 0 else 0.0
 
-        national_mask = merged_df['Crop'].str.lower().str.strip() == crop_lower_mapped
-        national_yield = merged_df.loc[national_mask, 'Yield'].mean()
-        rec['national_yield'] = round(national_yield, 2) if pd.notna(national_yield) and national_yield > 0 else 0.0
+def _state_yields(yield_index, state_name, recommendations):
+    """(state yields, national yields) of the recommended crops, looked up by entity ID."""
+    return yield_index.yields(states.id(state_name), [crops.id(rec['name']) for rec in recommendations])
 
-        state_mask = (merged_df['State_Name'].str.strip() == state_name) & (merged_df['Crop'].str.lower().str.strip() == crop_lower_mapped)
-        state_yield = merged_df.loc[state_mask, 'Yield'].mean()
-        rec['state_yield'] = round(state_yield, 2) if pd.notna(state_yield) and state_yield > 0 else 0.0
+@timed('yields')
+def compute_crop_yields(yield_index, state_name, crop_recs):
+    state_yields, national_yields = _state_yields(yield_index, state_name, crop_recs)
+    for rec, state_yield, national_yield in zip(crop_recs, state_yields, national_yields):
+        rec['national_yield'] = _rounded_yield(national_yield)
+        rec['state_yield'] = _rounded_yield(state_yield)
 
-def compute_seasonal_success(recommendations):
+@timed('yields')
+def compute_seasonal_success(yield_index, state_name, recommendations):
     season_to_yields = {}
-    for rec in recommendations:
-        if 'state_yield' in rec and rec['state_yield'] > 0:
+    state_yields, _ = _state_yields(yield_index, state_name, recommendations)
+    for rec, state_yield in zip(recommendations, state_yields):
+        state_yield = _rounded_yield(state_yield)
+        if state_yield > 0:
             season = rec['details'].get('season', 'Unknown')
             if season not in season_to_yields:
                 season_to_yields[season] = []
-            season_to_yields[season].append(rec['state_yield'])
+            season_to_yields[season].append(state_yield)
     
     seasonal_success = {}
     for season, yields in season_to_yields.items():
@@ -281,25 +279,375 @@ def compute_seasonal_success(recommendations):
     
     return [{'season': season, 'success': success} for season, success in seasonal_success.items()]
 
-def compute_regional_popularity(recommendations):
-    return [{'crop': rec['name'].title(), 'yield': rec['state_yield']} for rec in recommendations if rec.get('state_yield', 0) > 0]
+@timed('yields')
+def compute_regional_popularity(yield_index, state_name, recommendations):
+    popularity = []
+    state_yields, _ = _state_yields(yield_index, state_name, recommendations)
+    for rec, state_yield in zip(recommendations, state_yields):
+        state_yield = _rounded_yield(state_yield)
+        if state_yield > 0:
+            popularity.append({'crop': rec['name'].title(), 'yield': state_yield})
+    return popularity
+
+# --- RAINFALL PREDICTION ---
+# Deviation from the monthly average (in %) reported as an anomaly
+ANOMALY_THRESHOLD_PCT = 20
+MAX_BATCH_QUERIES = 1000
+
+def predict_rainfall(subdivision, year_int, month):
+    """Recorded IMD rainfall for the month, else the cached Holt-Winters forecast."""
+    rainfall = rainfall_cube.value(subdivision, year_int, month)
+    if rainfall is None:
+        rainfall = forecast_cache.predict(subdivision, year_int, month)
+    if rainfall is None:
+        rainfall = sub_historical_mean.get(subdivision, historical_mean)
+    return float(rainfall)
+
+def rainfall_historical_avg(subdivision, month):
+    historical_avg = rainfall_cube.monthly_average(subdivision, month)
+    if historical_avg is None:
+        historical_avg = sub_historical_mean.get(subdivision, historical_mean)
+    return float(historical_avg)
+
+def rainfall_deviation(predicted_rainfall, historical_avg):
+    """Percentage deviation from the historical average, or None without one."""
+    if historical_avg > 0:
+        return ((predicted_rainfall - historical_avg) / historical_avg) * 100
+    return None
+
+def classify_rainfall(predicted_rainfall):
+    return "Low" if predicted_rainfall < 33 else "Medium" if predicted_rainfall <= 413 else "High"
+
+def validate_rainfall_query(subdivision, year, month):
+    """(year as int, None) for a valid query, else (None, error message)."""
+    if not all([subdivision, year, month]):
+        return None, "Please fill all fields: Subdivision, Year, and Month."
+    if not isinstance(subdivision, str) or not isinstance(month, str):
+        return None, "Subdivision and month must be strings."
+    try:
+        return int(year), None
+    except (TypeError, ValueError):
+        return None, "Invalid year input. Please enter a number."
+
+def rainfall_entry(subdivision, year_int, month, historical_avg=None, predicted_rainfall=None):
+    """Prediction, historical average and anomaly for one month, as sent by the JSON APIs."""
+    if predicted_rainfall is None:
+        predicted_rainfall = predict_rainfall(subdivision, year_int, month)
+    if historical_avg is None:
+        historical_avg = rainfall_historical_avg(subdivision, month)
+    deviation = rainfall_deviation(predicted_rainfall, historical_avg)
+    return {
+        'subdivision': subdivision,
+        'year': year_int,
+        'month': month,
+        'prediction': round(predicted_rainfall, 2),
+        'historical_avg': round(historical_avg, 2),
+        'anomaly_pct': round(deviation, 1) if deviation is not None else None,
+        'anomaly': deviation is not None and abs(deviation) > ANOMALY_THRESHOLD_PCT,
+        'classification': classify_rainfall(predicted_rainfall)
+    }
+
+MONTH_TO_SEASON = {
+    'JUN': 'Kharif', 'JUL': 'Kharif', 'AUG': 'Kharif', 'SEP': 'Kharif',
+    'OCT': 'Rabi', 'NOV': 'Rabi', 'DEC': 'Rabi', 'JAN': 'Rabi', 'FEB': 'Rabi', 'MAR': 'Rabi',
+    'APR': 'Zaid', 'MAY': 'Zaid'
+}
+
+def season_crop_suggestions(subdivision, season):
+    """Up to three crops for the subdivision's state in a season, with defaults."""
+    dummy_soil = "Alluvial Soil"
+    state_name = state_of_subdivision(subdivision)
+    all_recommendations, _ = get_recommendations(state_name, dummy_soil)
+    crop_suggestions = [c for c in all_recommendations if c.get('details', {}).get('season', '').lower() == season.lower()][:3]
+    if not crop_suggestions and season != 'Unknown':
+        crop_suggestions = all_recommendations[:3]
+    if not crop_suggestions:
+        for name in default_crops.get(season, []):
+            item = crop_item(name, season)
+            if item is not None:
+                crop_suggestions.append(item)
+    return crop_suggestions
+
+def irrigation_advice(predicted_rainfall, crop_suggestions):
+    if not crop_suggestions:
+        return ""
+    ideal_rain = crop_suggestions[0]['details'].get('rain', 0)
+    if predicted_rainfall < ideal_rain * 0.8:
+        return f"Irrigation recommended: Predicted rainfall ({predicted_rainfall:.2f} mm) is below the ideal ({ideal_rain} mm) for {crop_suggestions[0]['name']}."
+    elif predicted_rainfall > ideal_rain * 1.2:
+        return f"Irrigation not needed: Predicted rainfall ({predicted_rainfall:.2f} mm) exceeds the ideal ({ideal_rain} mm) for {crop_suggestions[0]['name']}."
+    return f"Irrigation may not be necessary: Predicted rainfall ({predicted_rainfall:.2f} mm) is close to the ideal ({ideal_rain} mm) for {crop_suggestions[0]['name']}."
+
+def rainfall_outlook(subdivision, year_int, month):
+    """rainfall_entry with the season, its crop suggestions and irrigation advice.
+    Returns (entry, crop suggestions, prediction, historical average), the last two
+    unrounded. Run it on the work pool: the forecast may be fitted and the
+    suggestions go through get_recommendations."""
+    predicted_rainfall = predict_rainfall(subdivision, year_int, month)
+    historical_avg = rainfall_historical_avg(subdivision, month)
+    entry = rainfall_entry(subdivision, year_int, month, historical_avg, predicted_rainfall)
+    entry['season'] = MONTH_TO_SEASON.get(month, 'Unknown')
+    crop_suggestions = season_crop_suggestions(subdivision, entry['season'])
+    entry['crops'] = [crop['name'] for crop in crop_suggestions]
+    entry['irrigation'] = irrigation_advice(predicted_rainfall, crop_suggestions)
+    return entry, crop_suggestions, predicted_rainfall, historical_avg
 
 # Simple readiness probe that does not collide with UI routes
 @app.route('/healthz')
 def health_check():
-    return jsonify({"status": "ok"})
-
-@app.route('/Uploads/<filename>')
+    startup = warmup.report()
+    if startup['ready']:
+        status = "ok"
+    elif any(stage['state'] == 'failed' for stage in startup['stages'].values()):
+        status = "degraded"
+    else:
+        status = "starting"
+    return jsonify({
+        "status": status,
+        "startup": startup,
+        "image_timings": timing_stats(),
+        "prediction_cache": {"soil": soil_cache.stats(), "disease": disease_cache.stats()},
+        "page_cache": page_cache.stats(),
+        "work_pool": work_pool.stats(),
+        "models": models.stats(),
+        "uploads": upload_store.stats(),
+    })
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def add_server_timing(response):
+    # Per-stage timings of this request, visible in the browser's network panel
+    started = g.get('request_started')
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        observe_request(request.endpoint, request.method, response.status_code, elapsed)
+        response.headers['Server-Timing'] = server_timing(elapsed)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Stage and request latency histograms for Prometheus (this process only)."""
+    return Response(prometheus_text() + models.prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# A stored upload's name is its content hash, so its bytes never change
+UPLOAD_MAX_AGE = 86400
+
+@app.route('/Uploads/<path:filename>')
 def uploaded_file(filename):
+    if not upload_store.is_valid_name(filename):
+        return "File not found", 404
     try:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        # The leaf image is written in the background; wait if it is still in flight
+        wait_for_save(upload_store.path(filename))
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename, max_age=UPLOAD_MAX_AGE)
     except Exception as e:
         print(f"Error serving uploaded file: {e}")
         return "File not found", 404
 
+@app.route('/crop-images/<filename>')
+def crop_image(filename):
+    # Only hashed variant names: they change with their content, so they never
+    # need revalidating (the manifest next to them does)
+    if not is_variant_name(filename):
+        return "File not found", 404
+    response = send_from_directory(VARIANTS_DIR, filename, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+# --- JSON API (v1) ---
+# Lean responses for the mobile client. GET responses only change with the
+# data, so they carry an ETag and may be cached for an hour.
+API_MAX_AGE = 3600
+SOIL_PREDICTION_ERRORS = {"Soil model not loaded": 503, "Could not process image": 422}
+
+def api_error(message, status):
+    return json_response({"error": message}, status=status)
+
+# Where each tab shows its error when the work pool turns a form away
+TAB_ERRORS = {'recommendation': 'error_message', 'rainfall': 'rainfall_error', 'health': 'health_error'}
+
+@app.errorhandler(Overloaded)
+def work_pool_overloaded(e):
+    """429 when the work pool's queue is full, 503 when a task missed its deadline."""
+    if request.path.startswith('/api/'):
+        response = api_error(str(e), e.status)
+    else:
+        tab = (request.view_args or {}).get('tab', 'home')
+        context = {TAB_ERRORS[tab]: str(e)} if tab in TAB_ERRORS else {}
+        response = make_response(render_index(tab, **context), e.status)
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    message = f"The upload is larger than {MAX_UPLOAD_MB:g} MB. Please send a smaller photo."
+    if request.path.startswith('/api/'):
+        return api_error(message, 413)
+    tab = (request.view_args or {}).get('tab', 'home')
+    context = {TAB_ERRORS[tab]: message} if tab in TAB_ERRORS else {}
+    return make_response(render_index(tab, **context), 413)
+
+@app.route('/api/rainfall/batch', methods=['POST'])
+@app.route('/api/v1/rainfall/batch', methods=['POST'])
+def rainfall_batch():
+    """Predict rainfall for many (subdivision, year, month) queries at once.
+
+    Body: {"queries": [{"subdivision": "Bihar", "year": 2025, "month": "JUL"}, ...]}
+    Queries are grouped by subdivision so each series is fitted once. Results
+    come back in request order; invalid queries carry an "error" instead.
+    """
+    warmup.wait('rainfall')
+    payload = request.get_json(silent=True)
+    queries = payload.get('queries') if isinstance(payload, dict) else None
+    if not isinstance(queries, list) or not queries:
+        return api_error("Expected a JSON body with a non-empty 'queries' list.", 400)
+    if len(queries) > MAX_BATCH_QUERIES:
+        return api_error(f"At most {MAX_BATCH_QUERIES} queries per request.", 400)
+
+    results = [None] * len(queries)
+    by_subdivision = {}
+    for i, query in enumerate(queries):
+        if not isinstance(query, dict):
+            results[i] = {"error": "Each query must be an object."}
+            continue
+        subdivision, year, month = query.get('subdivision'), query.get('year'), query.get('month')
+        year_int, error = validate_rainfall_query(subdivision, year, month)
+        if error:
+            results[i] = {'subdivision': subdivision, 'year': year, 'month': month, 'error': error}
+            continue
+        by_subdivision.setdefault(subdivision, []).append((i, year_int, month))
+
+    work_pool.run(fill_rainfall_batch, by_subdivision, results)
+    return json_response({"results": results})
+
+def fill_rainfall_batch(by_subdivision, results):
+    # Subdivisions not fitted yet are fitted together, once for all their queries
+    forecast_cache.warm(list(by_subdivision))
+    for subdivision, items in by_subdivision.items():
+        monthly_avg = {}
+        for i, year_int, month in items:
+            if month not in monthly_avg:
+                monthly_avg[month] = rainfall_historical_avg(subdivision, month)
+            results[i] = rainfall_entry(subdivision, year_int, month, monthly_avg[month])
+
+def recommendation_payload(state_name, soil_type):
+    """(payload, None) with the crops for a state and soil type, or (None, error)."""
+    recommendations, error_message = get_recommendations(state_name, soil_type)
+    if not recommendations:
+        return None, error_message or "No recommendations found for this soil type and state."
+    compute_crop_yields(yield_index, state_name, recommendations)
+    crop_rows = [{
+        'name': rec['name'],
+        'hindi_name': rec['details']['hindi_name'],
+        'season': rec['details']['season'],
+        'temp': round(float(rec['details']['temp']), 2),
+        'rain': round(float(rec['details']['rain']), 2),
+        'ph': round(float(rec['details']['ph']), 2),
+        'state_yield': rec['state_yield'],
+        'national_yield': rec['national_yield'],
+    } for rec in recommendations]
+    return {
+        'soil_type': soil_type.replace('_', ' ').title(),
+        'state': state_name.title(),
+        'note': error_message,
+        'crops': crop_rows,
+        'seasonal_success': compute_seasonal_success(yield_index, state_name, recommendations),
+    }, None
+
+@app.route('/api/v1/recommendation', methods=['GET', 'POST'])
+def api_recommendation():
+    """GET ?state=Punjab&soil=Black_Soil, or POST multipart 'image' + 'state'
+    to classify the soil photo first."""
+    warmup.wait('crop_data')
+    if request.method == 'GET':
+        state_name, soil_type = request.args.get('state'), request.args.get('soil')
+        if not state_name or not soil_type:
+            return api_error("Expected 'state' and 'soil' query parameters.", 400)
+    else:
+        state_name, img_file = request.form.get('state'), request.files.get('image')
+        if not state_name or not img_file or not img_file.filename:
+            return api_error("Expected a multipart body with 'image' and 'state'.", 400)
+        soil_type = work_pool.run(predict_soil, read_upload(img_file))
+        if soil_type in SOIL_PREDICTION_ERRORS:
+            return api_error(soil_type, SOIL_PREDICTION_ERRORS[soil_type])
+        soil_type = recommendation_soil_type(soil_type)
+    payload, error_message = work_pool.run(recommendation_payload, state_name, soil_type)
+    if payload is None:
+        return api_error(error_message, 404)
+    return json_response(payload, max_age=API_MAX_AGE if request.method == 'GET' else None)
+
+@app.route('/api/v1/rainfall')
+def api_rainfall():
+    """GET ?subdivision=Bihar&year=2025&month=JUL"""
+    warmup.wait('rainfall', 'crop_data')
+    subdivision, month = request.args.get('subdivision'), request.args.get('month')
+    year_int, error_message = validate_rainfall_query(subdivision, request.args.get('year'), month)
+    if error_message:
+        return api_error(error_message, 400)
+    payload = work_pool.run(rainfall_outlook, subdivision, year_int, month)[0]
+    return json_response(payload, max_age=API_MAX_AGE)
+
+@app.route('/api/v1/health', methods=['POST'])
+def api_health():
+    """POST multipart 'leaf_image'."""
+    leaf_file = request.files.get('leaf_image')
+    if not leaf_file or not leaf_file.filename:
+        return api_error("Expected a multipart body with 'leaf_image'.", 400)
+    general_issue = work_pool.run(predict_disease, read_upload(leaf_file))
+    if general_issue == "Model not loaded":
+        return api_error(general_issue, 503)
+    issue_info = plant_problems.get(general_issue, {'description': 'Unknown issue', 'solutions': 'Consult an expert or test soil.'})
+    return json_response({
+        'issue': general_issue,
+        'description': issue_info['description'],
+        'solutions': issue_info['solutions']
+    })
+
+# --- PAGES ---
+# A GET of a tab renders the same page until the data or template changes,
+# so it is rendered once and served from page_cache (gzip + ETag/304)
+PAGE_TABS = ('home', 'recommendation', 'rainfall', 'health', 'about', 'contact')
+TEMPLATE_PATH = os.path.join(BASE_DIR, 'templates', 'index.html')
+page_cache = PageCache()
+
+# What index.html shows when nothing has been submitted
+PAGE_DEFAULTS = {
+    'result': None, 'recommendations': None, 'error_message': None, 'selected_state': None,
+    'rainfall_result': None, 'rainfall_classification': None, 'season': None,
+    'crop_suggestions': None, 'rainfall_error': None, 'health_result': None,
+    'health_error': None, 'health_image_path': None, 'irrigation_recommendation': None,
+    'historical_avg': None, 'predicted_rainfall': None, 'rec_yield_data': [],
+    'seasonal_success_data': [], 'regional_popularity_data': [],
+}
+
+def page_version():
+    try:
+        template_mtime = os.stat(TEMPLATE_PATH).st_mtime_ns
+    except OSError:
+        template_mtime = None
+    return data_generation, template_mtime
+
+@timed('render')
+def render_index(tab, **context):
+    return render_template(
+        'index.html',
+        tab=tab,
+        states=STATES_FOR_DROPDOWN,
+        subdivisions=SUBDIVISIONS,
+        crop_image_map=crop_image_map,
+        **dict(PAGE_DEFAULTS, **context)
+    )
+
 @app.route('/', defaults={'tab': 'home'}, methods=['GET', 'POST'])
 @app.route('/<tab>', methods=['GET', 'POST'])
 def index(tab):
+    # Pages need the datasets; a request that arrives during a background warmup waits for them
+    warmup.wait('rainfall', 'crop_data')
+    if request.method == 'GET' and tab in PAGE_TABS:
+        return page_cache.response(tab, page_version(), lambda: render_index(tab))
     result = None
     recommendations = None
     error_message = None
@@ -326,14 +674,10 @@ def index(tab):
             state_name = request.form.get('state')
             selected_state = state_name
             
-            # Debug logging for troubleshooting
-            print(f"DEBUG Recommendation: POST received")
-            print(f"DEBUG: Files in request: {list(request.files.keys())}")
-            print(f"DEBUG: img_file exists: {img_file is not None}")
-            if img_file:
-                print(f"DEBUG: img_file.filename: {img_file.filename}")
-                print(f"DEBUG: img_file.content_type: {getattr(img_file, 'content_type', 'N/A')}")
-            print(f"DEBUG: state_name: {state_name}")
+            if debug_enabled():
+                log.debug("Recommendation POST: files=%s state=%s", list(request.files.keys()), state_name)
+                if img_file:
+                    log.debug("Upload: filename=%s content_type=%s", img_file.filename, getattr(img_file, 'content_type', 'N/A'))
             
             # Validate file upload
             file_uploaded = False
@@ -351,42 +695,39 @@ def index(tab):
                 else:
                     error_message = "Please select your state."
             else:
-                # Generate unique filename to avoid conflicts
-                import uuid
-                file_ext = os.path.splitext(img_file.filename)[1] or '.jpg'
-                unique_filename = f"{uuid.uuid4()}{file_ext}"
-                img_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                
                 try:
-                    print(f"DEBUG: Saving file to: {img_path}")
-                    img_file.save(img_path)
-                    print(f"DEBUG: File saved successfully, size: {os.path.getsize(img_path)} bytes")
+                    img_data = read_upload(img_file)
+                    if debug_enabled():
+                        log.debug("Read upload into memory, size: %d bytes", len(img_data))
+                    if KEEP_UPLOADS:
+                        upload_store.put(img_data)
+
+                    predicted_class = work_pool.run(predict_soil, img_data)
+                    if debug_enabled():
+                        log.debug("Predicted soil type: %s", predicted_class)
                     
-                    predicted_class = predict_soil(img_path)
-                    print(f"DEBUG: Predicted soil type: {predicted_class}")
+                    predicted_class = recommendation_soil_type(predicted_class)
                     
-                    if '___' in predicted_class or 'Unknown' in predicted_class:
-                        predicted_class = "Alluvial_Soil"
-                    
-                    recommendations, error_message = get_recommendations(state_name, predicted_class)
-                    print(f"DEBUG: Got {len(recommendations) if recommendations else 0} recommendations")
+                    recommendations, error_message = work_pool.run(get_recommendations, state_name, predicted_class)
+                    if debug_enabled():
+                        log.debug("Got %d recommendations", len(recommendations) if recommendations else 0)
                     
                     if recommendations:
                         result = {
                             'soil_type': predicted_class.replace('_', ' ').title(),
                             'state': state_name.title()
                         }
-                        compute_crop_yields(merged_df, state_name, recommendations)
+                        compute_crop_yields(yield_index, state_name, recommendations)
                         rec_yield_data = [{'crop': rec['name'].title(), 'state': rec['state_yield'], 'national': rec['national_yield']} for rec in recommendations]
-                        seasonal_success_data = compute_seasonal_success(recommendations)
-                        regional_popularity_data = compute_regional_popularity(recommendations)
+                        seasonal_success_data = compute_seasonal_success(yield_index, state_name, recommendations)
+                        regional_popularity_data = compute_regional_popularity(yield_index, state_name, recommendations)
                     else:
                         error_message = error_message or "No recommendations found for this soil type and state."
+                except Overloaded:
+                    raise
                 except Exception as e:
                     error_message = f"Error processing image: {str(e)}"
-                    print(f"DEBUG: Exception occurred: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
+                    log.exception("Soil recommendation failed")
 
     elif tab == 'rainfall':
         if request.method == 'POST':
@@ -401,87 +742,19 @@ def index(tab):
                 except ValueError:
                     rainfall_error = "Invalid year input. Please enter a number."
                 else:
-                    existing_data = df_melted[(df_melted["SUBDIVISION"] == subdivision) & 
-                                             (df_melted["YEAR"] == year_int) & 
-                                             (df_melted["MONTH"] == month)]
-                    if not existing_data.empty:
-                        rainfall = existing_data['RAINFALL'].values[0]
-                    else:
-                        df_sub = df_melted[df_melted['SUBDIVISION'] == subdivision].copy()
-                        df_sub['MONTH_NUM'] = df_sub['MONTH'].map(month_num)
-                        df_sub['ds'] = pd.to_datetime(df_sub['YEAR'].astype(str) + '-' + df_sub['MONTH_NUM'].astype(str) + '-01')
-                        df_sub = df_sub.sort_values('ds')
-                        df_sub = df_sub.groupby('ds')[['RAINFALL']].mean().reset_index()
-                        df_sub = df_sub.set_index('ds')
-                        y = df_sub['RAINFALL']
-                        if len(y) < 12:
-                            rainfall = sub_historical_mean.get(subdivision, historical_mean)
-                        else:
-                            try:
-                                model_hw = ExponentialSmoothing(y, seasonal='add', seasonal_periods=12, initialization_method='heuristic')
-                                fitted = model_hw.fit()
-                                target_ds = pd.to_datetime(f"{year_int}-{month_num[month]}-01")
-                                last_date = df_sub.index.max()
-                                if target_ds <= last_date:
-                                    rainfall = sub_historical_mean.get(subdivision, historical_mean)
-                                else:
-                                    months_diff = (target_ds.year - last_date.year) * 12 + (target_ds.month - last_date.month)
-                                    forecast_vals = fitted.forecast(months_diff)
-                                    rainfall = forecast_vals.iloc[-1] if not forecast_vals.empty and not np.isnan(forecast_vals.iloc[-1]) else sub_historical_mean.get(subdivision, historical_mean)
-                            except Exception as e:
-                                print(f"Warning: Holt-Winters failed for {subdivision}: {e}")
-                                rainfall = sub_historical_mean.get(subdivision, historical_mean)
-                    predicted_rainfall = float(rainfall)
-                    rainfall_result = f"Prediction: {rainfall:.2f} mm"
-
-                    historical_data = df_melted[(df_melted["SUBDIVISION"] == subdivision) & (df_melted["MONTH"] == month)]
-                    historical_avg = float(historical_data['RAINFALL'].mean() if not historical_data.empty else sub_historical_mean.get(subdivision, historical_mean))
+                    entry, crop_suggestions, predicted_rainfall, historical_avg = work_pool.run(
+                        rainfall_outlook, subdivision, year_int, month)
+                    rainfall_result = f"Prediction: {predicted_rainfall:.2f} mm"
+
                     anomaly_status = ""
-                    if historical_avg > 0:
-                        deviation = ((predicted_rainfall - historical_avg) / historical_avg) * 100
-                        if abs(deviation) > 20:
-                            anomaly_status = f" (Anomaly: {deviation:.1f}% from historical average of {historical_avg:.2f} mm)"
+                    if entry['anomaly']:
+                        anomaly_status = f" (Anomaly: {entry['anomaly_pct']:.1f}% from historical average of {historical_avg:.2f} mm)"
 
-                    rainfall_classification = "Low" if predicted_rainfall < 33 else "Medium" if predicted_rainfall <= 413 else "High"
+                    rainfall_classification = entry['classification']
                     rainfall_classification += f" rainfall ({predicted_rainfall:.2f} mm){anomaly_status}"
 
-                    month_to_season = {
-                        'JUN': 'Kharif', 'JUL': 'Kharif', 'AUG': 'Kharif', 'SEP': 'Kharif',
-                        'OCT': 'Rabi', 'NOV': 'Rabi', 'DEC': 'Rabi', 'JAN': 'Rabi', 'FEB': 'Rabi', 'MAR': 'Rabi',
-                        'APR': 'Zaid', 'MAY': 'Zaid'
-                    }
-                    season = month_to_season.get(month, 'Unknown')
-                    dummy_soil = "Alluvial Soil"
-                    state_name = subdivision_to_state.get(subdivision, subdivision.replace('&', 'and'))
-                    all_recommendations, _ = get_recommendations(state_name, dummy_soil)
-                    crop_suggestions = [c for c in all_recommendations if c.get('details', {}).get('season', '').lower() == season.lower()][:3]
-                    if not crop_suggestions and season != 'Unknown':
-                        crop_suggestions = all_recommendations[:3]
-                    if not crop_suggestions:
-                        defaults = default_crops.get(season, [])
-                        for name in defaults:
-                            if name in [x.lower() for x in crop_df['label'].tolist()]:
-                                details = crop_df[crop_df['label'].str.lower() == name].iloc[0]
-                                crop_suggestions.append({
-                                    'name': name,
-                                    'details': {
-                                        'season': season,
-                                        'temp': details['temperature'],
-                                        'rain': details['rainfall'],
-                                        'ph': details['ph'],
-                                        'hindi_name': CROP_NAMES_HINDI.get(name, "N/A")
-                                    }
-                                })
-
-                    irrigation_recommendation = ""
-                    if crop_suggestions:
-                        ideal_rain = crop_suggestions[0]['details'].get('rain', 0)
-                        if predicted_rainfall < ideal_rain * 0.8:
-                            irrigation_recommendation = f"Irrigation recommended: Predicted rainfall ({predicted_rainfall:.2f} mm) is below the ideal ({ideal_rain} mm) for {crop_suggestions[0]['name']}."
-                        elif predicted_rainfall > ideal_rain * 1.2:
-                            irrigation_recommendation = f"Irrigation not needed: Predicted rainfall ({predicted_rainfall:.2f} mm) exceeds the ideal ({ideal_rain} mm) for {crop_suggestions[0]['name']}."
-                        else:
-                            irrigation_recommendation = f"Irrigation may not be necessary: Predicted rainfall ({predicted_rainfall:.2f} mm) is close to the ideal ({ideal_rain} mm) for {crop_suggestions[0]['name']}."
+                    season = entry['season']
+                    irrigation_recommendation = entry['irrigation']
 
     elif tab == 'health':
         if request.method == 'POST' and 'leaf_image' in request.files:
@@ -489,24 +762,25 @@ def index(tab):
             if not leaf_file or not leaf_file.filename:
                 health_error = "Please upload a leaf image."
             else:
-                leaf_path = os.path.join(app.config['UPLOAD_FOLDER'], leaf_file.filename)
                 try:
-                    leaf_file.save(leaf_path)
-                    health_image_path = url_for('uploaded_file', filename=leaf_file.filename)
-                    general_issue = predict_disease(leaf_path)
+                    leaf_data = read_upload(leaf_file)
+                    stored_name = upload_store.put(leaf_data)
+                    if stored_name:
+                        health_image_path = url_for('uploaded_file', filename=stored_name)
+                    general_issue = work_pool.run(predict_disease, leaf_data)
                     issue_info = plant_problems.get(general_issue, {'description': 'Unknown issue', 'solutions': 'Consult an expert or test soil.'})
                     health_result = {
                         'issue': general_issue,
                         'description': issue_info['description'],
                         'solutions': issue_info['solutions']
                     }
+                except Overloaded:
+                    raise
                 except Exception as e:
                     health_error = f"Error during analysis: {str(e)}"
 
-    return render_template(
-        'index.html',
-        tab=tab,
-        states=STATES_FOR_DROPDOWN,
+    return gzip_response(make_response(render_index(
+        tab,
         result=result,
         recommendations=recommendations,
         error_message=error_message,
@@ -516,109 +790,84 @@ def index(tab):
         season=season,
         crop_suggestions=crop_suggestions,
         rainfall_error=rainfall_error,
-        subdivisions=df['SUBDIVISION'].unique().tolist() if not df.empty else [],
-        static_files=static_files,
-        crop_image_map=crop_image_map,
         health_result=health_result,
         health_error=health_error,
         health_image_path=health_image_path,
         irrigation_recommendation=irrigation_recommendation,
         historical_avg=historical_avg,
         predicted_rainfall=predicted_rainfall,
-        merged_df=merged_df,
         rec_yield_data=rec_yield_data,
         seasonal_success_data=seasonal_success_data,
         regional_popularity_data=regional_popularity_data
-    )
-
-def predict_soil(img_path):
-    if soil_model is None or not soil_class_names:
+    )))
+
+def soil_label(prediction, class_names):
+    return class_names.get(np.argmax(prediction), "Unknown Soil")
+
+def recommendation_soil_type(soil_type):
+    """Soil classes the recommendation table does not know fall back to alluvial soil."""
+    if '___' in soil_type or 'Unknown' in soil_type:
+        return "Alluvial_Soil"
+    return soil_type
+
+def predict_soil(img_data):
+    warmup.wait('soil_model')
+    # The model may have taken a while to load; skip the work if the caller gave up
+    check_cancelled()
+    soil = models.get('soil')
+    if soil is None or not soil.class_names:
         return "Soil model not loaded"
+    key = image_key(img_data)
+    cached = soil_cache.get(key)
+    if cached is not None:
+        return cached
     try:
-        img = image.load_img(img_path, target_size=(128, 128))
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0) / 255.0
-        prediction = soil_model.predict(img_array, verbose=0)
-        class_idx = np.argmax(prediction[0])
-        predicted_class = soil_class_names.get(class_idx, "Unknown Soil")
+        img_array = decode_rgb(img_data, (128, 128)) / 255.0
+        with timed('inference'):
+            prediction = soil_batcher.predict(img_array)
+        predicted_class = soil_label(prediction, soil.class_names)
+        soil_cache.put(key, predicted_class)
         return predicted_class
     except Exception as e:
         print(f"Error during soil prediction: {e}")
         return "Could not process image"
 
-def predict_disease(img_path):
-    load_disease_model()
-    if disease_model is None or not disease_class_names:
+def disease_label(prediction, leaf_rgb, class_names):
+    """The issue for a leaf crop: the model's class when it is confident,
+    else the colour heuristic."""
+    class_idx = np.argmax(prediction)
+    confidence = np.max(prediction)
+    if confidence >= 0.3 and class_idx < len(class_names):
+        predicted_class = class_names[class_idx]
+        general_issue = predicted_class.split('___')[-1].replace('_', ' ').strip()
+        general_issue = ' '.join(word.capitalize() for word in general_issue.split())
+        return general_issue
+    return classify_colors(leaf_rgb)
+
+def classify_leaf(img_data, class_names):
+    leaf_img = crop_leaf(img_data)
+    img_array = np.asarray(leaf_img, dtype=np.float32) / 255.0
+    with timed('inference'):
+        prediction = disease_batcher.predict(img_array)
+    return disease_label(prediction, leaf_img, class_names)
+
+def predict_disease(img_data):
+    warmup.wait('disease_model')
+    check_cancelled()
+    disease = models.get('disease')
+    if disease is None or not disease.class_names:
         return "Model not loaded"
+    key = image_key(img_data)
+    cached = disease_cache.get(key)
+    if cached is not None:
+        return cached
     try:
-        img = cv2.imread(img_path)
-        if img is None:
-            raise ValueError("Invalid image file")
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        lower_green = np.array([35, 40, 40])
-        upper_green = np.array([85, 255, 255])
-        mask = cv2.inRange(hsv, lower_green, upper_green)
-        kernel = np.ones((5, 5), np.uint8)
-        mask = cv2.erode(mask, kernel, iterations=1)
-        mask = cv2.dilate(mask, kernel, iterations=1)
-        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        if contours:
-            largest_contour = max(contours, key=cv2.contourArea)
-            x, y, w, h = cv2.boundingRect(largest_contour)
-            if w > 20 and h > 20:
-                leaf_img = img[y:y+h, x:x+w]
-                leaf_img = cv2.resize(leaf_img, (224, 224))
-            else:
-                leaf_img = cv2.resize(img, (224, 224))
-        else:
-            leaf_img = cv2.resize(img, (224, 224))
-        leaf_img = cv2.cvtColor(leaf_img, cv2.COLOR_BGR2RGB)
-        img_array = image.img_to_array(leaf_img) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-        prediction = disease_model.predict(img_array, verbose=0)
-        class_idx = np.argmax(prediction[0])
-        confidence = np.max(prediction[0])
-        if confidence >= 0.3 and class_idx < len(disease_class_names):
-            predicted_class = disease_class_names[class_idx]
-            general_issue = predicted_class.split('___')[-1].replace('_', ' ').strip()
-            general_issue = ' '.join(word.capitalize() for word in general_issue.split())
-            return general_issue
-        hsv = cv2.cvtColor(leaf_img, cv2.COLOR_RGB2HSV)
-        yellow_lower = np.array([20, 100, 100])
-        yellow_upper = np.array([30, 255, 255])
-        yellow_mask = cv2.inRange(hsv, yellow_lower, yellow_upper)
-        yellow_ratio = cv2.countNonZero(yellow_mask) / (224 * 224)
-        purple_lower = np.array([130, 50, 50])
-        purple_upper = np.array([160, 255, 255])
-        purple_mask = cv2.inRange(hsv, purple_lower, purple_upper)
-        purple_ratio = cv2.countNonZero(purple_mask) / (224 * 224)
-        brown_lower = np.array([10, 100, 20])
-        brown_upper = np.array([20, 255, 200])
-        brown_mask = cv2.inRange(hsv, brown_lower, brown_upper)
-        brown_ratio = cv2.countNonZero(brown_mask) / (224 * 224)
-        green_lower = np.array([35, 50, 50])
-        green_upper = np.array([85, 255, 255])
-        green_mask = cv2.inRange(hsv, green_lower, green_upper)
-        green_ratio = cv2.countNonZero(green_mask) / (224 * 224)
-        pale_lower = np.array([30, 30, 100])
-        pale_upper = np.array([60, 100, 255])
-        pale_mask = cv2.inRange(hsv, pale_lower, pale_upper)
-        pale_ratio = cv2.countNonZero(pale_mask) / (224 * 224)
-        if yellow_ratio > 0.2 and green_ratio > 0.3:
-            return "Magnesium Deficiency"
-        elif pale_ratio > 0.25:
-            return "Iron Deficiency"
-        elif yellow_ratio > 0.2:
-            return "Nitrogen Deficiency"
-        elif purple_ratio > 0.15:
-            return "Phosphorus Deficiency"
-        elif brown_ratio > 0.2:
-            return "Potassium Deficiency"
-        else:
-            return "Unknown Issue"
+        general_issue = classify_leaf(img_data, disease.class_names)
     except Exception as e:
         print(f"Image processing error: {str(e)}")
         return "Unknown Issue"
+    disease_cache.put(key, general_issue)
+    return general_issue
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 7860))
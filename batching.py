@@ -0,0 +1,98 @@
+"""Dynamic micro-batching for model inference.
+
+predict_soil and predict_disease each run one image through Keras, paying the
+full per-call dispatch overhead alone. A MicroBatcher queues concurrent
+requests for the same model and flushes them as a single forward pass as soon
+as `max_batch_size` images are waiting or the oldest one has waited
+`max_wait_ms`. Each caller blocks until its own row of the output is ready,
+so it works from the request threads of a threaded gunicorn worker.
+
+Configure with AGRIBUDDY_BATCH_SIZE (default 8) and AGRIBUDDY_BATCH_WAIT_MS
+(default 2); a batch size of 1 calls the model directly.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+DEFAULT_BATCH_SIZE = int(os.environ.get('AGRIBUDDY_BATCH_SIZE', '8'))
+DEFAULT_WAIT_MS = float(os.environ.get('AGRIBUDDY_BATCH_WAIT_MS', '2'))
+
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=DEFAULT_BATCH_SIZE, max_wait_ms=DEFAULT_WAIT_MS, name='model'):
+        """predict_fn takes a stacked batch and returns one output row per input."""
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def _ensure_worker(self):
+        # Started lazily, and again in a forked child, since threads do not survive fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                thread = threading.Thread(target=self._run, args=(self._queue,), name=f"batcher-{self.name}", daemon=True)
+                thread.start()
+                self._pid = os.getpid()
+
+    def predict(self, sample):
+        """Run one input (without a batch axis) and return its output row."""
+        if self.max_batch_size == 1:
+            output = self.predict_fn(np.expand_dims(sample, axis=0))
+            # Request threads call this concurrently; += is not atomic
+            with self._lock:
+                self.batches += 1
+                self.items += 1
+            return output[0]
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((sample, future))
+        return future.result()
+
+    def _collect(self, pending):
+        first = pending.get()
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, pending):
+        while True:
+            batch = self._collect(pending)
+            futures = [future for _, future in batch]
+            try:
+                outputs = self.predict_fn(np.stack([sample for sample, _ in batch]))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+            for future, output in zip(futures, outputs):
+                future.set_result(output)
+
+    def stats(self):
+        with self._lock:
+            batches, items = self.batches, self.items
+        return {
+            'batches': batches,
+            'items': items,
+            'mean_batch_size': round(items / batches, 2) if batches else 0.0,
+        }
@@ -0,0 +1,71 @@
+"""Throughput versus latency of MicroBatcher under concurrent load.
+
+    python benchmarks/bench_batching.py [--clients 8] [--requests 40]
+
+Each client thread sends single-image predictions back to back, like request
+threads in a threaded gunicorn worker. Rows compare direct calls (batch size 1)
+with several batch size / wait time settings.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batching import MicroBatcher
+from benchmarks.standin_models import soil_model, SOIL_INPUT
+
+CONFIGS = ((1, 0), (4, 2), (8, 2), (8, 5), (16, 5))
+
+
+def run(model, batch_size, wait_ms, clients, requests):
+    lock = threading.Lock()
+    batcher = MicroBatcher(lambda batch: model.predict(batch, verbose=0), batch_size, wait_ms, name='bench')
+    sample = np.random.default_rng(0).random(SOIL_INPUT, dtype=np.float32)
+    latencies = []
+
+    def client():
+        for _ in range(requests):
+            start = time.perf_counter()
+            batcher.predict(sample)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {
+        'throughput': len(latencies) / wall,
+        'p50': np.percentile(ms, 50),
+        'p95': np.percentile(ms, 95),
+        'mean_batch': batcher.stats()['mean_batch_size'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=40)
+    args = parser.parse_args()
+
+    model = soil_model()
+    model.predict(np.zeros((1,) + SOIL_INPUT, dtype=np.float32), verbose=0)  # trace once
+    print(f"{args.clients} clients x {args.requests} requests, soil stand-in model {SOIL_INPUT}")
+    print(f"{'batch':>5} {'wait ms':>7} {'img/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'avg batch':>9}")
+    for batch_size, wait_ms in CONFIGS:
+        r = run(model, batch_size, wait_ms, args.clients, args.requests)
+        print(f"{batch_size:>5} {wait_ms:>7} {r['throughput']:>8.1f} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['mean_batch']:>9}")
+
+
+if __name__ == '__main__':
+    main()
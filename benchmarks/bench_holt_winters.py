@@ -0,0 +1,95 @@
+"""Holt-Winters on every IMD subdivision: statsmodels, one series at a time,
+against holt_winters.fit_many, all series at once.
+
+    python benchmarks/bench_holt_winters.py [--csv Sub_Division_IMD_2017.csv] [--tolerance 0.01]
+
+Fits each subdivision's monthly series both ways (as forecast_cache does,
+with FORECAST_HORIZON months ahead) and prints the wall time of each, then
+per subdivision the fitted weights and the largest forecast difference.
+Series statsmodels cannot fit (gaps, too short) must fail in both. Exits
+with status 1 if any forecast differs by more than --tolerance mm or the
+two engines disagree on which series can be fitted.
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datacache import load_frame, source_path
+from forecast_cache import FORECAST_HORIZON, fit_forecast, fit_forecasts, monthly_series
+
+MONTHS = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+
+
+def load_series(csv_path):
+    df = load_frame(csv_path)
+    melted = df.melt(id_vars=["SUBDIVISION", "YEAR"], var_name="MONTH", value_name="RAINFALL")
+    melted = melted[melted['MONTH'].isin(MONTHS)].dropna(subset=["RAINFALL"])
+    return monthly_series(melted)
+
+
+def fit_statsmodels(series):
+    results = []
+    for y in series:
+        try:
+            results.append(fit_forecast(y))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--csv', default=source_path('Sub_Division_IMD_2017.csv'))
+    parser.add_argument('--tolerance', type=float, default=0.01, help="largest allowed forecast difference, in mm")
+    args = parser.parse_args()
+
+    series = load_series(args.csv)
+    names, values = list(series), list(series.values())
+    print(f"{len(values)} subdivisions, {sum(len(y) for y in values)} monthly values")
+
+    fit_forecasts(values[:1])  # first call pays for imports
+    start = time.perf_counter()
+    numpy_results = fit_forecasts(values)
+    numpy_seconds = time.perf_counter() - start
+
+    from statsmodels.tools.sm_exceptions import ConvergenceWarning, ValueWarning
+    fit_statsmodels(values[:1])
+    # statsmodels registers its warnings as 'always' on import, so filter after it
+    warnings.simplefilter('ignore', ValueWarning)
+    warnings.simplefilter('ignore', ConvergenceWarning)
+    start = time.perf_counter()
+    statsmodels_results = fit_statsmodels(values)
+    statsmodels_seconds = time.perf_counter() - start
+
+    print(f"\n{'subdivision':<36} {'alpha sm':>9} {'alpha np':>9} {'gamma sm':>9} {'gamma np':>9} {'max diff mm':>12}")
+    worst, failures = 0.0, 0
+    for name, reference, result in zip(names, statsmodels_results, numpy_results):
+        if isinstance(reference, Exception) or isinstance(result, Exception):
+            agree = isinstance(reference, Exception) and isinstance(result, Exception)
+            failures += not agree
+            print(f"{name:<36} {'not fitted' if agree else 'FITTED BY ONE ENGINE ONLY':>52}")
+            continue
+        (sm_params, sm_forecast), (np_params, np_forecast) = reference, result
+        diff = float(np.max(np.abs(np.array(sm_forecast) - np.array(np_forecast))))
+        worst = max(worst, diff)
+        failures += diff > args.tolerance
+        print(f"{name:<36} {sm_params['smoothing_level']:>9.5f} {np_params['smoothing_level']:>9.5f} "
+              f"{sm_params['smoothing_seasonal']:>9.5f} {np_params['smoothing_seasonal']:>9.5f} {diff:>12.5f}")
+
+    print(f"\n{'engine':<28} {'seconds':>8}")
+    print(f"{'statsmodels, per series':<28} {statsmodels_seconds:>8.3f}")
+    print(f"{'holt_winters, all at once':<28} {numpy_seconds:>8.3f}")
+    print(f"speedup x{statsmodels_seconds / numpy_seconds:.1f}; largest forecast difference {worst:.5f} mm "
+          f"over {FORECAST_HORIZON} months (tolerance {args.tolerance} mm)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""/healthz latency and shed load while the heavy routes are saturated.
+
+    python benchmarks/bench_overload.py [--clients 16] [--seconds 20] [--threads 1,8]
+
+Starts one gunicorn worker (gunicorn.conf.py) per --threads setting, then
+has --clients threads post distinct leaf photos to /api/v1/health back to
+back (waiting Retry-After when turned away), while another thread polls
+/healthz every 100 ms. Reports how the leaf requests ended (200, or 429/503
+from the work pool) and their latency, and how long /healthz took meanwhile. With one gunicorn thread every request,
+/healthz included, queues behind the predictions; with more threads than
+work pool slots /healthz should stay in the milliseconds.
+"""
+import argparse
+import io
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE_INTERVAL = 0.1
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _photo(seed):
+    # A different image each time, so the prediction cache never answers
+    buf = io.BytesIO()
+    Image.fromarray(np.random.default_rng(seed).integers(0, 255, (480, 640, 3), dtype=np.uint8)).save(buf, 'JPEG')
+    return buf.getvalue()
+
+
+def _post_leaf(url, seed):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="leaf_image"; filename="bench.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'.encode() + _photo(seed) + f'\r\n--{boundary}--\r\n'.encode())
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+            return response.status, 0
+    except urllib.error.HTTPError as e:
+        return e.code, float(e.headers.get('Retry-After') or 0)
+
+
+def _wait_ready(base, proc):
+    while True:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base}/healthz", timeout=5) as response:
+                if b'"status":"starting"' not in response.read().replace(b' ', b''):
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+
+
+def run(threads, clients, seconds):
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY='1', GUNICORN_THREADS=str(threads))
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    lock = threading.Lock()
+    statuses, leaf_ms, probe_ms = {}, [], []
+    try:
+        _wait_ready(base, proc)
+        stop = time.perf_counter() + seconds
+        counter = iter(range(10 ** 9))
+
+        def client():
+            while time.perf_counter() < stop:
+                with lock:
+                    seed = next(counter)
+                start = time.perf_counter()
+                status, retry_after = _post_leaf(f"{base}/api/v1/health", seed)
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if status == 200:
+                        leaf_ms.append((time.perf_counter() - start) * 1000)
+                # Shed requests come back when the server says to, as a client should
+                time.sleep(retry_after)
+
+        def probe():
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                with urllib.request.urlopen(f"{base}/healthz", timeout=300) as response:
+                    response.read()
+                probe_ms.append((time.perf_counter() - start) * 1000)
+                time.sleep(PROBE_INTERVAL)
+
+        workers = [threading.Thread(target=client) for _ in range(clients)] + [threading.Thread(target=probe)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+    finally:
+        proc.terminate()
+        proc.wait()
+    return statuses, np.array(leaf_ms or [np.nan]), np.array(probe_ms or [np.nan])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--threads', default='1,8', help="gunicorn threads to compare, comma separated")
+    args = parser.parse_args()
+
+    print(f"{'threads':>7} {'200':>5} {'429':>5} {'503':>5} {'leaf p50 ms':>11} {'leaf p95 ms':>11} "
+          f"{'healthz p50':>11} {'healthz p95':>11} {'healthz max':>11}")
+    for threads in (int(t) for t in args.threads.split(',')):
+        statuses, leaf, probe = run(threads, args.clients, args.seconds)
+        print(f"{threads:>7} {statuses.get(200, 0):>5} {statuses.get(429, 0):>5} {statuses.get(503, 0):>5} "
+              f"{np.percentile(leaf, 50):>11.0f} {np.percentile(leaf, 95):>11.0f} "
+              f"{np.percentile(probe, 50):>11.1f} {np.percentile(probe, 95):>11.1f} {probe.max():>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
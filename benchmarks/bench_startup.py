@@ -0,0 +1,100 @@
+"""Cold-start timing of the app in each warmup mode.
+
+    python benchmarks/bench_startup.py [--runs 3]
+
+Starts `python app.py` on a free port and polls /healthz, recording how long
+until the port answers and until every startup stage has finished. It then
+times the first soil and leaf predictions, which used to pay for lazy model
+loading and graph tracing.
+"""
+import argparse
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('eager', 'background')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _get_json(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.load(response)
+
+
+def _post_image(url, field, extra=None):
+    buf = io.BytesIO()
+    Image.fromarray(np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)).save(buf, 'JPEG')
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode() for k, v in (extra or {}).items()]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="bench.jpg"\r\n'
+                 f'Content-Type: image/jpeg\r\n\r\n'.encode() + buf.getvalue() + b'\r\n')
+    body = b''.join(parts) + f'--{boundary}--\r\n'.encode()
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': f'multipart/form-data; boundary={boundary}'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=300) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def run(mode):
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port), AGRIBUDDY_WARMUP=mode)
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, 'app.py'], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    bound = ready = None
+    try:
+        while ready is None:
+            if proc.poll() is not None:
+                raise RuntimeError(f"app.py exited with {proc.returncode}")
+            try:
+                health = _get_json(f"{base}/healthz")
+            except OSError:
+                time.sleep(0.05)
+                continue
+            now = time.perf_counter() - start
+            bound = bound or now
+            if health['status'] != 'starting':
+                ready = now
+            else:
+                time.sleep(0.05)
+        first_soil = _post_image(f"{base}/recommendation", 'image', {'state': 'Punjab'})
+        first_leaf = _post_image(f"{base}/health", 'leaf_image')
+        stages = {name: s['seconds'] for name, s in health['startup']['stages'].items()}
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {'bound': bound, 'ready': ready, 'soil': first_soil, 'leaf': first_leaf, 'stages': stages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'mode':<11} {'bound s':>8} {'ready s':>8} {'1st soil ms':>11} {'1st leaf ms':>11}  stages (s)")
+    for mode in MODES:
+        for _ in range(args.runs):
+            r = run(mode)
+            stages = ', '.join(f"{k}={v}" for k, v in r['stages'].items() if v is not None)
+            print(f"{mode:<11} {r['bound']:>8.2f} {r['ready']:>8.2f} {r['soil'] * 1000:>11.0f} {r['leaf'] * 1000:>11.0f}  {stages}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Disk use of the upload store under sustained traffic.
+
+    python benchmarks/bench_uploads.py [--uploads 5000] [--repeat 0.3] [--store-mb 20] [--sweep-every 500]
+
+Stores --uploads photos (about 50 KB each) in a temporary UploadStore, a
+share --repeat of them copies of earlier ones, and sweeps after every
+--sweep-every uploads as the background job would. Prints the files, MiB
+and directories after each sweep, next to what one file per upload (the
+old UUID naming) would have used. Exits with status 1 if a sweep leaves the
+store over --store-mb.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from image_pipeline import wait_for_save
+from upload_store import UploadStore
+
+PHOTO_BYTES = 50 * 1024
+
+
+def _photo(rng, seed):
+    # A JPEG signature is all the store looks at; the rest just needs to be distinct
+    return b'\xff\xd8\xff\xe0' + seed.to_bytes(8, 'big') + rng.bytes(PHOTO_BYTES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--uploads', type=int, default=5000)
+    parser.add_argument('--repeat', type=float, default=0.3, help="share of uploads that repeat an earlier photo")
+    parser.add_argument('--store-mb', type=float, default=20)
+    parser.add_argument('--sweep-every', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    failures = 0
+    with tempfile.TemporaryDirectory() as root:
+        store = UploadStore(root, max_age_hours=0, max_mb=args.store_mb, sweep_seconds=0)
+        photos = []
+        print(f"{'uploads':>8} {'files':>7} {'MiB':>7} {'dirs':>5} {'naive files':>11} {'naive MiB':>9} {'sweep ms':>8}")
+        start = time.perf_counter()
+        for i in range(1, args.uploads + 1):
+            if photos and rng.random() < args.repeat:
+                data = photos[rng.integers(len(photos))]
+            else:
+                data = _photo(rng, i)
+                photos = (photos + [data])[-100:]
+            wait_for_save(store.path(store.put(data)))
+            if i % args.sweep_every == 0 or i == args.uploads:
+                store.sweep()
+                stats = store.stats()
+                dirs = sum(entry.is_dir() for entry in os.scandir(root))
+                print(f"{i:>8} {stats['files']:>7} {stats['mb']:>7.1f} {dirs:>5} {i:>11} "
+                      f"{i * PHOTO_BYTES / 2 ** 20:>9.1f} {stats['last_sweep_seconds'] * 1000:>8.1f}")
+                failures += stats['mb'] > args.store_mb
+        stats = store.stats()
+        print(f"\n{stats['stored']} written, {stats['duplicates']} duplicates not written, "
+              f"{stats['evicted_files']} evicted, in {time.perf_counter() - start:.1f}s")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Parity and speed check of leaf_colors against the per-colour inRange passes.
+
+    python benchmarks/check_leaf_colors.py [--images DIR ...]
+
+Checks, and exits with status 1 on any mismatch:
+- the colour sets of every HSV value (all 180 x 256 x 256 of them) against
+  cv2.inRange with each colour's bounds;
+- colour ratios and deficiency labels of random and real leaf crops against
+  the original five-pass heuristic, one at a time and batched;
+- the opening used for leaf segmentation against erode followed by dilate.
+
+Then times the old and new heuristic on a 224x224 crop.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from leaf_colors import COLOR_RANGES, COLORS, _color_codes, color_ratios, color_ratios_batch, classify_colors, classify_colors_batch
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def reference_ratios(rgb):
+    """The heuristic as it was: one inRange and countNonZero per colour."""
+    hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+    pixels = rgb.shape[0] * rgb.shape[1]
+    return {
+        color: cv2.countNonZero(cv2.inRange(hsv, np.array(lower), np.array(upper))) / pixels
+        for color, (lower, upper) in COLOR_RANGES.items()
+    }
+
+
+def reference_label(rgb):
+    r = reference_ratios(rgb)
+    if r['yellow'] > 0.2 and r['green'] > 0.3:
+        return "Magnesium Deficiency"
+    elif r['pale'] > 0.25:
+        return "Iron Deficiency"
+    elif r['yellow'] > 0.2:
+        return "Nitrogen Deficiency"
+    elif r['purple'] > 0.15:
+        return "Phosphorus Deficiency"
+    elif r['brown'] > 0.2:
+        return "Potassium Deficiency"
+    return "Unknown Issue"
+
+
+def check_all_hsv_values():
+    h, s, v = np.meshgrid(np.arange(180), np.arange(256), np.arange(256), indexing='ij')
+    hsv = np.stack([h, s, v], axis=-1).astype(np.uint8).reshape(180 * 256, 256, 3)
+    codes = _color_codes(hsv)
+    mismatches = 0
+    for bit, (color, (lower, upper)) in enumerate(COLOR_RANGES.items()):
+        expected = cv2.inRange(hsv, np.array(lower), np.array(upper)) > 0
+        mismatches += int(np.count_nonzero(((codes >> bit) & 1).astype(bool) != expected))
+    return mismatches
+
+
+def leaf_crops(directories, count, seed=0):
+    """224x224 RGB crops: the real images found, then synthetic leaves with
+    patches of each colour in random proportions."""
+    crops = []
+    for directory in directories:
+        for path in sorted(glob.glob(os.path.join(directory, '*'))):
+            if path.lower().endswith(IMAGE_EXTENSIONS):
+                img = cv2.imread(path)
+                if img is not None:
+                    crops.append(cv2.cvtColor(cv2.resize(img, (224, 224)), cv2.COLOR_BGR2RGB))
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        hsv = np.empty((224, 224, 3), dtype=np.uint8)
+        hsv[..., 0] = rng.integers(0, 180, (224, 224))
+        hsv[..., 1] = rng.integers(0, 256, (224, 224))
+        hsv[..., 2] = rng.integers(0, 256, (224, 224))
+        for color in rng.permutation(COLORS)[:rng.integers(1, 4)]:
+            lower, upper = COLOR_RANGES[color]
+            y, x = rng.integers(0, 150, 2)
+            size = rng.integers(30, 120)
+            patch = hsv[y:y + size, x:x + size]
+            for channel in range(3):
+                patch[..., channel] = rng.integers(lower[channel], upper[channel] + 1, patch.shape[:2])
+        crops.append(cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB))
+    return crops
+
+
+def check_crops(crops):
+    ratio_mismatches = label_mismatches = 0
+    batch_ratios = color_ratios_batch(np.stack(crops))
+    batch_labels = classify_colors_batch(np.stack(crops))
+    labels = {}
+    for i, rgb in enumerate(crops):
+        expected = reference_ratios(rgb)
+        if color_ratios(rgb) != expected or list(batch_ratios[i]) != [expected[c] for c in COLORS]:
+            ratio_mismatches += 1
+        label = reference_label(rgb)
+        labels[label] = labels.get(label, 0) + 1
+        if classify_colors(rgb) != label or batch_labels[i] != label:
+            label_mismatches += 1
+    return ratio_mismatches, label_mismatches, labels
+
+
+def check_opening(crops):
+    kernel = np.ones((5, 5), np.uint8)
+    mismatches = 0
+    for rgb in crops:
+        mask = cv2.inRange(cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV), np.array([35, 40, 40]), np.array([85, 255, 255]))
+        expected = cv2.dilate(cv2.erode(mask, kernel, iterations=1), kernel, iterations=1)
+        mismatches += int(not np.array_equal(cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel), expected))
+    return mismatches
+
+
+def per_call_ms(fn, *args, loops=500):
+    fn(*args)
+    start = time.perf_counter()
+    for _ in range(loops):
+        fn(*args)
+    return (time.perf_counter() - start) / loops * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', nargs='*', default=[os.path.join(ROOT, 'static'), os.path.join(ROOT, 'Uploads')])
+    parser.add_argument('--synthetic', type=int, default=300, help="number of synthetic leaf crops")
+    args = parser.parse_args()
+
+    failures = 0
+    mismatches = check_all_hsv_values()
+    print(f"HSV values with a different colour set: {mismatches} of {180 * 256 * 256}")
+    failures += mismatches
+
+    crops = leaf_crops(args.images, args.synthetic)
+    ratio_mismatches, label_mismatches, labels = check_crops(crops)
+    print(f"Crops checked: {len(crops)}; labels {labels}")
+    print(f"Ratio mismatches: {ratio_mismatches}; label mismatches: {label_mismatches}")
+    failures += ratio_mismatches + label_mismatches
+
+    opening_mismatches = check_opening(crops)
+    print(f"Segmentation masks differing from erode + dilate: {opening_mismatches}")
+    failures += opening_mismatches
+
+    stack = np.stack(crops[:64])
+    print(f"\n{'heuristic':<28} {'ms per crop':>11}")
+    print(f"{'inRange x5 (before)':<28} {per_call_ms(reference_label, crops[0]):>11.3f}")
+    print(f"{'lookup table':<28} {per_call_ms(classify_colors, crops[0]):>11.3f}")
+    print(f"{'lookup table, batch of 64':<28} {per_call_ms(classify_colors_batch, stack, loops=20) / len(stack):>11.3f}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
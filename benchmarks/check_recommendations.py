@@ -0,0 +1,202 @@
+"""Parity check of get_recommendations against the code before entities.py.
+
+    python benchmarks/check_recommendations.py [--show 5]
+
+Re-implements the old recommendation rule row by row from the data frames:
+each state's top crops per season by production, the first Crop_recommendation
+row of each crop, one point per requirement inside the soil and climate
+ranges, at least two points, hottest first, eight at most. It is run for
+every state in crop_production.csv and every soil class (plus padded and
+unknown names), two ways:
+
+- as it was, with the old CROP_MAP and exact lower-case labels. Results that
+  differ here are the deliberate change: crop labels such as "bajra" or
+  "sesamum" now resolve to the crops the production data names;
+- with crop and state names resolved through the entities.py registry
+  instead. Every result must then be identical, or the script exits with
+  status 1.
+"""
+import argparse
+import json
+import os
+import sys
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import utils
+from entities import crops, states, normalize, CROP_NAMES_HINDI
+
+# utils.CROP_MAP and utils.SEASON_MAPPING as they were before entities.py
+OLD_CROP_MAP = {
+    'bajra': 'pearlmillet', 'pearl millet': 'pearlmillet', 'jowar': 'sorghum', 'sorghum': 'sorghum',
+    'maize': 'maize', 'wheat': 'wheat', 'barley': 'barley', 'ragi': 'fingermillet', 'gram': 'chickpea',
+    'arhar/tur': 'pigeonpeas', 'masoor': 'lentil', 'moong(green gram)': 'mungbean', 'urad': 'blackgram',
+    'horse-gram': 'horsegram', 'peas & beans (pulses)': 'peas', 'groundnut': 'groundnut',
+    'rapeseed & mustard': 'mustard', 'soyabean': 'soyabean', 'sunflower': 'sunflower', 'sesamum': 'sesame',
+    'castor seed': 'castor', 'linseed': 'linseed', 'safflower': 'safflower', 'niger seed': 'nigerseed',
+    'cotton(lint)': 'cotton', 'jute': 'jute', 'sugarcane': 'sugarcane', 'tobacco': 'tobacco',
+    'potato': 'potato', 'onion': 'onion', 'arecanut': 'arecanut', 'coriander': 'coriander',
+    'rice': 'rice', 'coconut': 'coconut', 'banana': 'banana', 'sweet potato': 'sweetpotato',
+    'tapioca': 'tapioca', 'dry ginger': 'ginger', 'dry chillies': 'chilli', 'cashewnut': 'cashew',
+    'other kharif pulses': 'mungbean', 'khesari': 'lathyrus', 'sannhamp': 'sannhemp', 'mesta': 'mesta',
+    'cucumber': 'cucumber', 'watermelon': 'watermelon', 'muskmelon': 'muskmelon',
+    'bitter gourd': 'bittergourd', 'bottle gourd': 'bottlegourd', 'pumpkin': 'pumpkin'
+}
+OLD_SEASON_MAPPING = {
+    'Autumn': 'Kharif', 'Summer': 'Zaid', 'Winter': 'Rabi', 'Whole Year': 'Whole Year',
+    'Monsoon': 'Kharif', 'Post-Monsoon': 'Rabi', 'Spring': 'Zaid', 'Hot Weather': 'Zaid',
+    'Kharif': 'Kharif', 'Rabi': 'Rabi', 'Zaid': 'Zaid'
+}
+SOIL_COLUMNS = (('N', 'min_N', 'max_N'), ('P', 'min_P', 'max_P'), ('K', 'min_K', 'max_K'), ('ph', 'min_pH', 'max_pH'))
+CLIMATE_COLUMNS = (('temperature', 'temp_min', 'temp_max'), ('humidity', 'humidity_min', 'humidity_max'),
+                   ('rainfall', 'rainfall_min', 'rainfall_max'))
+
+
+class OldNames:
+    """Name resolution as it was: CROP_MAP for production crops, exact labels."""
+
+    def production_crop(self, crop):
+        return OLD_CROP_MAP.get(crop.strip().lower())
+
+    def crop_label(self, label):
+        return label.lower()
+
+    def state(self, name):
+        return name.strip().lower()
+
+
+class RegistryNames:
+    """The same lookups through the entities.py registry."""
+
+    def production_crop(self, crop):
+        crop_id = crops.id(crop)
+        return crops.name(crop_id) if crop_id is not None else None
+
+    def crop_label(self, label):
+        crop_id = crops.id(label)
+        return crops.name(crop_id) if crop_id is not None else normalize(label)
+
+    def state(self, name):
+        state_id = states.id(name)
+        return state_id if state_id is not None else name.strip().lower()
+
+
+class ReferenceRecommender:
+    def __init__(self, names):
+        self.names = names
+        self.crop_df = utils._load_crop_df()
+        self.soil_df = utils._load_soil_df()
+        self.production_df = utils._load_production_df()
+        self.climate_df = utils._load_climate_df()
+        # First row per crop, for both its details and its requirements
+        self.crop_rows = {}
+        for _, row in self.crop_df.iterrows():
+            self.crop_rows.setdefault(names.crop_label(str(row['label'])), row)
+        self.climate_rows = {}
+        for _, row in self.climate_df.iterrows():
+            self.climate_rows.setdefault(names.state(str(row['State'])), row)
+        self.profiles = {}
+        prod = self.production_df.assign(
+            _state=self.production_df['State_Name'].astype(str).map(names.state),
+            _season=self.production_df['Season'].astype(str).str.strip(),
+            _crop=self.production_df['Crop'].astype(str),
+        )
+        for state_key, state_data in prod.groupby('_state', sort=False):
+            season_sums = state_data.groupby(['_season', '_crop'])['Production'].sum()
+            seasons = [(OLD_SEASON_MAPPING.get(season, 'Whole Year'), season_sums.loc[season].nlargest(10).index.tolist())
+                       for season in state_data['_season'].unique()]
+            fallback = state_data.groupby('_crop')['Production'].sum().nlargest(3).index.tolist()
+            self.profiles[state_key] = (seasons, fallback)
+
+    def soil_row(self, soil_type):
+        words = soil_type.replace('_', ' ').strip().lower().split()
+        if not words:
+            return None
+        for _, row in self.soil_df.iterrows():
+            if words[0] in str(row['soil_type']).strip().lower():
+                return row
+        return None
+
+    def score(self, crop_row, soil_row, climate_row):
+        points = sum(soil_row[low] <= crop_row[col] <= soil_row[high] for col, low, high in SOIL_COLUMNS)
+        if climate_row is not None:
+            points += sum(climate_row[low] <= crop_row[col] <= climate_row[high] for col, low, high in CLIMATE_COLUMNS)
+        return points
+
+    def item(self, name, season, row):
+        return {'name': name, 'details': {
+            'season': season, 'temp': row['temperature'], 'rain': row['rainfall'], 'ph': row['ph'],
+            'hindi_name': CROP_NAMES_HINDI.get(name, "N/A"),
+        }}
+
+    def recommend(self, state_name, soil_type):
+        soil_row = self.soil_row(soil_type)
+        if soil_row is None:
+            return [], f"Could not find nutrient data for soil type '{soil_type}'."
+        state_key = self.names.state(state_name)
+        if state_key not in self.profiles:
+            return [], f"Could not find production data for '{state_name}'."
+        seasons, fallback = self.profiles[state_key]
+        climate_row = self.climate_rows.get(state_key)
+        candidates = [(crop, season) for season, top in seasons for crop in top]
+        if not candidates:
+            return [], f"No crop production data could be processed for '{state_name}'."
+        recommendations, seen = [], set()
+        for crop, season in candidates:
+            name = self.names.production_crop(crop)
+            row = self.crop_rows.get(name)
+            if name and name not in seen and row is not None and self.score(row, soil_row, climate_row) >= 2:
+                recommendations.append(self.item(name, season.strip().title(), row))
+                seen.add(name)
+        if not recommendations:
+            fallback_recs = [self.item(name, 'Based on Production Trends', self.crop_rows[name])
+                             for name in map(self.names.production_crop, fallback) if name in self.crop_rows]
+            if fallback_recs:
+                return fallback_recs, "Limited match. Using top production trends."
+            return [], f"No suitable crops for '{soil_type}' in '{state_name}'."
+        return sorted(recommendations, key=lambda rec: rec['details']['temp'], reverse=True)[:8], None
+
+
+def queries():
+    state_names = sorted(utils._load_production_df()['State_Name'].astype(str).str.strip().unique())
+    with open(os.path.join(ROOT, 'models', 'class_indices.json'), 'r') as f:
+        soil_types = list(json.load(f))
+    soil_types += ['Alluvial Soil', 'Alluvial_Soil', 'Laterite_Soil', 'Sandy']
+    padded = [f" {state_names[0].lower()} "] if state_names else []
+    return [(state, soil) for state in state_names + padded + ['Nowhere'] for soil in soil_types]
+
+
+def differences(reference, pairs):
+    return [(state, soil, expected, actual) for state, soil in pairs
+            for expected, actual in [(reference.recommend(state, soil), utils.get_recommendations(state, soil))]
+            if expected != actual]
+
+
+def describe(state, soil, expected, actual):
+    names = lambda result: [rec['name'] for rec in result[0]]
+    return f"  {state!r} / {soil!r}: {names(expected)} -> {names(actual)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--show', type=int, default=5, help="differences to print per comparison")
+    args = parser.parse_args()
+
+    utils.build_recommendation_table()
+    pairs = queries()
+    changed = differences(ReferenceRecommender(OldNames()), pairs)
+    print(f"Old code, old crop names: {len(changed)} of {len(pairs)} results differ (the intended change)")
+    for diff in changed[:args.show]:
+        print(describe(*diff))
+    mismatched = differences(ReferenceRecommender(RegistryNames()), pairs)
+    print(f"Old code, registry names: {len(mismatched)} of {len(pairs)} results differ")
+    for diff in mismatched[:args.show]:
+        print(describe(*diff))
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == '__main__':
+    main()
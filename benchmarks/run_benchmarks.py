@@ -0,0 +1,251 @@
+"""Microbenchmarks for the hot paths, checked against a stored baseline.
+
+    python benchmarks/run_benchmarks.py [--scale 1,10] [-k rainfall] [--check] [--save-baseline]
+
+Every run uses a synthetic dataset (benchmarks/synthetic_data.py) at the
+given scale, so results do not depend on which data files a checkout has,
+and stand-in Keras models (benchmarks/standin_models.py), so no .h5 files
+or network are needed. Covered:
+
+    recommendations  get_recommendations, table rebuild, get_soil_ranges
+    yields           compute_crop_yields, yield index build
+    data             loading crop_production.csv from the column cache
+    rainfall         recorded-month lookup, cached forecast, Holt-Winters fit
+                     with statsmodels and with holt_winters, and holt_winters
+                     fitting every subdivision at once
+    models           predict_soil and predict_disease on a 12 MP JPEG; the
+                     stand-in's low confidence sends every leaf through the
+                     HSV heuristic as well
+    startup          `import app` time and its peak RSS, in a fresh process
+    memory           peak RSS of the benchmark process
+
+Times are the median per call over several rounds, in ms. --check exits
+with status 1 when a result is more than --tolerance (default 50%) above
+benchmarks/baseline.json for the same scale; --save-baseline records the
+current results there. Baselines are machine specific: save one on the
+machine that runs the checks.
+"""
+import argparse
+import fnmatch
+import itertools
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic_data import dataset_dir
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+DEFAULT_TOLERANCE = 0.5
+# Differences below this (ms or MiB) are timer noise, whatever the ratio
+NOISE_FLOOR = 0.01
+ROUNDS = 5
+MIN_ROUND_SECONDS = 0.05
+PHOTO_SIZE = (4000, 3000)
+
+
+def configure_env(data_dir):
+    """Environment for importing app on the synthetic data, without real models."""
+    os.environ['AGRIBUDDY_DATA_DIR'] = data_dir
+    os.environ['AGRIBUDDY_CACHE_DIR'] = os.path.join(data_dir, '.cache')
+    os.environ['AGRIBUDDY_DEFER_MODELS'] = '1'
+    os.environ['AGRIBUDDY_WARMUP'] = 'eager'
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+
+def time_call(fn):
+    """Median seconds per call of fn()."""
+    fn()
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_ROUND_SECONDS or loops >= 1 << 16:
+            break
+        loops *= 2
+    rounds = [elapsed / loops]
+    for _ in range(ROUNDS - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        rounds.append((time.perf_counter() - start) / loops)
+    return statistics.median(rounds)
+
+
+def sample_photo(size=PHOTO_SIZE):
+    """JPEG bytes of a green leaf on brown soil, at phone-camera resolution."""
+    import cv2
+    import numpy as np
+    width, height = size
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    img[:] = (40, 70, 110)
+    noise = np.random.default_rng(0).integers(0, 30, (height, width, 1), dtype=np.uint8)
+    img = cv2.add(img, np.repeat(noise, 3, axis=2))
+    cv2.ellipse(img, (width // 2, height // 2), (width // 4, height // 3), 30, 0, 360, (40, 160, 60), -1)
+    ok, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return encoded.tobytes()
+
+
+def install_standin_models(app):
+    from benchmarks.standin_models import build_model, SOIL_INPUT, DISEASE_INPUT
+    from model_registry import LoadedModel
+    with open(os.path.join(ROOT, 'models', 'class_indices.json'), 'r') as f:
+        soil_class_names = {v: k for k, v in json.load(f).items()}
+    with open(os.path.join(ROOT, 'models', 'disease_class_names.json'), 'r') as f:
+        disease_class_names = list(json.load(f).keys())
+    soil = LoadedModel(build_model(SOIL_INPUT, len(soil_class_names)), soil_class_names)
+    disease = LoadedModel(build_model(DISEASE_INPUT, len(disease_class_names), seed=1), disease_class_names)
+    app.models.register('soil', lambda: soil)
+    app.models.register('disease', lambda: disease)
+
+
+def benchmark_cases(app):
+    """(name, callable) pairs; app has been imported on the synthetic data."""
+    import utils
+    from datacache import load_frame, source_path
+    from forecast_cache import fit_forecast, fit_forecasts
+    from yield_index import build_yield_index
+    from statsmodels.tools.sm_exceptions import ValueWarning
+    # statsmodels registers its warnings as 'always' on import, so filter after it
+    warnings.simplefilter('ignore', ValueWarning)
+
+    states = [s['english'] for s in app.STATES_FOR_DROPDOWN] or ['Punjab']
+    soils = ['Alluvial Soil', 'Black Soil', 'Clay Soil', 'Red Soil']
+    pairs = itertools.cycle([(s, t) for s in states for t in soils])
+    recs, _ = utils.get_recommendations('Punjab', 'Black Soil')
+    # a subdivision with a complete monthly series, which statsmodels can fit
+    subdivision = next(s for s in app.rainfall_cube.subdivisions if app.forecast_cache.entry(s)['status'] == 'ok')
+    recorded_year = app.rainfall_cube.first_year + 5
+    series = app.forecast_cache.series[subdivision]
+    all_series = list(app.forecast_cache.series.values())
+    photo = sample_photo()
+    install_standin_models(app)
+
+    return [
+        ('recommendations.lookup', lambda: utils.get_recommendations(*next(pairs))),
+        ('recommendations.build_table', lambda: utils.build_recommendation_table(force=True)),
+        ('recommendations.get_soil_ranges', lambda: utils.get_soil_ranges('Black Soil')),
+        ('yields.compute_crop_yields', lambda: app.compute_crop_yields(app.yield_index, 'Punjab', recs)),
+        ('yields.build_index', lambda: build_yield_index(source_path('merged_crop_data.csv'))),
+        ('data.load_crop_production', lambda: load_frame('crop_production.csv')),
+        ('rainfall.lookup', lambda: app.predict_rainfall(subdivision, recorded_year, 'JUL')),
+        ('rainfall.forecast_cached', lambda: app.predict_rainfall(subdivision, 2030, 'JUL')),
+        ('rainfall.holt_winters_fit', lambda: fit_forecast(series)),
+        ('rainfall.holt_winters_fit_numpy', lambda: fit_forecasts([series])),
+        ('rainfall.holt_winters_fit_all', lambda: fit_forecasts(all_series)),
+        ('models.predict_soil', lambda: app.predict_soil(photo)),
+        ('models.predict_disease', lambda: app.predict_disease(photo)),
+    ]
+
+
+def startup_metrics():
+    """Median `import app` seconds and peak RSS (MiB) over fresh processes."""
+    code = ("import time, resource; start = time.perf_counter(); import app; "
+            "print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)")
+    results = []
+    for i in range(4):
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=os.environ,
+                             capture_output=True, text=True, check=True).stdout
+        if i:  # the first run may compile the column cache
+            seconds, rss_kib = out.strip().splitlines()[-1].split()
+            results.append((float(seconds), int(rss_kib) / 1024))
+    return statistics.median(r[0] for r in results), max(r[1] for r in results)
+
+
+def run_scale(scale, pattern):
+    configure_env(dataset_dir(scale))
+    results = {}
+
+    def wanted(name):
+        return not pattern or fnmatch.fnmatch(name, f"*{pattern}*")
+
+    if wanted('startup.import_app') or wanted('startup.peak_rss_mib'):
+        seconds, rss = startup_metrics()
+        results['startup.import_app'] = ('ms', seconds * 1000)
+        results['startup.peak_rss_mib'] = ('MiB', rss)
+
+    import app
+    for name, fn in benchmark_cases(app):
+        if wanted(name):
+            results[name] = ('ms', time_call(fn) * 1000)
+    results['memory.peak_rss_mib'] = ('MiB', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+    return results
+
+
+def load_baseline():
+    try:
+        with open(BASELINE_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def report(scale, results, baseline, tolerance):
+    """Print results against the baseline; returns the names that regressed."""
+    regressions = []
+    print(f"\nscale x{scale:g}")
+    print(f"{'benchmark':<34} {'value':>11} {'baseline':>11} {'ratio':>6}")
+    for name, (unit, value) in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<34} {value:>8.3f} {unit:<3}{'-':>11} {'':>6}")
+            continue
+        ratio = value / base if base else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance and value - base > NOISE_FLOOR:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<34} {value:>8.3f} {unit:<3}{base:>11.3f} {ratio:>6.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', default='1', help="dataset scale, or a comma separated list (e.g. 1,10,100)")
+    parser.add_argument('-k', dest='pattern', help="only run benchmarks whose name contains this")
+    parser.add_argument('--check', action='store_true', help="exit 1 if a result regressed against the baseline")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown (0.5 = 50%%)")
+    args = parser.parse_args()
+
+    scales = [float(s) for s in args.scale.split(',')]
+    if len(scales) > 1:
+        # app reads its data paths at import, so each scale runs in its own process
+        status = 0
+        for scale in scales:
+            cmd = [sys.executable, os.path.abspath(__file__), '--scale', f"{scale:g}", '--tolerance', str(args.tolerance)]
+            cmd += [flag for flag, on in (('--check', args.check), ('--save-baseline', args.save_baseline)) if on]
+            cmd += ['-k', args.pattern] if args.pattern else []
+            status = max(status, subprocess.run(cmd, cwd=ROOT).returncode)
+        sys.exit(status)
+
+    scale = scales[0]
+    results = run_scale(scale, args.pattern)
+    key = f"x{scale:g}"
+    baseline = load_baseline()
+    regressions = report(scale, results, baseline.get(key, {}), args.tolerance)
+
+    if args.save_baseline:
+        baseline = load_baseline()  # other scales may have been saved meanwhile
+        section = baseline.setdefault(key, {})
+        section.update({name: round(value, 4) for name, (_, value) in results.items()})
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baseline for {key} to {BASELINE_PATH}")
+    if args.check and regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Small local Keras models with the same input/output shapes as the real ones.
+
+Benchmarks use these so they run on a CPU-only box without the .h5 files or
+network access. Weights are random but fixed by the seed.
+"""
+import os
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+SOIL_INPUT = (128, 128, 3)
+DISEASE_INPUT = (224, 224, 3)
+SOIL_CLASSES = 4
+DISEASE_CLASSES = 38
+
+
+def build_model(input_shape, num_classes, seed=0):
+    import tensorflow as tf
+    from tensorflow import keras
+    tf.keras.utils.set_random_seed(seed)
+    return keras.Sequential([
+        keras.Input(input_shape),
+        keras.layers.Conv2D(16, 3, strides=2, activation='relu'),
+        keras.layers.BatchNormalization(),
+        keras.layers.Conv2D(32, 3, strides=2, activation='relu'),
+        keras.layers.Conv2D(64, 3, strides=2, activation='relu'),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(64, activation='relu'),
+        keras.layers.Dense(num_classes, activation='softmax'),
+    ])
+
+
+def soil_model():
+    return build_model(SOIL_INPUT, SOIL_CLASSES)
+
+
+def disease_model():
+    return build_model(DISEASE_INPUT, DISEASE_CLASSES)
+
+
+def save_standins(models_dir):
+    """Write soil_model.h5 and plant_disease_model.h5 stand-ins into models_dir."""
+    os.makedirs(models_dir, exist_ok=True)
+    soil_model().save(os.path.join(models_dir, 'soil_model.h5'))
+    disease_model().save(os.path.join(models_dir, 'plant_disease_model.h5'))
@@ -0,0 +1,100 @@
+"""Synthetic, scalable copies of the crop production datasets.
+
+    python benchmarks/synthetic_data.py --scale 10 [--out DIR]
+
+Writes crop_production.csv and merged_crop_data.csv with BASE_ROWS x scale
+rows into DIR, next to copies of the small datasets, ready to be used with
+AGRIBUDDY_DATA_DIR=DIR. BASE_ROWS is a tenth of the real crop_production.csv,
+so --scale 10 is about the real size and --scale 100 ten times it. Rows are
+drawn from the real vocabulary of states, crops and seasons (including the
+padded season names and stray spaces of the original), and seeded, so a
+scale always produces the same files.
+"""
+import argparse
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASE_ROWS = 24_609
+SMALL_DATASETS = ('Sub_Division_IMD_2017.csv', 'Crop_recommendation.csv', 'soil_nutrient_data.xlsx', 'state_climate.csv')
+
+STATES = (
+    'Andaman and Nicobar Islands', 'Andhra Pradesh', 'Arunachal Pradesh', 'Assam', 'Bihar', 'Chandigarh',
+    'Chhattisgarh', 'Dadra and Nagar Haveli', 'Goa', 'Gujarat', 'Haryana', 'Himachal Pradesh',
+    'Jammu and Kashmir ', 'Jharkhand', 'Karnataka', 'Kerala', 'Madhya Pradesh', 'Maharashtra', 'Manipur',
+    'Meghalaya', 'Mizoram', 'Nagaland', 'Odisha', 'Puducherry', 'Punjab', 'Rajasthan', 'Sikkim',
+    'Tamil Nadu', 'Telangana ', 'Tripura', 'Uttar Pradesh', 'Uttarakhand', 'West Bengal',
+)
+CROPS = (
+    'Rice', 'Wheat', 'Maize', 'Bajra', 'Jowar', 'Ragi', 'Barley', 'Gram', 'Arhar/Tur', 'Moong(Green Gram)',
+    'Urad', 'Masoor', 'Horse-gram', 'Groundnut', 'Rapeseed &Mustard', 'Soyabean', 'Sunflower', 'Sesamum',
+    'Castor seed', 'Linseed', 'Safflower', 'Niger seed', 'Cotton(lint)', 'Jute', 'Mesta', 'Sugarcane',
+    'Tobacco', 'Potato', 'Onion', 'Sweet potato', 'Tapioca', 'Banana', 'Coconut ', 'Arecanut',
+    'Cashewnut', 'Dry chillies', 'Dry ginger', 'Turmeric', 'Coriander', 'Other Kharif pulses', 'Khesari',
+)
+SEASONS = ('Kharif     ', 'Rabi       ', 'Whole Year ', 'Autumn     ', 'Summer     ', 'Winter     ')
+SEASON_WEIGHTS = (0.35, 0.3, 0.15, 0.08, 0.07, 0.05)
+DISTRICTS_PER_STATE = 20
+
+
+def production_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    state_idx = rng.integers(0, len(STATES), rows)
+    df = pd.DataFrame({
+        'State_Name': np.asarray(STATES, dtype=object)[state_idx],
+        'District_Name': [f"DISTRICT {s}-{d}" for s, d in zip(state_idx, rng.integers(0, DISTRICTS_PER_STATE, rows))],
+        'Crop_Year': rng.integers(1997, 2016, rows),
+        'Season': rng.choice(SEASONS, rows, p=SEASON_WEIGHTS),
+        'Crop': rng.choice(CROPS, rows),
+        'Area': rng.gamma(2.0, 500.0, rows).round(1),
+    })
+    df['Production'] = (df['Area'] * rng.gamma(2.0, 1.5, rows)).round(1)
+    df.loc[rng.random(rows) < 0.015, 'Production'] = np.nan
+    return df
+
+
+def merged_frame(production_df, seed=1):
+    rng = np.random.default_rng(seed)
+    merged = production_df.copy()
+    merged['Yield'] = (merged['Production'] / merged['Area']).round(3)
+    merged['Temperature'] = rng.normal(26.0, 4.0, len(merged)).round(2)
+    return merged
+
+
+def write_dataset(out_dir, scale):
+    """Write a scaled dataset directory and return its path."""
+    os.makedirs(out_dir, exist_ok=True)
+    for name in SMALL_DATASETS:
+        shutil.copy2(os.path.join(ROOT, name), os.path.join(out_dir, name))
+    production_df = production_frame(int(BASE_ROWS * scale))
+    production_df.to_csv(os.path.join(out_dir, 'crop_production.csv'), index=False)
+    merged_frame(production_df).to_csv(os.path.join(out_dir, 'merged_crop_data.csv'), index=False)
+    return out_dir
+
+
+def dataset_dir(scale, root=None):
+    """A generated dataset for `scale` under .cache/bench-data/, created on first use."""
+    # Not imported from datacache: that would fix its paths before the caller sets them
+    cache_dir = os.environ.get('AGRIBUDDY_CACHE_DIR', os.path.join(ROOT, '.cache'))
+    out_dir = os.path.join(root or os.path.join(cache_dir, 'bench-data'), f"x{scale:g}")
+    if not os.path.exists(os.path.join(out_dir, 'merged_crop_data.csv')):
+        print(f"Generating x{scale:g} dataset ({int(BASE_ROWS * scale):,} rows) in {out_dir}")
+        write_dataset(out_dir, scale)
+    return out_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=float, default=10)
+    parser.add_argument('--out', help="output directory (default .cache/bench-data/x<scale>)")
+    args = parser.parse_args()
+    out_dir = write_dataset(args.out, args.scale) if args.out else dataset_dir(args.scale)
+    print(f"Wrote {int(BASE_ROWS * args.scale):,} rows to {out_dir}")
+
+
+if __name__ == '__main__':
+    main()
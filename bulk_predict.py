@@ -0,0 +1,248 @@
+"""Offline soil and leaf predictions for folders of survey photos.
+
+    python bulk_predict.py PHOTOS_DIR --task soil --out results.jsonl [--state Punjab]
+    python bulk_predict.py PHOTOS_DIR --task leaf --out results.csv
+    python bulk_predict.py survey.csv --out results.jsonl
+
+The source is a folder, searched recursively, or a manifest CSV with a `path`
+column and optional `state` and `task` (soil or leaf) columns; relative paths
+are resolved against the manifest's folder. For a folder, the state is
+--state or else the name of the folder each photo is in (survey/Punjab/1.jpg).
+
+Soil photos get the predicted soil type and the recommended crops for their
+state, leaf photos the detected issue, as on the web form. Photos are read
+and decoded by a pool of worker processes (one per core by default) while
+the main process runs the model on batches of them. Results are appended to
+the output (JSON lines, or CSV if it ends in .csv) as each batch finishes,
+so an interrupted run picks up where it stopped when started again with the
+same output file. Progress and images/sec are printed as it goes.
+"""
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from image_pipeline import crop_leaf, decode_rgb
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+TASKS = ('soil', 'leaf')
+CSV_FIELDS = ('path', 'task', 'state', 'soil_type', 'recommendations', 'issue', 'error')
+DEFAULT_BATCH_SIZE = 32
+PROGRESS_SECONDS = 10
+
+# `path` identifies the photo in the output; `file` is where it is read from
+Job = namedtuple('Job', 'path file task state')
+
+
+def folder_jobs(folder, task, state=None):
+    for file in sorted(glob.glob(os.path.join(folder, '**', '*'), recursive=True)):
+        if file.lower().endswith(IMAGE_EXTENSIONS):
+            yield Job(file, file, task, state or os.path.basename(os.path.dirname(file)))
+
+
+def manifest_jobs(manifest, task=None, state=None):
+    base = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            path = (row.get('path') or '').strip()
+            if not path:
+                continue
+            row_task = (row.get('task') or task or '').strip().lower()
+            yield Job(path, os.path.join(base, path), row_task, (row.get('state') or state or '').strip())
+
+
+def prepare(job):
+    """Worker side: read and decode a photo into the model's input.
+    Returns (job, uint8 array or None, error or None)."""
+    try:
+        with open(job.file, 'rb') as f:
+            data = f.read()
+        if job.task == 'soil':
+            return job, decode_rgb(data, (128, 128)).astype(np.uint8), None
+        if job.task == 'leaf':
+            return job, crop_leaf(data), None
+        return job, None, f"Unknown task '{job.task}' (expected soil or leaf)"
+    except Exception as e:
+        return job, None, f"Could not read image: {e}"
+
+
+def _trim_partial_line(path):
+    """Drop a last line left half-written by an interrupted run."""
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+
+
+def done_paths(out_path):
+    """Paths already in the output file, so a restarted run skips them."""
+    if not os.path.exists(out_path):
+        return set()
+    _trim_partial_line(out_path)
+    with open(out_path, 'r', newline='', encoding='utf-8') as f:
+        if out_path.lower().endswith('.csv'):
+            return {row['path'] for row in csv.DictReader(f) if row.get('path')}
+        done = set()
+        for line in f:
+            try:
+                done.add(json.loads(line)['path'])
+            except (ValueError, KeyError):
+                continue
+        return done
+
+
+class ResultWriter:
+    def __init__(self, path):
+        self.csv = path.lower().endswith('.csv')
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='', encoding='utf-8')
+        if self.csv:
+            self._writer = csv.DictWriter(self._file, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            if new:
+                self._writer.writeheader()
+
+    def write(self, record):
+        if self.csv:
+            row = dict(record)
+            if 'recommendations' in row:
+                row['recommendations'] = '; '.join(row['recommendations'])
+            self._writer.writerow(row)
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class Predictor:
+    """Runs batches through app's models, labelling them as the web form does."""
+
+    def __init__(self, tasks):
+        # Models are loaded below, only for the tasks present in this run
+        os.environ.setdefault('AGRIBUDDY_DEFER_MODELS', '1')
+        import app
+        self.app = app
+        app.warmup.wait('rainfall', 'crop_data')
+        if 'soil' in tasks:
+            app.models.get('soil')
+        if 'leaf' in tasks:
+            app.models.get('disease')
+
+    def soil(self, jobs, arrays):
+        app = self.app
+        soil = app.models.get('soil')
+        if soil is None:
+            return [{'error': "Soil model not loaded"} for _ in jobs]
+        predictions = soil.model.predict(np.stack(arrays).astype(np.float32) / 255.0, verbose=0)
+        records = []
+        for job, prediction in zip(jobs, predictions):
+            soil_type = app.soil_label(prediction, soil.class_names)
+            record = {'soil_type': soil_type}
+            if not job.state:
+                record['error'] = "No state given for this photo"
+            else:
+                recommendations, error = app.get_recommendations(job.state, app.recommendation_soil_type(soil_type))
+                record['recommendations'] = [rec['name'] for rec in recommendations or []]
+                if not recommendations:
+                    record['error'] = error or "No recommendations found for this soil type and state."
+            records.append(record)
+        return records
+
+    def leaf(self, jobs, arrays):
+        app = self.app
+        disease = app.models.get('disease')
+        if disease is None or not disease.class_names:
+            return [{'error': "Model not loaded"} for _ in jobs]
+        predictions = disease.model.predict(np.stack(arrays).astype(np.float32) / 255.0, verbose=0)
+        return [{'issue': app.disease_label(prediction, leaf, disease.class_names)}
+                for prediction, leaf in zip(predictions, arrays)]
+
+
+def run(jobs, out_path, workers, batch_size):
+    done = done_paths(out_path)
+    pending = [job for job in jobs if job.path not in done]
+    if done:
+        print(f"Resuming: {len(done)} photos already in {out_path}, {len(pending)} to go")
+    if not pending:
+        print("Nothing to do.")
+        return 0
+
+    predictor = Predictor({job.task for job in pending})
+    writer = ResultWriter(out_path)
+    batches = {task: ([], []) for task in TASKS}
+    count = 0
+
+    def emit(job, record):
+        nonlocal count
+        writer.write(dict({'path': job.path, 'task': job.task, 'state': job.state}, **record))
+        count += 1
+
+    def flush(task):
+        jobs_, arrays = batches[task]
+        if jobs_:
+            for job, record in zip(jobs_, getattr(predictor, task)(jobs_, arrays)):
+                emit(job, record)
+            writer.flush()
+            batches[task] = ([], [])
+
+    start = last_report = time.perf_counter()
+    # spawn, not fork: the parent has TensorFlow loaded, which does not survive fork
+    context = multiprocessing.get_context('spawn')
+    try:
+        with context.Pool(workers) as pool:
+            for job, array, error in pool.imap_unordered(prepare, pending, chunksize=4):
+                if error:
+                    emit(job, {'error': error})
+                else:
+                    batches[job.task][0].append(job)
+                    batches[job.task][1].append(array)
+                    if len(batches[job.task][0]) >= batch_size:
+                        flush(job.task)
+                now = time.perf_counter()
+                if now - last_report >= PROGRESS_SECONDS:
+                    print(f"{count}/{len(pending)} photos, {count / (now - start):.1f} images/s")
+                    last_report = now
+            for task in TASKS:
+                flush(task)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+    print(f"Processed {count} photos in {elapsed:.1f}s: {count / elapsed:.1f} images/s "
+          f"({workers} decode workers, batches of {batch_size})")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('source', help="folder of photos, or a manifest CSV")
+    parser.add_argument('--out', required=True, help="results file, .jsonl or .csv")
+    parser.add_argument('--task', choices=TASKS, help="soil or leaf (a manifest may give it per photo)")
+    parser.add_argument('--state', help="state for every soil photo (default: the photo's folder name)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="decode processes")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        if not args.task:
+            parser.error("--task is required for a folder")
+        jobs = list(folder_jobs(args.source, args.task, args.state))
+    elif os.path.isfile(args.source):
+        jobs = list(manifest_jobs(args.source, args.task, args.state))
+    else:
+        parser.error(f"{args.source} is neither a folder nor a manifest file")
+    print(f"Found {len(jobs)} photos in {args.source}")
+    return run(jobs, args.out, max(1, args.workers), max(1, args.batch_size))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
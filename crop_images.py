@@ -0,0 +1,242 @@
+"""Pre-sized, content-hashed variants of the crop photos in static/crop_images/.
+
+A result page shows up to eight crop photos, each in a card box 180 px
+tall, while the originals are up to 736x1104. `build` crops each original
+to the card's 16:9 shape around its centre, as the card's object-fit does,
+and writes it at two widths, as WebP and as JPEG for browsers without WebP:
+
+    thumb   320x180   the card on 1x screens
+    card    640x360   the card on 2x screens
+
+    static/crop_images/variants/rice.320x180.3fa2c1d9e0b4.webp
+
+Each name carries a hash of the file's bytes, so a changed photo gets a new
+URL and app.py can serve variants as immutable. Originals are never
+upscaled; a small one gets a single variant at its own size, or keeps its
+own bytes under a hashed name when those are smaller than a re-encode.
+WebP is left out where it would not be smaller than the JPEG.
+manifest.json lists the variants of every original under its lower-case
+name. `build` skips originals whose SHA-256 matches the manifest and deletes
+variants nothing refers to any more. Crops without variants (not built yet,
+or a file Pillow cannot read) are served from the original.
+
+    python crop_images.py build      (used by the Docker image)
+    python crop_images.py report     bytes per photo and the total saving
+"""
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(BASE_DIR, 'static', 'crop_images')
+VARIANTS_DIR = os.path.join(SOURCE_DIR, 'variants')
+MANIFEST_NAME = 'manifest.json'
+
+# Bump when the sizes or encoder settings change, so `build` redoes every photo
+MANIFEST_FORMAT = 1
+# (label, width, height), smallest first
+SIZES = (('thumb', 320, 180), ('card', 640, 360))
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+# Variant names are content hashes, so a browser never needs to ask again
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# <slug>.<width>x<height>.<hash>.<ext>; nothing else in VARIANTS_DIR is served
+VARIANT_PATTERN = re.compile(r'[a-z0-9-]+\.[0-9]+x[0-9]+\.[0-9a-f]{12}\.(webp|jpg)')
+
+
+def source_files(source_dir=SOURCE_DIR):
+    """The original .jpg photos, by file name."""
+    if not os.path.isdir(source_dir):
+        return []
+    return sorted(f for f in os.listdir(source_dir) if f.endswith('.jpg'))
+
+
+def _fit(image, width, height):
+    """Centre crop to width:height, scaled down to at most width x height.
+    Returns the image and whether it had to be scaled down."""
+    src_w, src_h = image.size
+    if src_w * height > src_h * width:
+        crop_w, crop_h = round(src_h * width / height), src_h
+    else:
+        crop_w, crop_h = src_w, round(src_w * height / width)
+    left, top = (src_w - crop_w) // 2, (src_h - crop_h) // 2
+    scale = min(1.0, width / crop_w)
+    size = (max(1, round(crop_w * scale)), max(1, round(crop_h * scale)))
+    from PIL import Image
+    return image.resize(size, Image.LANCZOS, box=(left, top, left + crop_w, top + crop_h)), scale < 1
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=6)
+    else:
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _write(out_dir, stem, width, height, data, fmt):
+    """Write one variant under its hashed name (once) and return the name."""
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    name = f"{stem}.{width}x{height}.{digest}.{fmt}"
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return name
+
+
+def _variants(data, stem, out_dir):
+    """Manifest entries of the variants of one original (raises if Pillow cannot read it)."""
+    from PIL import Image, ImageOps
+    with Image.open(io.BytesIO(data)) as image:
+        is_jpeg = image.format == 'JPEG'
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    variants = []
+    previous_size = None
+    for label, width, height in SIZES:
+        resized, scaled = _fit(image, width, height)
+        if resized.size == previous_size:
+            # The original is too small for this size too; the smaller variant already covers it
+            continue
+        previous_size = resized.size
+        jpg, jpg_size = _encode(resized, 'jpg'), resized.size
+        if not scaled and is_jpeg and len(data) < len(jpg):
+            # Small originals are often compressed harder than JPEG_QUALITY;
+            # the card's object-fit crops them just as well
+            jpg, jpg_size = data, image.size
+        entry = {'size': label, 'width': jpg_size[0], 'height': jpg_size[1],
+                 'jpg': _write(out_dir, stem, *jpg_size, jpg, 'jpg'), 'jpg_bytes': len(jpg)}
+        webp = _encode(resized, 'webp')
+        if len(webp) < len(jpg):
+            entry['webp'] = _write(out_dir, stem, resized.width, resized.height, webp, 'webp')
+            entry['webp_bytes'] = len(webp)
+        variants.append(entry)
+    return variants
+
+
+def _stem(filename):
+    # Spaces and brackets ("Arhar (Tur).jpg") would need quoting in a srcset
+    stem = os.path.splitext(filename)[0].lower()
+    return ''.join(c if c.isascii() and c.isalnum() else '-' for c in stem).strip('-')
+
+
+def is_variant_name(name):
+    return VARIANT_PATTERN.fullmatch(name) is not None
+
+
+def _read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest.get('images', {}) if manifest.get('format') == MANIFEST_FORMAT else {}
+
+
+def _variant_files(entry):
+    return [v[fmt] for v in entry['variants'] for fmt in ('webp', 'jpg') if fmt in v]
+
+
+def _files_exist(out_dir, entry):
+    return all(os.path.exists(os.path.join(out_dir, name)) for name in _variant_files(entry))
+
+
+def build(source_dir=SOURCE_DIR, out_dir=VARIANTS_DIR):
+    """Generate missing or outdated variants and write the manifest; returns it."""
+    os.makedirs(out_dir, exist_ok=True)
+    previous = _read_manifest(out_dir)
+    images = {}
+    built = skipped = 0
+    for filename in source_files(source_dir):
+        with open(os.path.join(source_dir, filename), 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        key = os.path.splitext(filename)[0].lower()
+        entry = previous.get(key)
+        if entry and entry['source'] == filename and entry['sha256'] == digest and _files_exist(out_dir, entry):
+            images[key] = entry
+            continue
+        try:
+            variants = _variants(data, _stem(filename), out_dir)
+        except Exception as e:
+            lfs_pointer = data.startswith(b'version https://git-lfs')
+            print(f"Skipping {filename}: {'a Git LFS pointer, run `git lfs pull`' if lfs_pointer else e}")
+            skipped += 1
+            continue
+        images[key] = {'source': filename, 'sha256': digest, 'bytes': len(data), 'variants': variants}
+        built += 1
+
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'format': MANIFEST_FORMAT, 'images': images}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+    # Variants of photos that changed or were removed
+    referenced = {name for entry in images.values() for name in _variant_files(entry)}
+    removed = 0
+    for name in os.listdir(out_dir):
+        if name != MANIFEST_NAME and name not in referenced:
+            os.remove(os.path.join(out_dir, name))
+            removed += 1
+    print(f"Crop images: {built} built, {len(images) - built} up to date, {skipped} skipped, "
+          f"{removed} old variants removed")
+    return images
+
+
+def load_variants(out_dir=VARIANTS_DIR):
+    """Manifest entries by lower-case original name, leaving out any whose
+    variant files are missing."""
+    images = _read_manifest(out_dir)
+    return {key: entry for key, entry in images.items() if _files_exist(out_dir, entry)}
+
+
+def report(images):
+    """Print the bytes of each original against its variants, and the totals."""
+    columns = [(label, fmt) for label, _, _ in SIZES for fmt in ('webp', 'jpg')]
+    print(f"{'photo':<24} {'original':>9} " + ' '.join(f"{label + ' ' + fmt:>11}" for label, fmt in columns))
+    totals = dict.fromkeys(columns, 0)
+    original_total = 0
+    for key, entry in sorted(images.items()):
+        by_label = {v['size']: v for v in entry['variants']}
+        row = []
+        for label, fmt in columns:
+            # A photo too small for the card size serves its thumb there
+            variant = by_label.get(label, entry['variants'][-1])
+            # Where WebP would not be smaller, WebP browsers get the JPEG
+            nbytes = variant.get(f'{fmt}_bytes', variant['jpg_bytes'])
+            totals[label, fmt] += nbytes
+            row.append(f"{nbytes / 1024:>9.1f}KB")
+        original_total += entry['bytes']
+        print(f"{key[:24]:<24} {entry['bytes'] / 1024:>7.1f}KB " + ' '.join(row))
+    if not images:
+        print("No variants built; run `python crop_images.py build`")
+        return
+    print(f"{'total':<24} {original_total / 1024:>7.1f}KB " +
+          ' '.join(f"{totals[column] / 1024:>9.1f}KB" for column in columns))
+    for column in columns:
+        saved = original_total - totals[column]
+        print(f"{' '.join(column)}: {saved / 1024:.1f} KB saved over {len(images)} photos "
+              f"({100 * saved / original_total:.0f}% of the originals)")
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'build'
+    if command == 'build':
+        report(build())
+    elif command == 'report':
+        report(load_variants())
+    else:
+        print("Usage: python crop_images.py [build|report]")
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,218 @@
+"""Columnar binary cache for the CSV/Excel datasets.
+
+Each source file is compiled once into a directory of .npy column files
+plus a meta.json describing dtypes and categories. String columns are
+stored as categorical codes and numeric columns are narrowed when that
+is lossless. The cache is keyed by the source file's mtime and size, so
+editing a CSV invalidates it automatically.
+
+Prebuild everything (used by the Docker image):
+    python datacache.py build
+"""
+import fcntl
+import json
+import os
+import shutil
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get('AGRIBUDDY_CACHE_DIR', os.path.join(BASE_DIR, '.cache'))
+# Where the source datasets are read from (benchmarks point this at scaled copies)
+DATA_DIR = os.environ.get('AGRIBUDDY_DATA_DIR', BASE_DIR)
+DATA_CACHE_DIR = os.path.join(CACHE_DIR, 'data')
+
+# Bump when the on-disk layout changes
+CACHE_FORMAT = 1
+
+# Memory-map cached columns so every worker process shares the same page-cache pages
+MMAP_DATA = os.environ.get('AGRIBUDDY_MMAP_DATA', '0') == '1'
+
+DATASETS = (
+    'Sub_Division_IMD_2017.csv',
+    'crop_production.csv',
+    'merged_crop_data.csv',
+    'Crop_recommendation.csv',
+    'soil_nutrient_data.xlsx',
+    'state_climate.csv',
+)
+
+
+def source_path(filename):
+    return filename if os.path.isabs(filename) else os.path.join(DATA_DIR, filename)
+
+
+def _signature(path):
+    st = os.stat(path)
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'format': CACHE_FORMAT}
+
+
+def _read_source(path):
+    if path.endswith('.xlsx'):
+        df = pd.read_excel(path, engine='openpyxl')
+    else:
+        df = pd.read_csv(path)
+    df.columns = df.columns.str.strip()
+    return df
+
+
+def _narrow_numeric(values):
+    if values.dtype.kind in 'iu':
+        return pd.to_numeric(pd.Series(values), downcast='integer').to_numpy()
+    if values.dtype.kind == 'f' and values.dtype.itemsize > 4:
+        narrowed = values.astype(np.float32)
+        if np.array_equal(narrowed.astype(values.dtype), values, equal_nan=True):
+            return narrowed
+    return values
+
+
+def _encode_column(series):
+    """Return (array, column meta) for one column."""
+    if series.dtype.kind in 'biuf':
+        return _narrow_numeric(series.to_numpy()), {'kind': 'numeric'}
+    categorical = series.astype('category')
+    categories = categorical.cat.categories.tolist()
+    if not all(isinstance(c, str) for c in categories):
+        raise TypeError(f"column '{series.name}' mixes strings and other values")
+    return categorical.cat.codes.to_numpy(), {'kind': 'category', 'categories': categories}
+
+
+def _write_cache(df, cache_dir, signature):
+    os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+    tmp_dir = f"{cache_dir}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(tmp_dir)
+    try:
+        columns = []
+        for i, name in enumerate(df.columns):
+            values, meta = _encode_column(df[name])
+            meta.update({'name': name, 'file': f"c{i}.npy"})
+            np.save(os.path.join(tmp_dir, meta['file']), values, allow_pickle=False)
+            columns.append(meta)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump({'source': signature, 'rows': len(df), 'columns': columns}, f)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.replace(tmp_dir, cache_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'meta.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _read_cache(cache_dir, meta, columns=None, mmap=False):
+    data = {}
+    for col in meta['columns']:
+        if columns is not None and col['name'] not in columns:
+            continue
+        values = np.load(os.path.join(cache_dir, col['file']), mmap_mode='r' if mmap else None, allow_pickle=False)
+        if col['kind'] == 'category':
+            values = pd.Categorical.from_codes(values, categories=col['categories'])
+        data[col['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def source_signature(filename):
+    """Version of a source file as used for cache keys, or None if it is missing."""
+    try:
+        return _signature(source_path(filename))
+    except OSError:
+        return None
+
+
+def cache_dir_for(filename):
+    return os.path.join(DATA_CACHE_DIR, os.path.basename(filename))
+
+
+def is_fresh(filename):
+    path = source_path(filename)
+    meta = _read_meta(cache_dir_for(filename))
+    return meta is not None and os.path.exists(path) and meta['source'] == _signature(path)
+
+
+def load_frame(filename, columns=None, mmap=None):
+    """Load a dataset through the cache, compiling it first if it is stale.
+
+    columns limits which columns are read back; mmap memory-maps numeric
+    and code arrays instead of reading them into private memory (defaults
+    to AGRIBUDDY_MMAP_DATA). Raises the reader's exception if the source
+    file cannot be parsed.
+    """
+    if mmap is None:
+        mmap = MMAP_DATA
+    path = source_path(filename)
+    cache_dir = cache_dir_for(filename)
+    signature = _signature(path)
+    meta = _read_meta(cache_dir)
+    if meta is not None and meta['source'] == signature:
+        try:
+            return _read_cache(cache_dir, meta, columns=columns, mmap=mmap)
+        except (OSError, ValueError):
+            # Replaced by another process while we read it; read it again under the lock
+            pass
+    return _compile(path, cache_dir, signature, columns, mmap)
+
+
+def _select(df, columns):
+    return df if columns is None else df[[c for c in df.columns if c in columns]]
+
+
+def _compile(path, cache_dir, signature, columns, mmap):
+    """Compile a stale cache and read it back. A lock file serialises this
+    across processes (server workers, bulk_predict.py, `datacache.py build`),
+    so one compiles while the others wait and then read its result."""
+    os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+    with open(f"{cache_dir}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        meta = _read_meta(cache_dir)
+        df = None
+        if meta is None or meta['source'] != signature:
+            df = _read_source(path)
+            try:
+                _write_cache(df, cache_dir, signature)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"Warning: Could not cache {os.path.basename(path)}: {e}")
+                return _select(df, columns)
+            meta = _read_meta(cache_dir)
+        try:
+            return _read_cache(cache_dir, meta, columns=columns, mmap=mmap)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Warning: Could not read the cache of {os.path.basename(path)}, using the source: {e}")
+            return _select(df if df is not None else _read_source(path), columns)
+
+
+def build_all():
+    for filename in DATASETS:
+        if not os.path.exists(source_path(filename)):
+            print(f"Skipping {filename}: not found")
+            continue
+        state = "up to date" if is_fresh(filename) else "compiled"
+        load_frame(filename)
+        print(f"{filename}: {state}")
+    # Derived tables that are expensive to rebuild at startup
+    from yield_index import build_yield_index
+    build_yield_index(source_path('merged_crop_data.csv'), os.path.join(CACHE_DIR, 'yield_index.json'))
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'build'
+    if command == 'build':
+        build_all()
+    elif command == 'clear':
+        shutil.rmtree(DATA_CACHE_DIR, ignore_errors=True)
+        print(f"Removed {DATA_CACHE_DIR}")
+    else:
+        print("Usage: python datacache.py [build|clear]")
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
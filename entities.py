@@ -0,0 +1,314 @@
+"""Canonical crops, states, IMD subdivisions, soil classes and seasons.
+
+Every dataset spells these differently: crop_production.csv says "Arhar/Tur"
+and "Cotton(lint)" where Crop_recommendation.csv says "pigeonpeas" and
+"cotton", state names carry trailing spaces, the soil model says "Clay soil"
+where the nutrient table says "Clayey Soil". Each kind of entity here is a
+Vocabulary: canonical names with integer IDs (their position in `names`)
+and the aliases that resolve to them. Names are matched after stripping,
+lowercasing, collapsing whitespace, dropping spaces around brackets and
+slashes ("Moong (Green Gram)" is "moong(green gram)") and reading "_" as a
+space.
+
+The datasets are encoded to these IDs once, when they are loaded
+(Vocabulary.encode), so lookups and joins afterwards index arrays by ID
+instead of normalising strings on every request. Names a dataset has that
+the tables below do not (a crop only grown in one state, say) are added
+as they are encoded, and logged, so a missing alias shows up as a new crop
+in the startup log; IDs are never reused, so arrays built earlier stay valid
+for the IDs they cover.
+"""
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+UNKNOWN = -1
+
+
+_BRACKET_SPACES = re.compile(r'\s*([()/])\s*')
+
+
+def normalize(name):
+    return _BRACKET_SPACES.sub(r'\1', ' '.join(str(name).replace('_', ' ').split())).lower()
+
+
+class Vocabulary:
+    def __init__(self, kind, first_word=False, lowercase=False):
+        self.kind = kind
+        self.names = []
+        # Canonical names are stored lowercased (crops, like the recommendation labels)
+        self.lowercase = lowercase
+        # Normalised canonical name or alias -> ID
+        self._ids = {}
+        # Also resolve a name by its first word alone ("Black" -> "Black Soil")
+        self.first_word = first_word
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, aliases=()):
+        """ID of `name`, adding it as a canonical name if it is not known yet."""
+        with self._lock:
+            entity_id = self._lookup(name)
+            if entity_id is None:
+                entity_id = len(self.names)
+                canonical = ' '.join(str(name).split())
+                self.names.append(canonical.lower() if self.lowercase else canonical)
+                self._ids[normalize(name)] = entity_id
+                if self.first_word:
+                    self._ids.setdefault(normalize(name).split(' ')[0], entity_id)
+            for alias in aliases:
+                self._ids.setdefault(normalize(alias), entity_id)
+            return entity_id
+
+    def _lookup(self, name):
+        # Keys are normalised, so a name that is one already needs no normalising
+        entity_id = self._ids.get(name)
+        if entity_id is not None:
+            return entity_id
+        key = normalize(name)
+        entity_id = self._ids.get(key)
+        if entity_id is None and self.first_word and key:
+            entity_id = self._ids.get(key.split(' ')[0])
+        return entity_id
+
+    def id(self, name):
+        """ID of a name or alias, or None."""
+        if name is None:
+            return None
+        return self._lookup(name)
+
+    def name(self, entity_id):
+        return self.names[entity_id]
+
+    def ids(self, names):
+        """IDs of a list of names as an int32 array, UNKNOWN for names not found."""
+        return np.array([UNKNOWN if (i := self.id(n)) is None else i for n in names], dtype=np.int32)
+
+    def encode(self, values, add=False):
+        """IDs of a column of names (int32, UNKNOWN where missing or not
+        found), with unknown names added first if `add`. Each distinct value
+        is resolved once, so this costs one lookup per label, not per row."""
+        codes, labels = label_codes(values)
+        if add:
+            new_labels = [label for label in labels if self.id(label) is None]
+            if new_labels:
+                print(f"Added {len(new_labels)} {self.kind} names entities.py does not list: {', '.join(new_labels)}")
+        resolve = self.add if add else self.id
+        label_ids = np.array([UNKNOWN if (i := resolve(label)) is None else i for label in labels] + [UNKNOWN],
+                             dtype=np.int32)
+        # Code -1 (missing) picks the trailing UNKNOWN
+        return label_ids[codes]
+
+
+def label_codes(values):
+    """Integer codes for a column of labels, -1 where missing, and the labels
+    (sorted) they index. Labels are compared after strip(), once per distinct
+    value: the datasets are categorical, so that is per category, not per row."""
+    values = values.array if isinstance(values.dtype, pd.CategoricalDtype) else pd.Categorical(values)
+    stripped = pd.Index(values.categories.astype(str)).str.strip()
+    category_codes, labels = pd.factorize(stripped, sort=True)
+    return np.append(category_codes, -1)[np.asarray(values.codes)], list(labels)
+
+
+# --- CROPS ---
+# Canonical crops are the Crop_recommendation.csv labels. Aliases are the
+# names crop_production.csv and merged_crop_data.csv use for them, and the
+# production-style labels Crop_recommendation.csv also has for some crops.
+CROP_ALIASES = {
+    'pearlmillet': ('bajra', 'pearl millet'), 'sorghum': ('jowar',), 'maize': (), 'wheat': (), 'barley': (),
+    'fingermillet': ('ragi',), 'chickpea': ('gram',), 'pigeonpeas': ('arhar/tur', 'arhar (tur)'),
+    'lentil': ('masoor',),
+    # "Other Kharif pulses" in the production data has always been recommended as mung bean
+    'mungbean': ('moong(green gram)', 'other kharif pulses'), 'blackgram': ('urad',),
+    'horsegram': ('horse-gram',), 'peas': ('peas & beans (pulses)', 'peas and beans (pulses)'), 'groundnut': (),
+    'mustard': ('rapeseed & mustard',), 'soyabean': (), 'sunflower': (), 'sesame': ('sesamum',),
+    'castor': ('castor seed',), 'linseed': (), 'safflower': (), 'nigerseed': ('niger seed',),
+    'cotton': ('cotton(lint)',), 'jute': (), 'sugarcane': (), 'tobacco': (), 'potato': (), 'onion': (),
+    'arecanut': ('areca nut',), 'coriander': (), 'rice': ('paddy',), 'coconut': (), 'banana': (),
+    'sweetpotato': ('sweet potato',),
+    'tapioca': (), 'ginger': ('dry ginger',), 'chilli': ('dry chillies',), 'cashew': ('cashewnut',),
+    'lathyrus': ('khesari',), 'sannhemp': ('sannhamp',), 'mesta': (), 'cucumber': (), 'watermelon': (),
+    'muskmelon': (), 'bittergourd': ('bitter gourd',), 'bottlegourd': ('bottle gourd',), 'pumpkin': (),
+    'mothbeans': ('moth',), 'kidneybeans': ('rajmash kholar', 'rajma'),
+    # Fruit, vegetable, spice and plantation crops only Crop_recommendation.csv has
+    'apple': (), 'coffee': (), 'grapes': (), 'mango': (), 'orange': (), 'papaya': (), 'pomegranate': (),
+    'ash gourd': (), 'beet root': (), 'ber': (), 'black pepper': (), 'cabbage': (), 'cardamom': (),
+    'carrot': (), 'cauliflower': (), 'citrus fruit': (), 'colocosia': (), 'cowpea (lobia)': (),
+    'drum stick': (), 'eggplant (brinjal)': (), 'garlic': (), 'guar seed': (), 'jackfruit': (),
+    "job's tears": (), 'korra': (), 'lab-lab': (), 'lemon': (), 'litchi': (), 'okra (bhindi)': (),
+    'peach': (), 'pear': (), 'peas (vegetable)': (), 'beans and peas (vegetable)': (), 'perilla': (),
+    'plums': (), 'radish': (), 'ribbed gourd': (), 'rubber': (), 'samai': (), 'sapota': (), 'snake gourd': (),
+    'tea': (), 'tomato': (), 'turmeric': (), 'turnip': (), 'varagu': (), 'yam': (),
+    # Crop groups in the same table, recommended under their own names
+    'cereals and millets': (), 'condiments/spices (misc)': (), 'dry fruits': (), 'fibres (misc)': (),
+    'foodgrain (total)': (), 'fresh fruits (misc)': (), 'kharif pulses (misc)': (), 'oilseeds (misc)': (),
+    'pome fruit (apples, pears, etc.)': (), 'pulses (misc)': (), 'rabi pulses (misc)': (), 'small millets': (),
+    'vegetables (misc)': (),
+}
+
+CROP_NAMES_HINDI = {
+    'arecanut': 'सुपारी', 'barley': 'जौ', 'blackgram': 'उड़द', 'castor': 'अरंडी', 'chickpea': 'चना',
+    'coriander': 'धनिया', 'cotton': 'कपास', 'fingermillet': 'रागी', 'groundnut': 'मूंगफली',
+    'horsegram': 'कुलथी', 'jute': 'जूट', 'lentil': 'मसूर', 'linseed': 'अलसी', 'maize': 'मक्का',
+    'mungbean': 'मूंग', 'mustard': 'सरसों', 'nigerseed': 'रामतिल', 'onion': 'प्याज', 'pearlmillet': 'बाजरा',
+    'peas': 'मटर', 'pigeonpeas': 'अरहर/तूर', 'potato': 'आलू', 'safflower': 'कुसुम', 'sesame': 'तिल',
+    'sorghum': 'ज्वार', 'soyabean': 'सोयाबीन', 'sugarcane': 'गन्ना', 'sunflower': 'सूरजमुखी',
+    'tobacco': 'तम्बाकू', 'wheat': 'गेहूं', 'rice': 'चावल', 'coconut': 'नारियल', 'banana': 'केला',
+    'sweetpotato': 'शकरकंद', 'tapioca': 'टैपिओका', 'ginger': 'अदरक', 'chilli': 'मिर्च', 'cashew': 'काजू',
+    'lathyrus': 'केसरी', 'mesta': 'मेस्टा', 'sannhemp': 'सनहेम्प', 'cucumber': 'खीरा',
+    'watermelon': 'तरबूज', 'muskmelon': 'खरबूजा', 'bittergourd': 'करेला', 'bottlegourd': 'लौकी', 'pumpkin': 'कद्दू',
+    'mothbeans': 'मोठ', 'kidneybeans': 'राजमा', 'apple': 'सेब', 'coffee': 'कॉफ़ी', 'grapes': 'अंगूर', 'mango': 'आम',
+    'orange': 'संतरा', 'papaya': 'पपीता', 'pomegranate': 'अनार', 'ash gourd': 'पेठा', 'beet root': 'चुकंदर',
+    'ber': 'बेर', 'black pepper': 'काली मिर्च', 'citrus fruit': 'नींबू वर्गीय फल', 'cabbage': 'पत्ता गोभी', 'cardamom': 'इलायची', 'carrot': 'गाजर',
+    'cauliflower': 'फूलगोभी', 'colocosia': 'अरबी', 'cowpea (lobia)': 'लोबिया', 'drum stick': 'सहजन',
+    'eggplant (brinjal)': 'बैंगन', 'garlic': 'लहसुन', 'guar seed': 'ग्वार', 'jackfruit': 'कटहल', 'korra': 'कंगनी',
+    'lab-lab': 'सेम', 'lemon': 'नींबू', 'litchi': 'लीची', 'okra (bhindi)': 'भिंडी', 'peach': 'आड़ू',
+    'pear': 'नाशपाती', 'peas (vegetable)': 'हरी मटर', 'perilla': 'भंगजीरा', 'plums': 'आलूबुखारा', 'radish': 'मूली',
+    'ribbed gourd': 'तोरई', 'rubber': 'रबड़', 'samai': 'कुटकी', 'sapota': 'चीकू', 'snake gourd': 'चिचिंडा',
+    'tea': 'चाय', 'tomato': 'टमाटर', 'turmeric': 'हल्दी', 'turnip': 'शलजम', 'varagu': 'कोदो', 'yam': 'जिमीकंद'
+}
+
+# --- STATES ---
+STATE_NAMES_HINDI = {
+    'Andaman and Nicobar Islands': 'अंडमान और निकोबार द्वीप समूह',
+    'Andhra Pradesh': 'आंध्र प्रदेश',
+    'Arunachal Pradesh': 'अरुणाचल प्रदेश',
+    'Assam': 'असम',
+    'Bihar': 'बिहार',
+    'Chandigarh': 'चंडीगढ़',
+    'Chhattisgarh': 'छत्तीसगढ़',
+    'Dadra and Nagar Haveli and Daman and Diu': 'दादरा और नगर हवेली और दमन और दीव',
+    'Delhi': 'दिल्ली',
+    'Goa': 'गोवा',
+    'Gujarat': 'गुजरात',
+    'Haryana': 'हरियाणा',
+    'Himachal Pradesh': 'हिमाचल प्रदेश',
+    'Jammu and Kashmir': 'जम्मू और कश्मीर',
+    'Jharkhand': 'झारखंड',
+    'Karnataka': 'कर्नाटक',
+    'Kerala': 'केरल',
+    'Ladakh': 'लद्दाख',
+    'Lakshadweep': 'लक्षद्वीप',
+    'Madhya Pradesh': 'मध्य प्रदेश',
+    'Maharashtra': 'महाराष्ट्र',
+    'Manipur': 'मणिपुर',
+    'Meghalaya': 'मेघालय',
+    'Mizoram': 'मिजोरम',
+    'Nagaland': 'नागालैंड',
+    'Odisha': 'ओडिशा',
+    'Puducherry': 'पुडुचेरी',
+    'Punjab': 'पंजाब',
+    'Rajasthan': 'राजस्थान',
+    'Sikkim': 'सिक्किम',
+    'Tamil Nadu': 'तमिलनाडु',
+    'Telangana': 'तेलंगाना',
+    'Tripura': 'त्रिपुरा',
+    'Uttar Pradesh': 'उत्तर प्रदेश',
+    'Uttarakhand': 'उत्तराखंड',
+    'West Bengal': 'पश्चिम बंगाल'
+}
+
+# Older spellings found in the government datasets
+STATE_ALIASES = {
+    'Odisha': ('Orissa',),
+    'Puducherry': ('Pondicherry',),
+    'Uttarakhand': ('Uttaranchal',),
+}
+
+# --- IMD SUBDIVISIONS ---
+# The state each subdivision's crop suggestions are drawn from
+SUBDIVISION_STATES = {
+    "Andaman & Nicobar Islands": "Andaman and Nicobar Islands",
+    "Arunachal Pradesh": "Arunachal Pradesh",
+    "Assam & Meghalaya": "Assam",
+    "Naga Manipur Mizoram & Tripura": "Manipur",
+    "Sub Himalayan West Bengal & Sikkim": "West Bengal",
+    "Gangetic West Bengal": "West Bengal",
+    "Orissa": "Odisha",
+    "Jharkhand": "Jharkhand",
+    "Bihar": "Bihar",
+    "East Uttar Pradesh": "Uttar Pradesh",
+    "West Uttar Pradesh": "Uttar Pradesh",
+    "Uttarakhand": "Uttarakhand",
+    "Haryana Delhi & Chandigarh": "Haryana",
+    "Punjab": "Punjab",
+    "Himachal Pradesh": "Himachal Pradesh",
+    "Jammu & Kashmir": "Jammu and Kashmir",
+    "West Rajasthan": "Rajasthan",
+    "East Rajasthan": "Rajasthan",
+    "West Madhya Pradesh": "Madhya Pradesh",
+    "East Madhya Pradesh": "Madhya Pradesh",
+    "Gujarat Region": "Gujarat",
+    "Saurashtra & Kutch": "Gujarat",
+    "Konkan & Goa": "Goa",
+    "Madhya Maharashtra": "Maharashtra",
+    "Marathwada": "Maharashtra",
+    "Vidharbha": "Maharashtra",
+    "Chhattisgarh": "Chhattisgarh",
+    "Coastal Andhra Pradesh": "Andhra Pradesh",
+    "Telangana": "Telangana",
+    "Rayalseema": "Andhra Pradesh",
+    "Tamil Nadu & Pondicherry": "Tamil Nadu",
+    "Coastal Karnataka": "Karnataka",
+    "North Interior Karnataka": "Karnataka",
+    "South Interior Karnataka": "Karnataka",
+    "Kerala": "Kerala",
+    "Lakshadweep": "Kerala"
+}
+
+# --- SOIL CLASSES ---
+# Nutrient table rows, with the soil model's class names as aliases. A soil
+# is also found by its first word, as get_soil_ranges always matched it.
+SOIL_ALIASES = {
+    'Alluvial Soil': (),
+    'Black Soil': (),
+    'Red Soil': (),
+    'Laterite Soil': (),
+    'Clayey Soil': ('Clay Soil', 'Clay'),
+}
+
+# --- SEASONS ---
+SEASON_ALIASES = {
+    'Kharif': ('Autumn', 'Monsoon'),
+    'Rabi': ('Winter', 'Post-Monsoon'),
+    'Zaid': ('Summer', 'Spring', 'Hot Weather'),
+    'Whole Year': (),
+}
+
+crops = Vocabulary('crop', lowercase=True)
+states = Vocabulary('state')
+subdivisions = Vocabulary('subdivision')
+soils = Vocabulary('soil', first_word=True)
+seasons = Vocabulary('season')
+
+for _name, _aliases in CROP_ALIASES.items():
+    crops.add(_name, _aliases)
+for _name in STATE_NAMES_HINDI:
+    states.add(_name, STATE_ALIASES.get(_name, ()))
+# States with a Hindi name, in dropdown order
+LISTED_STATE_IDS = np.arange(len(states), dtype=np.int32)
+for _name, _aliases in SOIL_ALIASES.items():
+    soils.add(_name, _aliases)
+for _name, _aliases in SEASON_ALIASES.items():
+    seasons.add(_name, _aliases)
+WHOLE_YEAR = seasons.id('Whole Year')
+for _name in SUBDIVISION_STATES:
+    subdivisions.add(_name)
+# Subdivision ID -> state ID
+_subdivision_state = {subdivisions.id(sub): states.id(state) for sub, state in SUBDIVISION_STATES.items()}
+
+
+def state_of_subdivision(subdivision):
+    """Name of the state a subdivision's crop suggestions come from."""
+    state_id = _subdivision_state.get(subdivisions.id(subdivision))
+    if state_id is None:
+        return subdivision.replace('&', 'and')
+    return states.name(state_id)
+
+
+def crop_hindi_name(crop_id):
+    return CROP_NAMES_HINDI.get(crops.name(crop_id), "N/A")
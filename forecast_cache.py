@@ -0,0 +1,243 @@
+"""Persistent Holt-Winters forecast cache, one fit per IMD subdivision.
+
+The rainfall tab fits an additive Holt-Winters model (seasonal_periods=12) on
+a subdivision's monthly series whenever the requested month is not in the
+data. That fit only depends on the series, so it is done at most once per data
+version: the fitted parameters and a precomputed forecast horizon are stored
+under .cache/forecasts/ and every later request is a lookup. Concurrent
+requests for the same subdivision wait for a single fit.
+
+AGRIBUDDY_FORECAST_ENGINE picks the fitter: `numpy` (default) fits any number
+of subdivisions together with holt_winters.fit_many, so warm() refits every
+subdivision in one pass; `statsmodels` runs ExponentialSmoothing one series
+at a time, as before. Both give the same forecasts to well under 0.01 mm.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from importlib.metadata import version
+
+import numpy as np
+import pandas as pd
+
+import holt_winters
+from instrumentation import timed
+from work_pool import check_cancelled
+
+MONTH_NUM = {'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
+             'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12}
+SEASONAL_PERIODS = 12
+# Months precomputed after the last observation. The model has no trend
+# component, so later months repeat the last seasonal cycle exactly.
+FORECAST_HORIZON = 120
+FORECAST_ENGINE = os.environ.get('AGRIBUDDY_FORECAST_ENGINE', 'numpy').strip().lower()
+if FORECAST_ENGINE not in ('numpy', 'statsmodels'):
+    print(f"Warning: Unknown AGRIBUDDY_FORECAST_ENGINE '{FORECAST_ENGINE}', using numpy")
+    FORECAST_ENGINE = 'numpy'
+
+
+def monthly_series(df_melted):
+    """Monthly rainfall series per subdivision, indexed by month start."""
+    if df_melted.empty:
+        return {}
+    frame = pd.DataFrame({
+        'SUBDIVISION': df_melted['SUBDIVISION'],
+        'ds': pd.to_datetime(pd.DataFrame({
+            'year': df_melted['YEAR'].astype(int),
+            'month': df_melted['MONTH'].map(MONTH_NUM).astype(int),
+            'day': 1
+        })),
+        'RAINFALL': df_melted['RAINFALL'].astype(float),
+    })
+    series = {}
+    for subdivision, group in frame.groupby('SUBDIVISION', observed=True, sort=False):
+        y = group.groupby('ds')['RAINFALL'].mean()
+        y.index.name = 'ds'
+        series[str(subdivision)] = y
+    return series
+
+
+def fit_forecast(y, horizon=FORECAST_HORIZON):
+    """Fit the rainfall tab's Holt-Winters model with statsmodels and forecast
+    `horizon` months."""
+    # statsmodels takes a second or two to import, so it is only loaded for a fit
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+    model_hw = ExponentialSmoothing(y, seasonal='add', seasonal_periods=SEASONAL_PERIODS, initialization_method='heuristic')
+    fitted = model_hw.fit()
+    params = {}
+    for key, value in fitted.params.items():
+        if isinstance(value, np.ndarray):
+            params[key] = value.tolist()
+        elif isinstance(value, (np.floating, float)):
+            params[key] = None if np.isnan(value) else float(value)
+        elif isinstance(value, (np.bool_, bool)):
+            params[key] = bool(value)
+        else:
+            params[key] = value
+    params['final_level'] = float(fitted.level.iloc[-1])
+    params['final_seasons'] = fitted.season.iloc[-SEASONAL_PERIODS:].astype(float).tolist()
+    forecast = [None if np.isnan(v) else float(v) for v in fitted.forecast(horizon).to_numpy()]
+    return params, forecast
+
+
+def is_monthly(y):
+    """True if a series has every month between its first and last."""
+    first, last = y.index.min(), y.index.max()
+    return len(y) == (last.year - first.year) * 12 + last.month - first.month + 1
+
+
+def fit_forecasts(series, horizon=FORECAST_HORIZON):
+    """Fit many series together with holt_winters; one (params, forecast)
+    pair per series, or the ValueError that series fails with."""
+    results = [None] * len(series)
+    batch = []
+    for i, y in enumerate(series):
+        if len(y) < holt_winters.min_observations(SEASONAL_PERIODS):
+            results[i] = ValueError(f"Too few observations for Holt-Winters ({len(y)})")
+        elif not is_monthly(y):
+            # statsmodels refuses these too: there is no regular monthly index
+            results[i] = ValueError("Months are missing from the series")
+        else:
+            batch.append(i)
+    if batch:
+        fits = holt_winters.fit_many([series[i].to_numpy(dtype=float) for i in batch], horizon, SEASONAL_PERIODS)
+        for i, params in zip(batch, fits):
+            results[i] = (params, params.pop('forecast'))
+    return results
+
+
+def _slug(subdivision):
+    digest = hashlib.sha1(subdivision.encode('utf-8')).hexdigest()[:8]
+    return f"{re.sub(r'[^A-Za-z0-9]+', '_', subdivision).strip('_')}-{digest}"
+
+
+class ForecastCache:
+    def __init__(self, df_melted, cache_dir, data_version):
+        self.series = monthly_series(df_melted)
+        self.cache_dir = cache_dir
+        engine_version = version('statsmodels') if FORECAST_ENGINE == 'statsmodels' else np.__version__
+        self.version = {'data': data_version, 'engine': f"{FORECAST_ENGINE}-{engine_version}", 'horizon': FORECAST_HORIZON}
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _path(self, subdivision):
+        return os.path.join(self.cache_dir, f"{_slug(subdivision)}.json")
+
+    def _read(self, subdivision):
+        try:
+            with open(self._path(subdivision), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('version') == self.version else None
+
+    def _write(self, subdivision, entry):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._path(subdivision)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(subdivision))
+        except OSError as e:
+            print(f"Warning: Could not save forecast cache for {subdivision}: {e}")
+
+    def _fit(self, subdivisions):
+        """Fresh entries for the given subdivisions, fitted as one batch."""
+        entries, pending = [], []
+        for subdivision in subdivisions:
+            y = self.series.get(subdivision)
+            entry = {'version': self.version, 'subdivision': subdivision}
+            entries.append(entry)
+            if y is None or len(y) < SEASONAL_PERIODS:
+                entry['status'] = 'short'
+                continue
+            last_date = y.index.max()
+            entry['last'] = [last_date.year, last_date.month]
+            pending.append((entry, y))
+        if not pending:
+            return entries
+        with timed('holt_winters'):
+            if FORECAST_ENGINE == 'statsmodels':
+                results = []
+                for _, y in pending:
+                    check_cancelled()
+                    try:
+                        results.append(fit_forecast(y))
+                    except Exception as e:
+                        results.append(e)
+            else:
+                results = fit_forecasts([y for _, y in pending])
+        for (entry, _), result in zip(pending, results):
+            if isinstance(result, Exception):
+                print(f"Warning: Holt-Winters failed for {entry['subdivision']}: {result}")
+                entry['status'] = 'failed'
+            else:
+                entry['params'], entry['forecast'] = result
+                entry['status'] = 'ok'
+        return entries
+
+    def _lock_for(self, subdivision):
+        with self._lock:
+            return self._locks.setdefault(subdivision, threading.Lock())
+
+    def entry(self, subdivision):
+        """The cached fit for a subdivision, fitting it on first use."""
+        if subdivision not in self.series:
+            return {'version': self.version, 'subdivision': subdivision, 'status': 'short'}
+        entry = self._entries.get(subdivision)
+        if entry is not None:
+            return entry
+        with self._lock_for(subdivision):
+            entry = self._entries.get(subdivision)
+            if entry is None:
+                entry = self._read(subdivision)
+                if entry is None:
+                    entry = self._fit([subdivision])[0]
+                    self._write(subdivision, entry)
+                self._entries[subdivision] = entry
+        return entry
+
+    def predict(self, subdivision, year, month):
+        """Forecast for a month after the data ends, or None when the caller
+        should fall back to the subdivision mean (short series, failed fit,
+        target inside the data range or an unknown month)."""
+        entry = self.entry(subdivision)
+        if entry['status'] != 'ok' or month not in MONTH_NUM:
+            return None
+        last_year, last_month = entry['last']
+        months_diff = (year - last_year) * 12 + (MONTH_NUM[month] - last_month)
+        if months_diff <= 0:
+            return None
+        forecast = entry['forecast']
+        if months_diff > len(forecast):
+            # Beyond the stored horizon: repeat the final seasonal cycle
+            months_diff = len(forecast) - SEASONAL_PERIODS + (months_diff - len(forecast) - 1) % SEASONAL_PERIODS + 1
+        return forecast[months_diff - 1]
+
+    def warm(self, subdivisions=None):
+        """Load the entries of the given subdivisions (all by default), fitting
+        the ones missing from the disk cache together in one batch."""
+        # Sorted, so concurrent warm() calls take the locks in the same order
+        subdivisions = sorted({s for s in (self.series if subdivisions is None else subdivisions) if s in self.series})
+        locks = [self._lock_for(subdivision) for subdivision in subdivisions]
+        for lock in locks:
+            lock.acquire()
+        try:
+            missing = []
+            for subdivision in subdivisions:
+                if subdivision in self._entries:
+                    continue
+                entry = self._read(subdivision)
+                if entry is None:
+                    missing.append(subdivision)
+                else:
+                    self._entries[subdivision] = entry
+            for subdivision, entry in zip(missing, self._fit(missing)):
+                self._write(subdivision, entry)
+                self._entries[subdivision] = entry
+        finally:
+            for lock in locks:
+                lock.release()
@@ -0,0 +1,55 @@
+"""Gunicorn settings for running several workers on shared, read-only data.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The master imports app.py once (preload_app) so the rainfall table, the
+recommendation table, the yield index and the crop requirements are built
+before forking and shared copy-on-write by every worker. Dataset columns
+are memory-mapped from the binary cache (datacache.py), so they live in the
+page cache rather than in each process. TensorFlow is not fork-safe, so
+each worker loads its own models after the fork (in the background with
+AGRIBUDDY_WARMUP=background, so the worker starts serving at once).
+
+Set WEB_CONCURRENCY / GUNICORN_THREADS to size the server.
+"""
+import gc
+import os
+
+from worker_memory import memory_stats, format_stats
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '7860')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+# More threads than the work pool has slots (AGRIBUDDY_WORKERS + AGRIBUDDY_QUEUE_DEPTH),
+# so light routes are answered while every slot is taken
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+timeout = 300
+preload_app = True
+
+# Read by datacache.py and app.py when the master imports the app
+os.environ.setdefault('AGRIBUDDY_MMAP_DATA', '1')
+os.environ.setdefault('AGRIBUDDY_DEFER_MODELS', '1')
+
+
+def when_ready(server):
+    # With AGRIBUDDY_WARMUP=background the datasets load on a thread; finish
+    # them before forking so every worker inherits the loaded data.
+    import app
+    app.warmup.wait(*app.DATA_STAGES)
+    # Move everything built during preload out of the collector's reach, so
+    # garbage collection in the workers does not write to (and un-share) those pages.
+    gc.collect()
+    gc.freeze()
+    stats = memory_stats()
+    if stats:
+        server.log.info("Master after preload: %s", format_stats(stats))
+
+
+def post_fork(server, worker):
+    import app
+    app.start_warmup(app.MODEL_STAGES)
+
+
+def post_worker_init(worker):
+    stats = memory_stats()
+    if stats:
+        worker.log.info("Worker %s ready: %s", worker.pid, format_stats(stats))
@@ -0,0 +1,168 @@
+"""Additive Holt-Winters fitted for many series at once, in NumPy.
+
+The rainfall forecast is statsmodels' ExponentialSmoothing(seasonal='add',
+initialization_method='heuristic') without a trend: the initial level and
+seasons come from a moving-average decomposition of the first cycles, and
+only the level and seasonal smoothing weights (alpha, gamma) are fitted, by
+least squares on the one-step-ahead errors. statsmodels does that one series
+at a time through a generic optimizer.
+
+Here the series are stacked into a 2-D array (left-aligned, NaN-padded) and
+the smoothing recursion runs once over time for every series and every
+candidate (alpha, gamma) pair together. The search starts from the same coarse
+kind of grid statsmodels uses for its starting values and then repeatedly zooms into
+a small grid around each series' best pair, so all subdivisions are fitted in
+a few passes over the data.
+"""
+import numpy as np
+import pandas as pd
+
+SEASONAL_PERIODS = 12
+# statsmodels keeps alpha strictly inside (0, 1)
+ALPHA_BOUND = np.sqrt(np.finfo(float).eps)
+# Coarse (alpha, gamma) grid, laid out like statsmodels' brute-force starting
+# values (which use 43 points); the refinement rounds below then shrink a
+# REFINE_POINTS x REFINE_POINTS grid around each series' best pair
+GRID_POINTS = 21
+REFINE_POINTS = 5
+REFINE_ROUNDS = 12
+REFINE_SHRINK = 2.5
+
+
+def min_observations(m=SEASONAL_PERIODS):
+    """Shortest series the heuristic initialization accepts: two full cycles,
+    and ten points left once the centred moving average drops m // 2 at each end."""
+    return max(2 * m, 10 + 2 * (m // 2))
+
+
+def heuristic_initial_values(values, lengths, m=SEASONAL_PERIODS):
+    """Initial level and seasons per series, as statsmodels'
+    _initialization_heuristic computes them (Hyndman & Athanasopoulos 2.6).
+    `values` is (series, time), left-aligned; returns ((series,), (series, m))."""
+    n_series = values.shape[0]
+    level = np.empty(n_series)
+    seasons = np.empty((n_series, m))
+    cycles = np.maximum(np.minimum(5, lengths // m), int(np.ceil((10 + 2 * (m // 2)) / m)))
+    for k in np.unique(cycles):
+        rows = np.flatnonzero(cycles == k)
+        # Columns are series, so pandas rolls every series at once
+        frame = pd.DataFrame(values[rows, :m * k].T)
+        trend = frame.rolling(m, center=True).mean()
+        if m % 2 == 0:
+            trend = trend.shift(-1).rolling(2).mean()
+        detrended = (frame - trend).to_numpy()
+        group_seasons = np.nanmean(detrended.T.reshape(len(rows), k, m), axis=1)
+        seasons[rows] = group_seasons - group_seasons.mean(axis=1, keepdims=True)
+        trend = trend.to_numpy()
+        first = np.argmax(~np.isnan(trend), axis=0)
+        exog = np.c_[np.ones(10), np.arange(10) + 1]
+        window = np.stack([trend[f:f + 10, j] for j, f in enumerate(first)], axis=1)
+        level[rows] = (np.linalg.pinv(exog) @ window)[0]
+    return level, seasons
+
+
+def _smooth(values, valid, alpha, gamma, level0, seasons0, m):
+    """Run the recursion for candidate (alpha, gamma) arrays of shape (series, k).
+
+    Returns the sum of squared one-step errors, and the level and the next
+    m seasons ((m, series, k); slot t % m holds the season for time t) after
+    each series' last observation."""
+    shape = alpha.shape
+    level = np.broadcast_to(level0[:, None], shape).copy()
+    # Season-major so each step reads and writes one contiguous slot
+    seasons = np.broadcast_to(seasons0.T[:, :, None], (m,) + shape).copy()
+    sse = np.zeros(shape)
+    error, step = np.empty(shape), np.empty(shape)
+    # As in statsmodels, a series' last observation updates the level but not
+    # the season, so the forecast 12 months out reuses the season before it
+    season_valid = np.concatenate([valid[:, 1:], np.zeros((valid.shape[0], 1), dtype=bool)], axis=1)
+    all_valid, all_season_valid = valid.all(axis=0), season_valid.all(axis=0)
+    for t in range(values.shape[1]):
+        # Error-correction form: level += alpha * error, season += gamma * error
+        slot = seasons[t % m]
+        np.subtract(values[:, t, None], level, out=error)
+        error -= slot
+        if not all_valid[t]:
+            # Series that have already ended keep their final state
+            error[~valid[:, t]] = 0.0
+        np.multiply(error, error, out=step)
+        sse += step
+        np.multiply(alpha, error, out=step)
+        level += step
+        np.multiply(gamma, error, out=step)
+        if not all_season_valid[t]:
+            step[~season_valid[:, t]] = 0.0
+        slot += step
+    return sse, level, seasons
+
+
+def _coarse_grid(m_points=GRID_POINTS):
+    step = 0.005
+    pairs = []
+    for a in np.linspace(step, 1 - step, m_points):
+        n_gamma = int(np.ceil(m_points * np.sqrt(1 - a)))
+        for g in np.linspace(0, 1 - a, n_gamma):
+            pairs.append((a, g))
+    return np.array(pairs).T
+
+
+def _clip(alpha, gamma):
+    alpha = np.clip(alpha, ALPHA_BOUND, 1 - ALPHA_BOUND)
+    return alpha, np.clip(gamma, 0.0, 1 - alpha)
+
+
+def fit_many(series_list, horizon, m=SEASONAL_PERIODS):
+    """Fit every series (1-D arrays of consecutive months) and forecast
+    `horizon` months after each one's end.
+
+    Returns one dict per series with the fitted weights, initial and final
+    state (final_seasons are the seasons of the next m months), SSE and the
+    forecast list. Raises ValueError, like statsmodels, if a series is
+    shorter than min_observations(m)."""
+    lengths = np.array([len(y) for y in series_list])
+    if lengths.min() < min_observations(m):
+        raise ValueError(f"Cannot fit Holt-Winters on fewer than {min_observations(m)} observations")
+    values = np.full((len(series_list), lengths.max()), np.nan)
+    for i, y in enumerate(series_list):
+        values[i, :len(y)] = y
+    valid = np.arange(values.shape[1])[None, :] < lengths[:, None]
+    level0, seasons0 = heuristic_initial_values(values, lengths, m)
+    n_series = len(series_list)
+
+    grid_alpha, grid_gamma = _coarse_grid()
+    alpha = np.broadcast_to(grid_alpha, (n_series, grid_alpha.size))
+    gamma = np.broadcast_to(grid_gamma, (n_series, grid_gamma.size))
+    sse, _, _ = _smooth(values, valid, alpha, gamma, level0, seasons0, m)
+    best = np.argmin(sse, axis=1)
+    rows = np.arange(n_series)
+    best_alpha, best_gamma, best_sse = alpha[rows, best], gamma[rows, best], sse[rows, best]
+
+    offsets = np.linspace(-1, 1, REFINE_POINTS)
+    offset_alpha, offset_gamma = (o.ravel() for o in np.meshgrid(offsets, offsets))
+    step = 1.0 / GRID_POINTS
+    for _ in range(REFINE_ROUNDS):
+        alpha, gamma = _clip(best_alpha[:, None] + step * offset_alpha, best_gamma[:, None] + step * offset_gamma)
+        sse, _, _ = _smooth(values, valid, alpha, gamma, level0, seasons0, m)
+        best = np.argmin(sse, axis=1)
+        improved = sse[rows, best] < best_sse
+        best_alpha = np.where(improved, alpha[rows, best], best_alpha)
+        best_gamma = np.where(improved, gamma[rows, best], best_gamma)
+        best_sse = np.where(improved, sse[rows, best], best_sse)
+        step /= REFINE_SHRINK
+
+    _, level, seasons = _smooth(values, valid, best_alpha[:, None], best_gamma[:, None], level0, seasons0, m)
+    results = []
+    for i, n in enumerate(lengths):
+        future = (n + np.arange(horizon)) % m
+        forecast = level[i, 0] + seasons[future, i, 0]
+        results.append({
+            'smoothing_level': float(best_alpha[i]),
+            'smoothing_seasonal': float(best_gamma[i]),
+            'initial_level': float(level0[i]),
+            'initial_seasons': seasons0[i].tolist(),
+            'final_level': float(level[i, 0]),
+            'final_seasons': seasons[(n + np.arange(m)) % m, i, 0].tolist(),
+            'sse': float(best_sse[i]),
+            'forecast': [None if np.isnan(v) else float(v) for v in forecast],
+        })
+    return results
@@ -0,0 +1,97 @@
+"""Compact, compressed and conditionally cached HTTP responses.
+
+json_response() serialises without whitespace and, for deterministic GET
+responses, adds a weak ETag of the body plus Cache-Control, answering 304
+when the client already has that version. gzip_response() compresses a
+response when the client accepts gzip and the body is worth it. PageCache
+keeps rendered pages, already compressed, until their version changes.
+"""
+import gzip
+import hashlib
+import json
+import threading
+
+from flask import Response, request
+
+# Bodies smaller than this are sent as is; gzip would barely help
+GZIP_MIN_BYTES = 512
+GZIP_LEVEL = 6
+
+
+def gzip_response(response):
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or not request.accept_encodings['gzip']):
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def conditional_response(response, max_age):
+    """Tag a 200 response with a weak ETag of its body and Cache-Control;
+    turns it into a 304 when If-None-Match matches."""
+    if response.status_code != 200:
+        return response
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest()[:20], weak=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+
+def json_response(payload, status=200, max_age=None):
+    """Compact JSON; pass max_age for responses that only change with the data."""
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+    response = Response(body, status=status, mimetype='application/json')
+    if max_age is not None:
+        response = conditional_response(response, max_age)
+    return gzip_response(response)
+
+
+class PageCache:
+    """Rendered pages keyed by name, each with its gzip body and ETag.
+
+    A page is rendered again when the version passed in differs from the
+    one it was rendered for."""
+
+    def __init__(self):
+        self._pages = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+
+    def _entry(self, name, version, render):
+        entry = self._pages.get(name)
+        if entry is not None and entry['version'] == version:
+            self.hits += 1
+            return entry
+        body = render().encode('utf-8')
+        entry = {
+            'version': version,
+            'body': body,
+            'gzip': gzip.compress(body, compresslevel=9),
+            'etag': hashlib.sha1(body).hexdigest()[:20],
+        }
+        with self._lock:
+            self._pages[name] = entry
+            self.renders += 1
+        return entry
+
+    def response(self, name, version, render, mimetype='text/html'):
+        """The cached page as a response; browsers revalidate it with If-None-Match."""
+        entry = self._entry(name, version, render)
+        response = Response(entry['body'], mimetype=mimetype)
+        response.set_etag(entry['etag'], weak=True)
+        response.cache_control.no_cache = True
+        response.vary.add('Accept-Encoding')
+        response = response.make_conditional(request)
+        if response.status_code == 200 and request.accept_encodings['gzip']:
+            response.set_data(entry['gzip'])
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    def stats(self):
+        return {'pages': len(self._pages), 'hits': self.hits, 'renders': self.renders}
@@ -0,0 +1,190 @@
+"""In-memory decoding of uploaded images.
+
+Uploads used to be written to Uploads/ and read back at full resolution,
+only to be shrunk to 128x128 (soil) or 224x224 (leaf). Here the request
+body is decoded straight from memory, and JPEGs are decoded at a reduced
+DCT scale (1/2, 1/4 or 1/8) when the smaller image is still large enough
+for the model input. A 12 MP phone photo then decodes at about 1/64th of
+the pixels.
+
+Only the leaf image is shown back to the user, so it is the only one
+written to disk, in the background. Set AGRIBUDDY_KEEP_UPLOADS=1 to keep
+the soil uploads too. Timings of each stage are collected for /healthz.
+"""
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from instrumentation import observe
+
+KEEP_UPLOADS = os.environ.get('AGRIBUDDY_KEEP_UPLOADS', '0') == '1'
+STAGES = ('read', 'decode', 'resize', 'save')
+# Leaf photos are decoded with their shorter side reduced to no less than this,
+# so the leaf crop still has enough pixels to be resized to 224x224
+LEAF_DECODE_MIN_SIDE = 448
+# (scale factor, OpenCV flag), largest reduction first
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+_timings = {stage: [0, 0.0, 0.0] for stage in STAGES}  # count, total ms, max ms
+_timings_lock = threading.Lock()
+
+
+def record(stage, start):
+    """Add the time since `start` (a perf_counter value) to a stage."""
+    seconds = time.perf_counter() - start
+    observe(stage, seconds)
+    elapsed = seconds * 1000
+    with _timings_lock:
+        entry = _timings[stage]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+    return elapsed
+
+
+def timing_stats():
+    with _timings_lock:
+        return {
+            stage: {
+                'count': count,
+                'mean_ms': round(total / count, 2) if count else 0.0,
+                'max_ms': round(max_ms, 2),
+            }
+            for stage, (count, total, max_ms) in _timings.items()
+        }
+
+
+def read_upload(file_storage):
+    """The raw bytes of an uploaded file."""
+    start = time.perf_counter()
+    data = file_storage.read()
+    record('read', start)
+    return data
+
+
+def decode_rgb(data, size):
+    """Decode to an RGB float32 array of `size` (width, height), matching
+    keras' load_img (nearest-neighbour resize). JPEGs are drafted to the
+    smallest DCT scale that is still at least `size`."""
+    start = time.perf_counter()
+    img = Image.open(io.BytesIO(data))
+    img.draft('RGB', size)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    else:
+        img.load()
+    record('decode', start)
+    start = time.perf_counter()
+    if img.size != size:
+        img = img.resize(size, Image.NEAREST)
+    array = np.asarray(img, dtype=np.float32)
+    record('resize', start)
+    return array
+
+
+def _reduced_flag(data, min_side):
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.format != 'JPEG':
+                return cv2.IMREAD_COLOR, 1
+            short_side = min(img.size)
+    except Exception:
+        return cv2.IMREAD_COLOR, 1
+    for factor, flag in REDUCED_FLAGS:
+        if short_side // factor >= min_side:
+            return flag, factor
+    return cv2.IMREAD_COLOR, 1
+
+
+def decode_bgr(data, min_side):
+    """Decode to a BGR uint8 array like cv2.imread, at the largest JPEG
+    reduction that keeps the shorter side at least `min_side` pixels.
+    Returns (image or None, scale factor)."""
+    start = time.perf_counter()
+    flag, factor = _reduced_flag(data, min_side)
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+    record('decode', start)
+    return img, factor
+
+
+def crop_leaf(data, min_side=LEAF_DECODE_MIN_SIDE, size=224):
+    """The leaf in a photo, as a `size` x `size` RGB uint8 array: the bounding
+    box of the largest green region, or the whole photo if that is too small."""
+    # Decoded at up to 1/8 scale; `scale` maps sizes back to full-resolution pixels
+    img, scale = decode_bgr(data, min_side)
+    if img is None:
+        raise ValueError("Invalid image file")
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, np.array([35, 40, 40]), np.array([85, 255, 255]))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((5, 5), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    start = time.perf_counter()
+    leaf_img = img
+    if contours:
+        x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+        if w * scale > 20 and h * scale > 20:
+            leaf_img = img[y:y+h, x:x+w]
+    leaf_img = cv2.resize(leaf_img, (size, size))
+    record('resize', start)
+    return cv2.cvtColor(leaf_img, cv2.COLOR_BGR2RGB)
+
+
+# --- BACKGROUND SAVES ---
+_saver, _saver_pid = None, None
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def _executor():
+    # Created lazily, and again in a forked worker, since threads do not survive fork
+    global _saver, _saver_pid
+    with _pending_lock:
+        if _saver_pid != os.getpid():
+            _saver = ThreadPoolExecutor(max_workers=2, thread_name_prefix='upload-save')
+            _saver_pid = os.getpid()
+            _pending.clear()
+        return _saver
+
+
+def _write(data, path):
+    start = time.perf_counter()
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: Could not save upload {path}: {e}")
+    record('save', start)
+
+
+def _forget(path, future):
+    with _pending_lock:
+        if _pending.get(path) is future:
+            del _pending[path]
+
+
+def save_async(data, path):
+    """Write an upload in the background; the file appears atomically."""
+    executor = _executor()
+    with _pending_lock:
+        future = executor.submit(_write, data, path)
+        _pending[path] = future
+    future.add_done_callback(lambda f: _forget(path, f))
+
+
+def wait_for_save(path, timeout=10):
+    """Block until a pending background save of `path` has finished."""
+    with _pending_lock:
+        future = _pending.get(path)
+    if future is not None:
+        try:
+            future.result(timeout=timeout)
+        except Exception:
+            pass
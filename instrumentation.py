@@ -0,0 +1,143 @@
+"""Per-stage latency histograms, Server-Timing headers and debug logging.
+
+Code on the request path wraps its slow steps in `timed(stage)`. Each
+duration goes into a process-wide histogram, exposed in the Prometheus text
+format by prometheus_text() (served on /metrics), and, inside a request, is
+added to that request's totals for the Server-Timing response header.
+
+Debug logging goes through the 'agribuddy' logger. Its level comes from
+AGRIBUDDY_LOG_LEVEL (default INFO, so debug calls return straight away), and
+AGRIBUDDY_LOG_SAMPLE keeps debug output for only a fraction of requests.
+"""
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+STAGES = ('read', 'decode', 'resize', 'save', 'inference', 'recommendations', 'yields', 'holt_winters', 'render')
+# Upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LOG_LEVEL = os.environ.get('AGRIBUDDY_LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE = float(os.environ.get('AGRIBUDDY_LOG_SAMPLE', '1'))
+
+log = logging.getLogger('agribuddy')
+if not log.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    log.addHandler(_handler)
+    log.setLevel(LOG_LEVEL)
+    log.propagate = False
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+    def copy(self):
+        other = Histogram()
+        other.counts, other.total, other.count = self.counts[:], self.total, self.count
+        return other
+
+
+_stages = {stage: Histogram() for stage in STAGES}
+_requests = {}  # (endpoint, method, status) -> Histogram
+_lock = threading.Lock()
+
+
+def observe(stage, seconds):
+    """Record a stage duration; inside a request it also counts towards Server-Timing."""
+    with _lock:
+        histogram = _stages.get(stage)
+        if histogram is None:
+            histogram = _stages[stage] = Histogram()
+        histogram.observe(seconds)
+    if has_request_context():
+        timings = g.setdefault('stage_timings', {})
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block (or, as a decorator, each call) as `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def observe_request(endpoint, method, status, seconds):
+    key = (endpoint or 'unknown', method, str(status))
+    with _lock:
+        histogram = _requests.get(key)
+        if histogram is None:
+            histogram = _requests[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def server_timing(total_seconds=None):
+    """Server-Timing header value for the current request's stages, in ms."""
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in g.get('stage_timings', {}).items()]
+    if total_seconds is not None:
+        parts.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ', '.join(parts)
+
+
+def _histogram_lines(name, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_sum{{{labels}}} {histogram.total:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+    return lines
+
+
+def prometheus_text():
+    """Every histogram in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        stages = [(stage, h.copy()) for stage, h in _stages.items()]
+        requests = [(key, h.copy()) for key, h in sorted(_requests.items())]
+    lines = [
+        '# HELP agribuddy_stage_duration_seconds Time spent in each processing stage.',
+        '# TYPE agribuddy_stage_duration_seconds histogram',
+    ]
+    for stage, histogram in stages:
+        lines += _histogram_lines('agribuddy_stage_duration_seconds', f'stage="{stage}"', histogram)
+    lines += [
+        '# HELP agribuddy_request_duration_seconds Time to handle a request.',
+        '# TYPE agribuddy_request_duration_seconds histogram',
+    ]
+    for (endpoint, method, status), histogram in requests:
+        labels = f'endpoint="{endpoint}",method="{method}",status="{status}"'
+        lines += _histogram_lines('agribuddy_request_duration_seconds', labels, histogram)
+    return '\n'.join(lines) + '\n'
+
+
+def debug_enabled():
+    """Whether to emit debug logging here. Sampling is decided once per request,
+    so a sampled request logs all of its lines."""
+    if not log.isEnabledFor(logging.DEBUG):
+        return False
+    if LOG_SAMPLE >= 1:
+        return True
+    if not has_request_context():
+        return random.random() < LOG_SAMPLE
+    if 'log_sampled' not in g:
+        g.log_sampled = random.random() < LOG_SAMPLE
+    return g.log_sampled
@@ -0,0 +1,95 @@
+"""Colour-ratio heuristic for leaves the disease model is unsure about.
+
+The heuristic looks at the share of yellow, purple, brown, green and pale
+pixels in the 224x224 leaf crop. It used to run one cv2.inRange and
+countNonZero pass per colour. Here every colour's HSV box is folded into
+per-channel lookup tables that map a channel value to a bitmask of the
+colours whose range contains it: ANDing the three masks gives each pixel's
+colour set, and one 32-bin histogram of those codes yields every ratio. Boxes are inclusive on both ends, as with cv2.inRange, so the
+counts are exactly the same.
+
+color_ratios_batch() does the same for a stack of crops at once.
+"""
+import cv2
+import numpy as np
+
+# name: (lower HSV, upper HSV), OpenCV ranges (H 0-179)
+COLOR_RANGES = {
+    'yellow': ((20, 100, 100), (30, 255, 255)),
+    'purple': ((130, 50, 50), (160, 255, 255)),
+    'brown': ((10, 100, 20), (20, 255, 200)),
+    'green': ((35, 50, 50), (85, 255, 255)),
+    'pale': ((30, 30, 100), (60, 100, 255)),
+}
+COLORS = tuple(COLOR_RANGES)
+_CODES = 1 << len(COLORS)
+
+
+def _build_luts():
+    """One 256-entry table per HSV channel: the colours whose range holds each value."""
+    luts = np.zeros((3, 256), dtype=np.uint8)
+    for bit, (lower, upper) in enumerate(COLOR_RANGES.values()):
+        for channel in range(3):
+            luts[channel, lower[channel]:upper[channel] + 1] |= 1 << bit
+    return luts
+
+
+_H_LUT, _S_LUT, _V_LUT = _build_luts()
+# _CODE_COLORS[code, i] is 1 when colour i is in the pixel set `code`
+_CODE_COLORS = ((np.arange(_CODES)[:, None] >> np.arange(len(COLORS))) & 1).astype(np.float64)
+
+
+def _color_codes(hsv):
+    """Per-pixel bitmask of the colours an HSV image's pixels fall in."""
+    h, s, v = cv2.split(hsv)
+    return cv2.bitwise_and(cv2.bitwise_and(cv2.LUT(h, _H_LUT), cv2.LUT(s, _S_LUT)), cv2.LUT(v, _V_LUT))
+
+
+def _color_counts(codes):
+    """Pixels of each colour, from a 2-D array of colour codes (exact up to
+    2**24 pixels, the limit of calcHist's float32 bins)."""
+    histogram = cv2.calcHist([codes], [0], None, [_CODES], [0, _CODES])
+    return (histogram.ravel() @ _CODE_COLORS).astype(np.int64)
+
+
+def color_ratios(rgb):
+    """{colour: share of pixels} for one RGB uint8 image."""
+    codes = _color_codes(cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV))
+    pixels = codes.size
+    return {color: int(count) / pixels for color, count in zip(COLORS, _color_counts(codes))}
+
+
+def color_ratios_batch(images):
+    """Colour shares for a stack of same-sized RGB uint8 images, as an
+    (n, len(COLORS)) array whose columns follow COLORS."""
+    images = np.ascontiguousarray(images, dtype=np.uint8)
+    n, height, width = images.shape[:3]
+    # One conversion and lookup over the stack, viewed as a single tall image
+    codes = _color_codes(cv2.cvtColor(images.reshape(n * height, width, 3), cv2.COLOR_RGB2HSV))
+    counts = np.stack([_color_counts(codes[i * height:(i + 1) * height]) for i in range(n)])
+    return counts / float(height * width)
+
+
+def deficiency(ratios):
+    """The deficiency suggested by a leaf's colour shares."""
+    if ratios['yellow'] > 0.2 and ratios['green'] > 0.3:
+        return "Magnesium Deficiency"
+    elif ratios['pale'] > 0.25:
+        return "Iron Deficiency"
+    elif ratios['yellow'] > 0.2:
+        return "Nitrogen Deficiency"
+    elif ratios['purple'] > 0.15:
+        return "Phosphorus Deficiency"
+    elif ratios['brown'] > 0.2:
+        return "Potassium Deficiency"
+    else:
+        return "Unknown Issue"
+
+
+def classify_colors(rgb):
+    return deficiency(color_ratios(rgb))
+
+
+def classify_colors_batch(images):
+    """Deficiency labels for a stack of RGB leaf crops."""
+    return [deficiency(dict(zip(COLORS, row))) for row in color_ratios_batch(images)]
@@ -12,6 +12,26 @@ image = (
     .add_local_file("app.py", remote_path="/app.py")
     .add_local_dir("templates", remote_path="/templates") 
     .add_local_file("utils.py", remote_path="/utils.py")
+    .add_local_file("scoring.py", remote_path="/scoring.py")
+    .add_local_file("yield_index.py", remote_path="/yield_index.py")
+    .add_local_file("datacache.py", remote_path="/datacache.py")
+    .add_local_file("worker_memory.py", remote_path="/worker_memory.py")
+    .add_local_file("forecast_cache.py", remote_path="/forecast_cache.py")
+    .add_local_file("rainfall_cube.py", remote_path="/rainfall_cube.py")
+    .add_local_file("batching.py", remote_path="/batching.py")
+    .add_local_file("model_runtime.py", remote_path="/model_runtime.py")
+    .add_local_file("image_pipeline.py", remote_path="/image_pipeline.py")
+    .add_local_file("prediction_cache.py", remote_path="/prediction_cache.py")
+    .add_local_file("warmup.py", remote_path="/warmup.py")
+    .add_local_file("http_cache.py", remote_path="/http_cache.py")
+    .add_local_file("instrumentation.py", remote_path="/instrumentation.py")
+    .add_local_file("leaf_colors.py", remote_path="/leaf_colors.py")
+    .add_local_file("holt_winters.py", remote_path="/holt_winters.py")
+    .add_local_file("work_pool.py", remote_path="/work_pool.py")
+    .add_local_file("model_registry.py", remote_path="/model_registry.py")
+    .add_local_file("upload_store.py", remote_path="/upload_store.py")
+    .add_local_file("entities.py", remote_path="/entities.py")
+    .add_local_file("crop_images.py", remote_path="/crop_images.py")
     .add_local_file("Sub_Division_IMD_2017.csv", remote_path="/Sub_Division_IMD_2017.csv")
     .add_local_file("crop_production.csv", remote_path="/crop_production.csv")
     .add_local_file("Crop_recommendation.csv", remote_path="/Crop_recommendation.csv")
@@ -0,0 +1,200 @@
+"""Owns the soil and disease models: loads each once, unloads idle ones.
+
+app.py registers a loader per model. get() loads a model on first use, and
+concurrent first callers wait for that one load instead of each loading
+their own copy (single-flight). Each load records the model's memory
+footprint: how much the process RSS grew while it loaded, or the size of its
+weights if that is larger or RSS cannot be read. Loads of different models
+that overlap share the RSS growth, so treat the figures as estimates.
+
+With a budget (AGRIBUDDY_MODEL_MEMORY_MB, default 0 = none), a load that
+would take the loaded models past it first unloads models that have not
+been used for AGRIBUDDY_MODEL_IDLE_SECONDS (default 300), least recently
+used first; they are loaded again on their next use. Only idle models are
+unloaded, so the budget is exceeded rather than unloading a busy model.
+stats() reports loads, hits, evictions and footprints per model.
+"""
+import gc
+import os
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+import numpy as np
+
+from worker_memory import memory_stats
+
+MEMORY_BUDGET_MB = float(os.environ.get('AGRIBUDDY_MODEL_MEMORY_MB', '0'))
+IDLE_SECONDS = float(os.environ.get('AGRIBUDDY_MODEL_IDLE_SECONDS', '300'))
+
+# What a loader returns: the model (anything with predict()) and its class names
+LoadedModel = namedtuple('LoadedModel', 'model class_names')
+
+
+def _rss_bytes():
+    stats = memory_stats()
+    return stats['rss'] * 1024 if stats else None
+
+
+def weights_bytes(model):
+    """Size of a model's weights: its file for TFLite, its variables for Keras."""
+    path = getattr(model, 'path', None)
+    if isinstance(path, str) and os.path.exists(path):
+        return os.path.getsize(path)
+    total = 0
+    for weight in getattr(model, 'weights', []):
+        # Keras 3 gives dtypes as strings, tf.Variable as tf.DType
+        dtype = getattr(weight.dtype, 'as_numpy_dtype', weight.dtype)
+        total += int(np.prod(weight.shape)) * np.dtype(dtype).itemsize
+    return total
+
+
+class _Entry:
+    def __init__(self, loader):
+        self.loader = loader
+        self.value = None
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.failures = 0
+        self.load_seconds = None
+        self.last_used = 0.0
+
+
+class ModelRegistry:
+    def __init__(self, budget_mb=MEMORY_BUDGET_MB, idle_seconds=IDLE_SECONDS):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.idle_seconds = idle_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+        # Hits are counted on the lock-free fast path of get(), from many request threads
+        self._stats_lock = threading.Lock()
+
+    def register(self, name, loader):
+        """Add a model, or replace its loader (dropping the loaded copy)."""
+        with self._lock:
+            self._entries[name] = _Entry(loader)
+
+    def get(self, name):
+        """The LoadedModel, loading it if needed; None if loading failed
+        (the next call tries again)."""
+        entry = self._entries[name]
+        value = entry.value
+        if value is not None:
+            self._hit(entry)
+            return value
+        with entry.lock:
+            if entry.value is not None:
+                self._hit(entry)
+            else:
+                self._load(name, entry)
+            entry.last_used = time.monotonic()
+            return entry.value
+
+    def _hit(self, entry):
+        with self._stats_lock:
+            entry.hits += 1
+            entry.last_used = time.monotonic()
+
+    def peek(self, name):
+        """The loaded model, or None, without loading it or counting a hit."""
+        return self._entries[name].value
+
+    def _load(self, name, entry):
+        if self.budget and entry.bytes:
+            # Size known from an earlier load: make room before loading, not after
+            self._make_room(entry.bytes, keep=name)
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        try:
+            value = entry.loader()
+        except Exception as e:
+            entry.failures += 1
+            print(f"Error loading {name} model: {e}")
+            traceback.print_exc()
+            return
+        entry.load_seconds = round(time.perf_counter() - start, 3)
+        rss_after = _rss_bytes()
+        rss_growth = rss_after - rss_before if rss_before is not None and rss_after is not None else 0
+        entry.bytes = max(rss_growth, weights_bytes(value.model))
+        entry.value = value
+        entry.loads += 1
+        print(f"Loaded {name} model in {entry.load_seconds:.2f}s, about {entry.bytes / 2 ** 20:.0f} MiB")
+        if self.budget:
+            self._make_room(0, keep=name)
+
+    def _make_room(self, needed, keep):
+        """Unload idle models, least recently used first, until `needed` more
+        bytes fit in the budget."""
+        now = time.monotonic()
+        candidates = sorted(
+            (entry.last_used, name) for name, entry in self._entries.items()
+            if name != keep and entry.value is not None and now - entry.last_used >= self.idle_seconds
+        )
+        for _, name in candidates:
+            if self.loaded_bytes() + needed <= self.budget:
+                break
+            entry = self._entries[name]
+            # Skip a model that is being loaded right now
+            if entry.lock.acquire(blocking=False):
+                try:
+                    self._unload(name, entry, evicted=True)
+                finally:
+                    entry.lock.release()
+
+    def _unload(self, name, entry, evicted=False):
+        if entry.value is None:
+            return
+        entry.value = None
+        if evicted:
+            entry.evictions += 1
+            print(f"Unloaded idle {name} model to stay within the model memory budget")
+        # Keras models hold reference cycles; collect so the memory is returned now
+        gc.collect()
+
+    def unload(self, name):
+        entry = self._entries[name]
+        with entry.lock:
+            self._unload(name, entry)
+
+    def loaded_bytes(self):
+        return sum(entry.bytes for entry in self._entries.values() if entry.value is not None)
+
+    def stats(self):
+        now = time.monotonic()
+        models = {}
+        for name, entry in self._entries.items():
+            models[name] = {
+                'loaded': entry.value is not None,
+                'memory_mb': round(entry.bytes / 2 ** 20, 1) if entry.bytes else None,
+                'loads': entry.loads,
+                'hits': entry.hits,
+                'evictions': entry.evictions,
+                'failures': entry.failures,
+                'load_seconds': entry.load_seconds,
+                'idle_seconds': round(now - entry.last_used, 1) if entry.last_used else None,
+            }
+        return {
+            'budget_mb': self.budget / 2 ** 20 if self.budget else None,
+            'loaded_mb': round(self.loaded_bytes() / 2 ** 20, 1),
+            'models': models,
+        }
+
+    def prometheus_text(self):
+        lines = []
+        for metric, key, help_text in (
+            ('agribuddy_model_loads_total', 'loads', 'Model loads.'),
+            ('agribuddy_model_hits_total', 'hits', 'Model lookups served by an already loaded model.'),
+            ('agribuddy_model_evictions_total', 'evictions', 'Idle models unloaded to stay within the memory budget.'),
+            ('agribuddy_model_load_failures_total', 'failures', 'Failed model loads.'),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            lines += [f'{metric}{{model="{name}"}} {getattr(entry, key)}' for name, entry in self._entries.items()]
+        lines += ["# HELP agribuddy_model_memory_bytes Estimated memory of each loaded model.",
+                  "# TYPE agribuddy_model_memory_bytes gauge"]
+        lines += [f'agribuddy_model_memory_bytes{{model="{name}"}} {entry.bytes if entry.value is not None else 0}'
+                  for name, entry in self._entries.items()]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,269 @@
+"""CPU inference backends for the soil and disease models.
+
+The .h5 Keras models pay a large per-call overhead in model.predict. This
+module converts them once into TFLite flatbuffers next to the originals:
+
+    models/soil_model.tflite          float32
+    models/soil_model.fp16.tflite     float16 weights
+    models/soil_model.int8.tflite     int8, calibrated on sample images
+
+and loads the variant picked by AGRIBUDDY_MODEL_BACKEND (keras, tflite,
+tflite-fp16 or tflite-int8) at startup. A missing artifact falls back to
+the Keras model.
+
+    python model_runtime.py build [--variants fp32,fp16,int8] [--models FILE,...] [--calibration DIR]
+    python model_runtime.py compare [--images DIR]
+
+int8 is only built with --calibration: soil photos for soil_model.h5, leaf
+photos for plant_disease_model.h5 (cropped with image_pipeline.crop_leaf,
+as the app does), so build each model on its own with --models.
+
+`compare` checks every variant against the .h5 outputs (top-1 agreement and
+largest probability difference) and reports latency, artifact size and
+memory growth for each one.
+"""
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, 'models')
+MODEL_BACKEND = os.environ.get('AGRIBUDDY_MODEL_BACKEND', 'keras')
+
+# backend name -> artifact suffix
+VARIANTS = {'tflite': '.tflite', 'tflite-fp16': '.fp16.tflite', 'tflite-int8': '.int8.tflite'}
+BUILD_VARIANTS = {'fp32': 'tflite', 'fp16': 'tflite-fp16', 'int8': 'tflite-int8'}
+
+# model file -> input size used by app.py's preprocessing
+MODEL_INPUTS = {
+    'soil_model.h5': (128, 128),
+    'plant_disease_model.h5': (224, 224),
+}
+CALIBRATION_SAMPLES = 100
+
+
+def artifact_path(h5_path, backend):
+    return os.path.splitext(h5_path)[0] + VARIANTS[backend]
+
+
+def load_keras_model(model_path):
+    from tensorflow.keras.models import load_model
+    # Try loading with compile=False for TensorFlow 2.20+ compatibility
+    try:
+        return load_model(model_path, compile=False)
+    except Exception as e1:
+        print(f"Warning: Failed to load with compile=False, trying default: {e1}")
+        return load_model(model_path)
+
+
+def _interpreter_class():
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        import warnings
+        import tensorflow as tf
+        warnings.filterwarnings('ignore', message='.*tf.lite.Interpreter is deprecated.*')
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteModel:
+    """A TFLite interpreter with the subset of the Keras predict() API app.py uses."""
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.interpreter = _interpreter_class()(model_path=path, num_threads=num_threads or os.cpu_count())
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=self._input['dtype'])
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input['index'], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output['index']).copy()
+
+
+def load_inference_model(model_path, backend=None):
+    """Load a model for the configured backend, falling back to Keras."""
+    backend = backend or MODEL_BACKEND
+    if backend in VARIANTS:
+        path = artifact_path(model_path, backend)
+        if os.path.exists(path):
+            print(f"Using {backend} backend: {path}")
+            return TFLiteModel(path)
+        print(f"Warning: {path} not found (run 'python model_runtime.py build'), using Keras model.")
+    elif backend != 'keras':
+        print(f"Warning: Unknown model backend '{backend}', using Keras model.")
+    return load_keras_model(model_path)
+
+
+# --- BUILD ---
+def _image_files(image_dirs):
+    files = []
+    for image_dir in image_dirs:
+        for ext in ('*.jpg', '*.jpeg', '*.png'):
+            files.extend(glob.glob(os.path.join(image_dir, '**', ext), recursive=True))
+    return sorted(files)
+
+
+def _model_input(model_name, data, size):
+    """An image as the app feeds it to the model: the cropped leaf for the
+    disease model, the whole photo for the soil model (RGB, 0-255)."""
+    from image_pipeline import crop_leaf, decode_rgb
+    if model_name == 'plant_disease_model.h5':
+        return np.asarray(crop_leaf(data, size=size[0]), dtype=np.float32)
+    return decode_rgb(data, size)
+
+
+def sample_images(image_dirs, model_name, size, limit=CALIBRATION_SAMPLES):
+    """Readable images, preprocessed as app.py does for the model and scaled to 0-1."""
+    samples = []
+    for path in _image_files(image_dirs):
+        try:
+            with open(path, 'rb') as f:
+                samples.append(_model_input(model_name, f.read(), size) / 255.0)
+        except Exception:
+            continue
+        if len(samples) >= limit:
+            break
+    return samples
+
+
+def convert(model_path, variants, calibration_dirs):
+    import tensorflow as tf
+    model = load_keras_model(model_path)
+    size = MODEL_INPUTS.get(os.path.basename(model_path), tuple(model.input_shape[1:3]))
+    for variant in variants:
+        backend = BUILD_VARIANTS[variant]
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        if variant == 'fp16':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif variant == 'int8':
+            if not calibration_dirs:
+                # Calibrating on whatever images are at hand (the logo, the crop photos)
+                # would give activation ranges the model never sees
+                print(f"Skipping int8 for {os.path.basename(model_path)}: pass --calibration with "
+                      f"images like the ones it serves")
+                continue
+            samples = sample_images(calibration_dirs, os.path.basename(model_path), size)
+            if not samples:
+                print(f"Skipping int8 for {os.path.basename(model_path)}: no calibration images in {calibration_dirs}")
+                continue
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = lambda: ([s[None]] for s in samples)
+            print(f"Calibrating int8 on {len(samples)} images")
+        path = artifact_path(model_path, backend)
+        with open(path, 'wb') as f:
+            f.write(converter.convert())
+        print(f"Wrote {path} ({os.path.getsize(path) / 1024:.0f} KiB)")
+
+
+# --- COMPARE ---
+def _rss_kib():
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _time_predict(model, batch, repeats):
+    model.predict(batch, verbose=0)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.predict(batch, verbose=0)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def compare(model_path, image_dirs, repeats=20):
+    size = MODEL_INPUTS.get(os.path.basename(model_path))
+    import tensorflow  # noqa: F401  (so the memory column counts the model, not the library)
+    _interpreter_class()
+    rss = _rss_kib()
+    reference = load_keras_model(model_path)
+    rows = [('keras', os.path.getsize(model_path), _rss_kib() - rss, reference)]
+    size = size or tuple(reference.input_shape[1:3])
+    for backend in VARIANTS:
+        path = artifact_path(model_path, backend)
+        if os.path.exists(path):
+            rss = _rss_kib()
+            model = TFLiteModel(path)
+            rows.append((backend, os.path.getsize(path), _rss_kib() - rss, model))
+
+    samples = sample_images(image_dirs, os.path.basename(model_path), size, limit=64)
+    if not samples:
+        samples = list(np.random.default_rng(0).random((16,) + size + (3,), dtype=np.float32))
+        print("No sample images found, comparing on random inputs")
+    batch = np.stack(samples)
+    expected = reference.predict(batch, verbose=0)
+
+    print(f"\n{os.path.basename(model_path)}: {len(batch)} images")
+    print(f"{'backend':<12} {'size KiB':>9} {'mem MiB':>8} {'top-1 agree':>11} {'max |dp|':>9} {'1 img ms':>9} {'8 img ms':>9}")
+    for backend, nbytes, mem_kib, model in rows:
+        outputs = model.predict(batch, verbose=0)
+        agree = np.mean(outputs.argmax(axis=1) == expected.argmax(axis=1)) * 100
+        max_diff = np.abs(outputs - expected).max()
+        single = _time_predict(model, batch[:1], repeats)
+        eight = _time_predict(model, np.resize(batch, (8,) + batch.shape[1:]), repeats)
+        print(f"{backend:<12} {nbytes / 1024:>9.0f} {mem_kib / 1024:>8.1f} {agree:>10.1f}% {max_diff:>9.4f} {single:>9.2f} {eight:>9.2f}")
+
+
+def _model_paths():
+    return [os.path.join(MODELS_DIR, name) for name in MODEL_INPUTS if os.path.exists(os.path.join(MODELS_DIR, name))]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Build and compare optimized CPU model artifacts.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build')
+    build.add_argument('--variants', default='fp32,fp16,int8', help="comma separated: fp32, fp16, int8")
+    build.add_argument('--calibration', action='append',
+                       help="image directory for int8 calibration (repeatable); int8 is skipped without it")
+    build.add_argument('--models', help="comma separated model files to build (default: all), "
+                                        "so each can be calibrated on its own images")
+    cmp_parser = sub.add_parser('compare')
+    cmp_parser.add_argument('--images', action='append', help="image directory for the parity check (repeatable)")
+    args = parser.parse_args(argv[1:])
+
+    default_dirs = [os.path.join(BASE_DIR, 'Uploads'), os.path.join(BASE_DIR, 'static')]
+    models = _model_paths()
+    if not models:
+        print(f"No .h5 models found in {MODELS_DIR}, nothing to do")
+        return 0
+    if args.command == 'build':
+        variants = [v.strip() for v in args.variants.split(',') if v.strip()]
+        unknown = [v for v in variants if v not in BUILD_VARIANTS]
+        if unknown:
+            parser.error(f"unknown variant(s): {', '.join(unknown)}")
+        if args.models:
+            wanted = {m.strip() for m in args.models.split(',') if m.strip()}
+            unknown = wanted - set(MODEL_INPUTS)
+            if unknown:
+                parser.error(f"unknown model(s): {', '.join(sorted(unknown))}")
+            models = [m for m in models if os.path.basename(m) in wanted]
+        for model_path in models:
+            convert(model_path, variants, args.calibration)
+    else:
+        for model_path in models:
+            compare(model_path, args.images or default_dirs)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
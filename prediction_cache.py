@@ -0,0 +1,145 @@
+"""Prediction cache keyed by the SHA-256 of the uploaded image bytes.
+
+People re-upload the same photo after a timeout or a form error. Each model
+gets a PredictionCache: an in-memory LRU with a TTL, optionally backed by
+small JSON files under .cache/predictions/ that survive restarts
+(AGRIBUDDY_PREDICTION_DISK_CACHE=1). Entries belong to a model version,
+derived from the model and class-index files, so replacing either file
+retires every older entry.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+from datacache import CACHE_DIR
+
+MAX_ENTRIES = int(os.environ.get('AGRIBUDDY_PREDICTION_CACHE_SIZE', '1024'))
+TTL_SECONDS = float(os.environ.get('AGRIBUDDY_PREDICTION_CACHE_TTL', '86400'))
+DISK_CACHE = os.environ.get('AGRIBUDDY_PREDICTION_DISK_CACHE', '0') == '1'
+PREDICTION_CACHE_DIR = os.path.join(CACHE_DIR, 'predictions')
+
+
+def file_version(*paths):
+    """Short hash of the names, mtimes and sizes of the files that exist."""
+    parts = []
+    for path in paths:
+        if path and os.path.exists(path):
+            st = os.stat(path)
+            parts.append(f"{os.path.basename(path)}:{st.st_mtime_ns}:{st.st_size}")
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def image_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, name, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, disk=DISK_CACHE):
+        self.name = name
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = ttl
+        self.disk = disk
+        self.version = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def _dir(self, version=None):
+        return os.path.join(PREDICTION_CACHE_DIR, self.name, version or self.version)
+
+    def _path(self, key):
+        return os.path.join(self._dir(), key[:2], f"{key}.json")
+
+    def set_version(self, version):
+        """Switch to a new model version, dropping entries of older ones."""
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._entries.clear()
+        if self.disk:
+            root = os.path.join(PREDICTION_CACHE_DIR, self.name)
+            try:
+                stale = [d for d in os.listdir(root) if d != version]
+            except OSError:
+                stale = []
+            for directory in stale:
+                shutil.rmtree(os.path.join(root, directory), ignore_errors=True)
+
+    def get(self, key):
+        """The cached prediction for an image key, or None."""
+        if self.version is None:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+        value = self._read(key, now) if self.disk else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.disk_hits += 1
+                self._remember(key, value, now)
+        return value
+
+    def put(self, key, value):
+        if self.version is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+        if self.disk:
+            self._write(key, value, now)
+
+    def _remember(self, key, value, now):
+        if not self.max_entries:
+            return
+        self._entries[key] = (value, now + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read(self, key, now):
+        try:
+            with open(self._path(key), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('created', 0) + self.ttl <= now:
+            return None
+        return entry.get('value')
+
+    def _write(self, key, value, now):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'value': value, 'created': now}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not save {self.name} prediction cache entry: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            }
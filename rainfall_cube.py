@@ -0,0 +1,102 @@
+"""Dense [subdivision, year, month] array of the IMD monthly rainfall.
+
+Replaces boolean-mask scans of the melted rainfall table with array
+indexing, and precomputes each subdivision's monthly climatology (mean,
+standard deviation and percentiles over all recorded years). The first axis
+is the subdivision's entities.py ID.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from entities import subdivisions, UNKNOWN
+
+MONTHS = ('JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC')
+MONTH_INDEX = {month: i for i, month in enumerate(MONTHS)}
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+class RainfallCube:
+    def __init__(self, df_melted):
+        if df_melted.empty:
+            self.subdivisions, self.first_year = [], 0
+            self.values = np.full((0, 0, len(MONTHS)), np.nan)
+        else:
+            sub_idx = subdivisions.encode(df_melted['SUBDIVISION'], add=True)
+            # Names as the data spells them, in order of appearance
+            self.subdivisions = list(pd.unique(df_melted['SUBDIVISION'].astype(str)))
+            years = df_melted['YEAR'].to_numpy(dtype=np.int64)
+            self.first_year = int(years.min())
+            self.values = np.full((len(subdivisions), int(years.max()) - self.first_year + 1, len(MONTHS)), np.nan)
+            month_idx = df_melted['MONTH'].map(MONTH_INDEX).to_numpy()
+            valid = ~pd.isna(month_idx) & (sub_idx != UNKNOWN)
+            # Reverse order so the first row wins for duplicate keys, like .values[0] on a mask
+            rows = np.flatnonzero(valid)[::-1]
+            self.values[sub_idx[rows], years[rows] - self.first_year, month_idx[rows].astype(np.int64)] = \
+                df_melted['RAINFALL'].to_numpy(dtype=np.float64)[rows]
+        self._build_climatology()
+
+    def _build_climatology(self):
+        recorded = ~np.isnan(self.values)
+        # Rows of subdivisions the registry knows but this data does not have stay empty
+        self.has_data = recorded.any(axis=(1, 2))
+        counts = recorded.sum(axis=1)                      # (subdivisions, 12)
+        filled = np.where(recorded, self.values, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.monthly_mean = np.where(counts > 0, filled.sum(axis=1) / counts, np.nan)
+            deviations = np.where(recorded, self.values - self.monthly_mean[:, None, :], 0.0)
+            self.monthly_std = np.where(counts > 1, np.sqrt((deviations ** 2).sum(axis=1) / (counts - 1)), np.nan)
+        if self.values.size and recorded.any():
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN months
+                self.monthly_percentiles = np.nanpercentile(self.values, PERCENTILES, axis=1)
+        else:
+            self.monthly_percentiles = np.full((len(PERCENTILES), len(self.values), len(MONTHS)), np.nan)
+
+    def _row(self, subdivision):
+        s = subdivisions.id(subdivision)
+        return s if s is not None and s < len(self.values) and self.has_data[s] else None
+
+    def _indices(self, subdivision, month):
+        return self._row(subdivision), MONTH_INDEX.get(month)
+
+    def value(self, subdivision, year, month):
+        """Recorded rainfall in mm, or None if the month is not in the data."""
+        s, m = self._indices(subdivision, month)
+        y = year - self.first_year
+        if s is None or m is None or not 0 <= y < self.values.shape[1]:
+            return None
+        value = self.values[s, y, m]
+        return None if np.isnan(value) else float(value)
+
+    def monthly_average(self, subdivision, month):
+        """Mean rainfall of a calendar month over all recorded years, or None."""
+        s, m = self._indices(subdivision, month)
+        if s is None or m is None or np.isnan(self.monthly_mean[s, m]):
+            return None
+        return float(self.monthly_mean[s, m])
+
+    def climatology(self, subdivision):
+        """Per-month mean, std and percentiles for a subdivision, or None."""
+        s = self._row(subdivision)
+        if s is None:
+            return None
+        stats = {'months': list(MONTHS), 'mean': self.monthly_mean[s], 'std': self.monthly_std[s]}
+        for i, p in enumerate(PERCENTILES):
+            stats[f"p{p}"] = self.monthly_percentiles[i, s]
+        return stats
+
+    def query(self, subdivision, year_from=None, year_to=None, months=None):
+        """Recorded rainfall for a year range (inclusive) and months, as a
+        DataFrame indexed by year with one column per month."""
+        s = self._row(subdivision)
+        if s is None:
+            raise KeyError(f"Unknown subdivision: {subdivision}")
+        last_year = self.first_year + self.values.shape[1] - 1
+        year_from = max(self.first_year, year_from if year_from is not None else self.first_year)
+        year_to = min(last_year, year_to if year_to is not None else last_year)
+        months = list(months) if months is not None else list(MONTHS)
+        month_idx = [MONTH_INDEX[m] for m in months]
+        block = self.values[s, year_from - self.first_year:year_to - self.first_year + 1][:, month_idx]
+        return pd.DataFrame(block, index=pd.RangeIndex(year_from, year_to + 1, name='YEAR'), columns=months)
@@ -0,0 +1,110 @@
+import numpy as np
+
+from entities import crops, soils, states, UNKNOWN
+
+# Crop requirement columns in Crop_recommendation.csv, soil features first
+SOIL_FEATURES = ('N', 'P', 'K', 'ph')
+CLIMATE_FEATURES = ('temperature', 'humidity', 'rainfall')
+
+# Matching min/max columns in soil_nutrient_data.xlsx and state_climate.csv
+SOIL_BOUND_COLUMNS = (('min_N', 'max_N'), ('min_P', 'max_P'), ('min_K', 'max_K'), ('min_pH', 'max_pH'))
+CLIMATE_BOUND_COLUMNS = (('temp_min', 'temp_max'), ('humidity_min', 'humidity_max'), ('rainfall_min', 'rainfall_max'))
+
+
+class SuitabilityScorer:
+    """Scores every crop against soil and climate ranges with array operations.
+
+    A crop earns one point for each requirement (N, P, K, pH, temperature,
+    humidity, rainfall) that falls inside the soil or state range, the same
+    rule get_recommendations has always used. States without climate data
+    only collect soil points.
+    """
+
+    def __init__(self, crop_ids, requirements, soil_ids, soil_bounds, state_ids, climate_bounds):
+        # Entity IDs (entities.py) of the rows of each table; the first row of an ID wins
+        self.crop_ids = np.asarray(crop_ids, dtype=np.int32)
+        self.crop_labels = [crops.name(i) for i in self.crop_ids]
+        self.crop_index = _first_rows(self.crop_ids)
+        self.soil_rows = _first_rows(soil_ids)
+        self.state_rows = _first_rows(state_ids)
+        # (crops, 4) and (crops, 3)
+        self.soil_requirements = np.asarray(requirements, dtype=np.float64)[:, :len(SOIL_FEATURES)]
+        self.climate_requirements = np.asarray(requirements, dtype=np.float64)[:, len(SOIL_FEATURES):]
+        # (soils, 4, 2); states get an extra all-NaN row used for unknown states
+        self.soil_bounds = np.asarray(soil_bounds, dtype=np.float64).reshape(-1, len(SOIL_FEATURES), 2)
+        climate_bounds = np.asarray(climate_bounds, dtype=np.float64).reshape(-1, len(CLIMATE_FEATURES), 2)
+        self.climate_bounds = np.concatenate([climate_bounds, np.full((1, len(CLIMATE_FEATURES), 2), np.nan)])
+
+    @classmethod
+    def from_frames(cls, crop_df, soil_df, climate_df):
+        """From the datasets as utils.py loads them, with their entity ID columns."""
+        first = (~crop_df['crop_id'].duplicated(keep='first') & (crop_df['crop_id'] != UNKNOWN)).to_numpy()
+        requirements = crop_df.loc[first, list(SOIL_FEATURES + CLIMATE_FEATURES)].to_numpy(dtype=np.float64)
+        soil_bounds = np.stack([soil_df[list(cols)].to_numpy(dtype=np.float64) for cols in SOIL_BOUND_COLUMNS], axis=1)
+        climate_bounds = np.stack([climate_df[list(cols)].to_numpy(dtype=np.float64) for cols in CLIMATE_BOUND_COLUMNS],
+                                  axis=1)
+        return cls(crop_df['crop_id'].to_numpy()[first], requirements, soil_df['soil_id'].to_numpy(), soil_bounds,
+                   climate_df['state_id'].to_numpy(), climate_bounds)
+
+    def soil_row(self, soil_id):
+        """Row of the soil table for a soil ID, or None."""
+        if soil_id is None or not 0 <= soil_id < len(self.soil_rows) or self.soil_rows[soil_id] < 0:
+            return None
+        return int(self.soil_rows[soil_id])
+
+    def soil_index(self, soil_type):
+        """Row of the soil table get_soil_ranges would pick, or None."""
+        return self.soil_row(soils.id(soil_type))
+
+    def state_rows_for(self, state_ids):
+        """Climate rows for state IDs; unknown states get the all-NaN row."""
+        state_ids = np.asarray(state_ids, dtype=np.intp)
+        missing = len(self.climate_bounds) - 1
+        # -1 at the end stands in for IDs this table has no row for
+        state_rows = np.append(self.state_rows, -1)
+        known = (state_ids >= 0) & (state_ids < len(self.state_rows))
+        rows = state_rows[np.where(known, state_ids, -1)]
+        return np.where(rows >= 0, rows, missing)
+
+    def state_indices(self, state_names):
+        state_ids = states.ids(state_names)
+        unknown = [s for s, i in zip(state_names, state_ids) if i == UNKNOWN]
+        if unknown:
+            raise ValueError(f"Unknown state(s): {', '.join(map(str, unknown))}")
+        return self.state_rows_for(state_ids)
+
+    def soil_indices(self, soil_types):
+        indices = [self.soil_index(s) for s in soil_types]
+        unknown = [s for s, i in zip(soil_types, indices) if i is None]
+        if unknown:
+            raise ValueError(f"No nutrient data for soil type(s): {', '.join(map(str, unknown))}")
+        return np.array(indices, dtype=np.intp)
+
+    def score_indices(self, state_idx, soil_idx):
+        """Scores of shape (states, soils, crops) for row indices into the bound tables."""
+        soil = self.soil_bounds[soil_idx]           # (S, 4, 2)
+        climate = self.climate_bounds[state_idx]    # (T, 3, 2)
+        req_soil = self.soil_requirements[None]     # (1, C, 4)
+        req_climate = self.climate_requirements[None]
+
+        soil_hits = ((soil[:, None, :, 0] <= req_soil) & (req_soil <= soil[:, None, :, 1])).sum(axis=2)
+        climate_hits = ((climate[:, None, :, 0] <= req_climate) & (req_climate <= climate[:, None, :, 1])).sum(axis=2)
+        return (climate_hits[:, None, :] + soil_hits[None, :, :]).astype(np.int8)
+
+    def score(self, state_names, soil_types):
+        # A bare string would be scored character by character
+        for name, values in (('state_names', state_names), ('soil_types', soil_types)):
+            if isinstance(values, str):
+                raise ValueError(f"{name} must be a list of names, not a string")
+        return self.score_indices(self.state_indices(state_names), self.soil_indices(soil_types))
+
+
+def _first_rows(ids):
+    """Array indexed by entity ID: the first row holding that ID, or -1."""
+    ids = np.asarray(ids, dtype=np.intp)
+    known = ids[ids != UNKNOWN]
+    rows = np.full(int(known.max()) + 1 if known.size else 0, -1, dtype=np.intp)
+    positions = np.flatnonzero(ids != UNKNOWN)
+    # Reversed so the first occurrence is written last
+    rows[known[::-1]] = positions[::-1]
+    return rows
@@ -0,0 +1,234 @@
+"""Content-addressed store for the uploaded photos that are shown back.
+
+Uploads used to be saved under the client's file name, so two users sending
+"leaf.jpg" overwrote each other's picture, or under a fresh UUID, so the same
+photo sent twice was stored twice. Here a photo is named by the SHA-256 of
+its bytes, with an extension from its actual format (not the client's name).
+The file goes to the shard directory named after the first two hex digits,
+which gives at most 256 directories. Storing a photo that is already there
+only refreshes its mtime.
+
+A background thread in each process sweeps the store every
+AGRIBUDDY_UPLOAD_SWEEP_SECONDS (default 600). Each sweep deletes photos not
+stored or sent again for AGRIBUDDY_UPLOAD_MAX_AGE_HOURS (default 168), then
+the oldest ones until the store fits in AGRIBUDDY_UPLOAD_STORE_MB (default
+1024), along with temporary files left by interrupted writes. A lock file
+stops several gunicorn workers from sweeping at the same time. Only the
+shard directories are swept; photos saved directly under Uploads/ by older
+versions are removed once with
+
+    python upload_store.py remove-legacy
+"""
+import fcntl
+import os
+import re
+import sys
+import threading
+import time
+
+from image_pipeline import save_async
+from prediction_cache import image_key
+
+MAX_AGE_HOURS = float(os.environ.get('AGRIBUDDY_UPLOAD_MAX_AGE_HOURS', '168'))
+STORE_MB = float(os.environ.get('AGRIBUDDY_UPLOAD_STORE_MB', '1024'))
+SWEEP_SECONDS = float(os.environ.get('AGRIBUDDY_UPLOAD_SWEEP_SECONDS', '600'))
+# A .tmp file this old belongs to a write that will never finish
+STALE_TMP_SECONDS = 3600
+LOCK_NAME = '.sweep.lock'
+
+# Leading bytes of the formats PIL and OpenCV are asked to decode
+SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+    (b'BM', '.bmp'),
+)
+NAME_PATTERN = re.compile(r'[0-9a-f]{2}/[0-9a-f]{64}\.(jpg|png|gif|bmp|webp)')
+SHARD_PATTERN = re.compile(r'[0-9a-f]{2}')
+# What the app saved uploads as before this store
+LEGACY_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+
+def image_extension(data):
+    """File extension for the image format of `data`, or None if it is not one we store."""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    for signature, extension in SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    return None
+
+
+class UploadStore:
+    def __init__(self, root, max_age_hours=MAX_AGE_HOURS, max_mb=STORE_MB, sweep_seconds=SWEEP_SECONDS):
+        self.root = root
+        self.max_age = max_age_hours * 3600
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.sweep_seconds = sweep_seconds
+        self.stored = 0
+        self.duplicates = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.files = None
+        self.bytes = None
+        self.last_sweep_seconds = None
+        self._lock = threading.Lock()
+        self._sweeper_pid = None
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def is_valid_name(self, name):
+        return NAME_PATTERN.fullmatch(name) is not None
+
+    def put(self, data):
+        """Store an image and return its name (`ab/abcd...ef.jpg`), or None
+        if `data` is not a recognised image. The file is written in the
+        background; image_pipeline.wait_for_save(store.path(name)) waits for it."""
+        extension = image_extension(data)
+        if extension is None:
+            return None
+        self._ensure_sweeper()
+        digest = image_key(data)
+        name = f"{digest[:2]}/{digest}{extension}"
+        path = self.path(name)
+        try:
+            # Already stored: count it as a fresh upload for age-based eviction
+            os.utime(path)
+            with self._lock:
+                self.duplicates += 1
+            return name
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        save_async(data, path)
+        with self._lock:
+            self.stored += 1
+        return name
+
+    def _ensure_sweeper(self):
+        # One sweeper thread per process, started again in a forked worker
+        if self._sweeper_pid == os.getpid() or not self.sweep_seconds:
+            return
+        with self._lock:
+            if self._sweeper_pid != os.getpid():
+                self._sweeper_pid = os.getpid()
+                threading.Thread(target=self._sweep_loop, name='upload-sweep', daemon=True).start()
+
+    def _sweep_loop(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Warning: Upload sweep failed: {e}")
+            time.sleep(self.sweep_seconds)
+
+    def _scan(self):
+        """(mtime, size, path) of every stored file, and the paths of stale .tmp files.
+        Only the shard directories are looked at, so other files under the root
+        (.gitkeep, uploads stored before this store) are left alone."""
+        files, stale = [], []
+        now = time.time()
+        shards = [entry for entry in os.scandir(self.root) if SHARD_PATTERN.fullmatch(entry.name) and entry.is_dir()]
+        for shard in shards:
+            for entry in os.scandir(shard.path):
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith('.tmp'):
+                    if now - st.st_mtime > STALE_TMP_SECONDS:
+                        stale.append(entry.path)
+                elif self.is_valid_name(f"{shard.name}/{entry.name}"):
+                    files.append((st.st_mtime, st.st_size, entry.path))
+        return files, stale
+
+    def remove_legacy(self):
+        """Delete the images stored directly under the root before this store
+        (by client file name or UUID). A one-off migration; dotfiles and
+        anything that is not an image file are kept. Returns the number removed."""
+        removed = 0
+        for entry in os.scandir(self.root):
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            if os.path.splitext(entry.name)[1].lower() not in LEGACY_EXTENSIONS:
+                continue
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def sweep(self):
+        """Evict by age, then by total size, oldest first. Returns the number
+        of files removed, or None if another process is sweeping."""
+        with open(os.path.join(self.root, LOCK_NAME), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            start = time.perf_counter()
+            files, stale = self._scan()
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            cutoff = time.time() - self.max_age if self.max_age else None
+            removed = removed_bytes = 0
+            for mtime, size, path in files:
+                too_old = cutoff is not None and mtime < cutoff
+                too_big = self.max_bytes and total > self.max_bytes
+                if not (too_old or too_big):
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+                removed_bytes += size
+            for path in stale:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                self.files = len(files) - removed
+                self.bytes = total
+                self.evicted_files += removed
+                self.evicted_bytes += removed_bytes
+                self.last_sweep_seconds = round(time.perf_counter() - start, 3)
+            if removed:
+                print(f"Upload sweep removed {removed} files ({removed_bytes / 2 ** 20:.1f} MiB), "
+                      f"{self.files} left ({total / 2 ** 20:.1f} MiB)")
+            return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'stored': self.stored,
+                'duplicates': self.duplicates,
+                'files': self.files,
+                'mb': round(self.bytes / 2 ** 20, 1) if self.bytes is not None else None,
+                'evicted_files': self.evicted_files,
+                'evicted_mb': round(self.evicted_bytes / 2 ** 20, 1),
+                'last_sweep_seconds': self.last_sweep_seconds,
+            }
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else None
+    if command == 'remove-legacy':
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Uploads')
+        print(f"Removed {UploadStore(root, sweep_seconds=0).remove_legacy()} legacy uploads from {root}")
+    else:
+        print("Usage: python upload_store.py remove-legacy")
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,5 +1,13 @@
 import pandas as pd
+import numpy as np
 import os
+import json
+import copy
+import threading
+from datacache import load_frame, source_path
+from entities import crops, states, soils, seasons, crop_hindi_name, label_codes, UNKNOWN, WHOLE_YEAR
+from scoring import SuitabilityScorer
+from instrumentation import timed
 
 # Get base directory (where utils.py is located, same as app.py)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -10,46 +18,22 @@ _crop_df = None
 _production_df = None
 _climate_df = None
 
-# English to Standardized name mapping
-CROP_MAP = {
-    'bajra': 'pearlmillet', 'pearl millet': 'pearlmillet', 'jowar': 'sorghum', 'sorghum': 'sorghum',
-    'maize': 'maize', 'wheat': 'wheat', 'barley': 'barley', 'ragi': 'fingermillet', 'gram': 'chickpea',
-    'arhar/tur': 'pigeonpeas', 'masoor': 'lentil', 'moong(green gram)': 'mungbean', 'urad': 'blackgram',
-    'horse-gram': 'horsegram', 'peas & beans (pulses)': 'peas', 'groundnut': 'groundnut',
-    'rapeseed & mustard': 'mustard', 'soyabean': 'soyabean', 'sunflower': 'sunflower', 'sesamum': 'sesame',
-    'castor seed': 'castor', 'linseed': 'linseed', 'safflower': 'safflower', 'niger seed': 'nigerseed',
-    'cotton(lint)': 'cotton', 'jute': 'jute', 'sugarcane': 'sugarcane', 'tobacco': 'tobacco',
-    'potato': 'potato', 'onion': 'onion', 'arecanut': 'arecanut', 'coriander': 'coriander',
-    'rice': 'rice', 'coconut': 'coconut', 'banana': 'banana', 'sweet potato': 'sweetpotato',
-    'tapioca': 'tapioca', 'dry ginger': 'ginger', 'dry chillies': 'chilli', 'cashewnut': 'cashew',
-    'other kharif pulses': 'mungbean', 'khesari': 'lathyrus', 'sannhamp': 'sannhemp', 'mesta': 'mesta',
-    'cucumber': 'cucumber', 'watermelon': 'watermelon', 'muskmelon': 'muskmelon',
-    'bitter gourd': 'bittergourd', 'bottle gourd': 'bottlegourd', 'pumpkin': 'pumpkin'
-}
-
-# Hindi names
-CROP_NAMES_HINDI = {
-    'arecanut': 'सुपारी', 'barley': 'जौ', 'blackgram': 'उड़द', 'castor': 'अरंडी', 'chickpea': 'चना',
-    'coriander': 'धनिया', 'cotton': 'कपास', 'fingermillet': 'रागी', 'groundnut': 'मूंगफली',
-    'horsegram': 'कुलथी', 'jute': 'जूट', 'lentil': 'मसूर', 'linseed': 'अलसी', 'maize': 'मक्का',
-    'mungbean': 'मूंग', 'mustard': 'सरसों', 'nigerseed': 'रामतिल', 'onion': 'प्याज', 'pearlmillet': 'बाजरा',
-    'peas': 'मटर', 'pigeonpeas': 'अरहर/तूर', 'potato': 'आलू', 'safflower': 'कुसुम', 'sesame': 'तिल',
-    'sorghum': 'ज्वार', 'soyabean': 'सोयाबीन', 'sugarcane': 'गन्ना', 'sunflower': 'सूरजमुखी',
-    'tobacco': 'तम्बाकू', 'wheat': 'गेहूं', 'rice': 'चावल', 'coconut': 'नारियल', 'banana': 'केला',
-    'sweetpotato': 'शकरकंद', 'tapioca': 'टैपिओका', 'ginger': 'अदरक', 'chilli': 'मिर्च', 'cashew': 'काजू',
-    'lathyrus': 'केसरी', 'mesta': 'मेस्टा', 'sannhemp': 'सनहेम्प', 'cucumber': 'खीरा',
-    'watermelon': 'तरबूज', 'muskmelon': 'खरबूजा', 'bittergourd': 'कarela', 'bottlegourd': 'लौकी', 'pumpkin': 'कद्दू'
-}
-
-ALLOWED_SEASONS = {'Kharif', 'Rabi', 'Zaid', 'Whole Year'}
+# Source files the recommendation table is built from
+DATA_FILES = ('soil_nutrient_data.xlsx', 'Crop_recommendation.csv', 'crop_production.csv', 'state_climate.csv')
+
+# Precompiled (state, soil type) -> (recommendations, error) table
+_recommendation_table = {}
+_lookup_tables = {'crop_details': {}, 'profiles': {}, 'scorer': None}
+_table_version = None
+_table_lock = threading.RLock()
 
 # --- LAZY LOAD FUNCTIONS ---
 def _load_soil_df():
     global _soil_df
     if _soil_df is None:
         try:
-            _soil_df = pd.read_excel(os.path.join(BASE_DIR, 'soil_nutrient_data.xlsx'), engine='openpyxl')
-            _soil_df.columns = _soil_df.columns.str.strip()
+            _soil_df = load_frame('soil_nutrient_data.xlsx')
+            _soil_df['soil_id'] = soils.encode(_soil_df['soil_type'], add=True)
             print("Loaded: soil_nutrient_data.xlsx")
         except Exception as e:
             print(f"Failed to load soil_nutrient_data.xlsx: {e}")
@@ -60,8 +44,9 @@ def _load_crop_df():
     global _crop_df
     if _crop_df is None:
         try:
-            _crop_df = pd.read_csv(os.path.join(BASE_DIR, 'Crop_recommendation.csv'))
-            _crop_df.columns = _crop_df.columns.str.strip()
+            _crop_df = load_frame('Crop_recommendation.csv')
+            # The recommendation labels are the canonical crops
+            _crop_df['crop_id'] = crops.encode(_crop_df['label'], add=True)
             print("Loaded: Crop_recommendation.csv")
         except Exception as e:
             print(f"Failed to load Crop_recommendation.csv: {e}")
@@ -72,8 +57,8 @@ def _load_production_df():
     global _production_df
     if _production_df is None:
         try:
-            _production_df = pd.read_csv(os.path.join(BASE_DIR, 'crop_production.csv'))
-            _production_df.columns = _production_df.columns.str.strip()
+            _production_df = load_frame('crop_production.csv')
+            _production_df['state_id'] = states.encode(_production_df['State_Name'], add=True)
             print("Loaded: crop_production.csv")
         except Exception as e:
             print(f"Failed to load crop_production.csv: {e}")
@@ -84,8 +69,8 @@ def _load_climate_df():
     global _climate_df
     if _climate_df is None:
         try:
-            _climate_df = pd.read_csv(os.path.join(BASE_DIR, 'state_climate.csv'))
-            _climate_df.columns = _climate_df.columns.str.strip()
+            _climate_df = load_frame('state_climate.csv')
+            _climate_df['state_id'] = states.encode(_climate_df['State'], add=True)
             print("Loaded: state_climate.csv")
         except Exception as e:
             print(f"Failed to load state_climate.csv: {e}")
@@ -96,11 +81,9 @@ def _load_climate_df():
 def get_soil_ranges(soil_type):
     soil_df = _load_soil_df()
     if soil_df.empty: return None
-    soil_type_cleaned = soil_type.replace('_', ' ').strip().lower()
-    search_term = soil_type_cleaned.split()[0]
-    row = soil_df[soil_df['soil_type'].str.strip().str.lower().str.contains(search_term, na=False)]
-    if row.empty: return None
-    row_values = row.iloc[0]
+    rows = np.flatnonzero(soil_df['soil_id'].to_numpy() == soils.id(soil_type))
+    if not rows.size: return None
+    row_values = soil_df.iloc[rows[0]]
     return {
         'N': (row_values['min_N'], row_values['max_N']),
         'P': (row_values['min_P'], row_values['max_P']),
@@ -108,7 +91,63 @@ def get_soil_ranges(soil_type):
         'ph': (row_values['min_pH'], row_values['max_pH'])
     }
 
-def get_recommendations(state_name, soil_type):
+def _crop_details_by_id(crop_df):
+    # First row per crop, as crop_df[crop_df['label'].str.lower() == name].iloc[0] picked it
+    first = (~crop_df['crop_id'].duplicated(keep='first') & (crop_df['crop_id'] != UNKNOWN)).to_numpy()
+    return {int(crop_id): row for crop_id, (_, row) in zip(crop_df['crop_id'][first], crop_df[first].iterrows())}
+
+def _state_profiles(production_df):
+    """Season-wise top-10 crops and overall top-3 fallback crops for every state ID.
+
+    Crops are ranked by production under their own production-data label, as
+    before, then mapped to crop IDs; labels that are not a known crop are
+    ranked but dropped."""
+    crop_codes, crop_labels = label_codes(production_df['Crop'])
+    season_codes, season_labels = label_codes(production_df['Season'])
+    label_crop_ids = crops.ids(crop_labels)
+    label_season_ids = seasons.ids(season_labels)
+    label_season_ids[label_season_ids == UNKNOWN] = WHOLE_YEAR
+    prod = pd.DataFrame({
+        'state': production_df['state_id'].to_numpy(),
+        'season': season_codes,
+        'crop': crop_codes,
+        'production': production_df['Production'].to_numpy(),
+    })
+    prod = prod[(prod['state'] != UNKNOWN) & (prod['season'] >= 0) & (prod['crop'] >= 0)]
+    profiles = {}
+    for state_id, state_data in prod.groupby('state', sort=False):
+        season_sums = state_data.groupby(['season', 'crop'])['production'].sum()
+        season_list = []
+        for season in pd.unique(state_data['season']):
+            top_for_season = label_crop_ids[season_sums.loc[season].nlargest(10).index]
+            season_list.append((int(label_season_ids[season]), [int(c) for c in top_for_season if c != UNKNOWN]))
+        fallback = label_crop_ids[state_data.groupby('crop')['production'].sum().nlargest(3).index]
+        profiles[int(state_id)] = {
+            'seasons': season_list,
+            'fallback': [int(c) for c in fallback if c != UNKNOWN]
+        }
+    return profiles
+
+def _rec_item(crop_id, season, crop_details):
+    return {
+        'name': crops.name(crop_id),
+        'details': {
+            'season': season,
+            'temp': crop_details['temperature'],
+            'rain': crop_details['rainfall'],
+            'ph': crop_details['ph'],
+            'hindi_name': crop_hindi_name(crop_id)
+        }
+    }
+
+def crop_item(name, season):
+    """Recommendation entry for a crop by name, or None if it has no requirements data."""
+    build_recommendation_table()
+    crop_id = crops.id(name)
+    crop_details = _lookup_tables['crop_details'].get(crop_id)
+    return _rec_item(crop_id, season, crop_details) if crop_details is not None else None
+
+def _compute_recommendations(state_name, soil_type, scores=None):
     soil_df = _load_soil_df()
     crop_df = _load_crop_df()
     production_df = _load_production_df()
@@ -117,92 +156,41 @@ def get_recommendations(state_name, soil_type):
     if production_df.empty or crop_df.empty or soil_df.empty or climate_df.empty:
         return [], "A required data file is missing."
 
-    soil_props = get_soil_ranges(soil_type)
-    if not soil_props:
+    scorer = _lookup_tables['scorer']
+    soil_idx = scorer.soil_index(soil_type)
+    if soil_idx is None:
         return [], f"Could not find nutrient data for soil type '{soil_type}'."
 
-    state_name_cleaned = state_name.strip().lower()
-    state_data = production_df[production_df['State_Name'].str.strip().str.lower() == state_name_cleaned]
-    if state_data.empty:
+    state_id = states.id(state_name)
+    profile = _lookup_tables['profiles'].get(state_id)
+    if profile is None:
         return [], f"Could not find production data for '{state_name}'."
 
-    state_climate = None
-    if not climate_df.empty:
-        climate_row = climate_df[climate_df['State'].str.strip().str.lower() == state_name_cleaned]
-        if not climate_row.empty:
-            state_climate = climate_row.iloc[0].to_dict()
-
-    all_season_candidates = []
-    available_seasons = state_data['Season'].str.strip().unique()
-    season_mapping = {
-        'Autumn': 'Kharif', 'Summer': 'Zaid', 'Winter': 'Rabi', 'Whole Year': 'Whole Year',
-        'Monsoon': 'Kharif', 'Post-Monsoon': 'Rabi', 'Spring': 'Zaid', 'Hot Weather': 'Zaid',
-        'Kharif': 'Kharif', 'Rabi': 'Rabi', 'Zaid': 'Zaid'
-    }
-
-    for season in available_seasons:
-        season_data = state_data[state_data['Season'].str.strip() == season]
-        top_for_season = season_data.groupby('Crop')['Production'].sum().nlargest(10).items()
-        for crop, prod in top_for_season:
-            standardized_season = season_mapping.get(season.strip(), 'Whole Year')
-            all_season_candidates.append({'Crop': crop, 'Season': standardized_season})
+    if scores is None:
+        scores = scorer.score_indices(scorer.state_rows_for([state_id]), [soil_idx])[0, 0]
+    crop_details_map = _lookup_tables['crop_details']
 
+    all_season_candidates = [(crop_id, season_id) for season_id, crop_ids in profile['seasons'] for crop_id in crop_ids]
     if not all_season_candidates:
         return [], f"No crop production data could be processed for '{state_name}'."
 
     potential_recommendations = []
     seen_crops = set()
 
-    for candidate in all_season_candidates:
-        crop_name = candidate['Crop'].strip().lower()
-        season = candidate['Season'].strip().title()
-        standard_name = CROP_MAP.get(crop_name)
-        if standard_name and standard_name not in seen_crops:
-            crop_details_df = crop_df[crop_df['label'].str.lower() == standard_name]
-            if not crop_details_df.empty:
-                crop_details = crop_details_df.iloc[0]
-                score = 0
-                if soil_props['N'][0] <= crop_details['N'] <= soil_props['N'][1]: score += 1
-                if soil_props['P'][0] <= crop_details['P'] <= soil_props['P'][1]: score += 1
-                if soil_props['K'][0] <= crop_details['K'] <= soil_props['K'][1]: score += 1
-                if soil_props['ph'][0] <= crop_details['ph'] <= soil_props['ph'][1]: score += 1
-                if state_climate:
-                    if state_climate['temp_min'] <= crop_details['temperature'] <= state_climate['temp_max']: score += 1
-                    if state_climate['humidity_min'] <= crop_details['humidity'] <= state_climate['humidity_max']: score += 1
-                    if state_climate['rainfall_min'] <= crop_details['rainfall'] <= state_climate['rainfall_max']: score += 1
-                if score >= 2:
-                    rec_item = {
-                        'name': standard_name,
-                        'details': {
-                            'season': season,
-                            'temp': crop_details['temperature'],
-                            'rain': crop_details['rainfall'],
-                            'ph': crop_details['ph'],
-                            'hindi_name': CROP_NAMES_HINDI.get(standard_name, "N/A")
-                        }
-                    }
-                    potential_recommendations.append(rec_item)
-                    seen_crops.add(standard_name)
+    for crop_id, season_id in all_season_candidates:
+        if crop_id not in seen_crops:
+            crop_details = crop_details_map.get(crop_id)
+            if crop_details is not None:
+                if scores[scorer.crop_index[crop_id]] >= 2:
+                    potential_recommendations.append(_rec_item(crop_id, seasons.name(season_id), crop_details))
+                    seen_crops.add(crop_id)
 
     if not potential_recommendations:
-        top_fallback = state_data.groupby('Crop')['Production'].sum().nlargest(3).index.tolist()
         fallback_recs = []
-        for crop in top_fallback:
-            std_name = CROP_MAP.get(crop.strip().lower())
-            if std_name:
-                crop_details_df = crop_df[crop_df['label'].str.lower() == std_name]
-                if not crop_details_df.empty:
-                    rec_item = {
-                        'name': std_name,
-                        'details': {
-                            'season': 'Based on Production Trends',
-                            'temp': crop_details_df.iloc[0]['temperature'],
-                            'rain': crop_details_df.iloc[0]['rainfall'],
-                            'ph': crop_details_df.iloc[0]['ph'],
-                            'hindi_name': CROP_NAMES_HINDI.get(std_name, "N/A")
-                        }
-                    }
-                    fallback_recs.append(rec_item)
+        for crop_id in profile['fallback']:
+            crop_details = crop_details_map.get(crop_id)
+            if crop_details is not None:
+                fallback_recs.append(_rec_item(crop_id, 'Based on Production Trends', crop_details))
         if fallback_recs:
             return fallback_recs, "Limited match. Using top production trends."
         return [], f"No suitable crops for '{soil_type}' in '{state_name}'."
@@ -210,6 +198,120 @@ def get_recommendations(state_name, soil_type):
     sorted_recommendations = sorted(potential_recommendations, key=lambda x: x['details'].get('temp', 0), reverse=True)
     return sorted_recommendations[:8], None
 
+# --- PRECOMPILED RECOMMENDATION TABLE ---
+def _source_version():
+    """(name, mtime, size) of every source file; a change triggers a rebuild."""
+    version = []
+    for name in DATA_FILES:
+        try:
+            st = os.stat(source_path(name))
+            version.append((name, st.st_mtime_ns, st.st_size))
+        except OSError:
+            version.append((name, None, None))
+    return tuple(version)
+
+def _recommendation_key(state_name, soil_type):
+    return states.id(state_name), soils.id(soil_type)
+
+def _table_soil_types():
+    try:
+        with open(os.path.join(BASE_DIR, 'models', 'class_indices.json'), 'r') as f:
+            soil_types = list(json.load(f).keys())
+    except Exception as e:
+        print(f"Warning: Could not read soil classes for recommendation table: {e}")
+        soil_types = []
+    # The rainfall tab always asks for alluvial soil
+    return soil_types + ['Alluvial Soil']
+
+def _reset_data():
+    global _soil_df, _crop_df, _production_df, _climate_df, crop_df
+    _soil_df = _crop_df = _production_df = _climate_df = None
+    crop_df = _load_crop_df()
+
+def _build_lookup_tables():
+    crop_df = _load_crop_df()
+    production_df = _load_production_df()
+    climate_df = _load_climate_df()
+    soil_df = _load_soil_df()
+    if crop_df.empty or production_df.empty or soil_df.empty or climate_df.empty:
+        _lookup_tables.update({'crop_details': {}, 'profiles': {}, 'scorer': None})
+        return
+    _lookup_tables['crop_details'] = _crop_details_by_id(crop_df)
+    _lookup_tables['profiles'] = _state_profiles(production_df)
+    _lookup_tables['scorer'] = SuitabilityScorer.from_frames(crop_df, soil_df, climate_df)
+
+def build_recommendation_table(force=False):
+    """Precompute recommendations for every (state, soil class) pair.
+
+    The table is rebuilt whenever one of the source data files changes on disk.
+    """
+    global _recommendation_table, _table_version
+    version = _source_version()
+    if not force and version == _table_version:
+        return _recommendation_table
+    with _table_lock:
+        if not force and version == _table_version:
+            return _recommendation_table
+        if _table_version is not None:
+            print("Source data changed, rebuilding recommendation table...")
+            _reset_data()
+        _build_lookup_tables()
+        table = {}
+        scorer = _lookup_tables['scorer']
+        if scorer is not None:
+            state_ids = list(_lookup_tables['profiles'])
+            # First name of each soil class with nutrient data, which its error messages quote
+            soil_types = {}
+            for soil_type in _table_soil_types():
+                if scorer.soil_index(soil_type) is not None:
+                    soil_types.setdefault(soils.id(soil_type), soil_type)
+            # One vectorized pass scores every crop for every (state, soil) pair
+            scores = scorer.score_indices(scorer.state_rows_for(state_ids),
+                                          [scorer.soil_row(soil_id) for soil_id in soil_types])
+            for i, state_id in enumerate(state_ids):
+                for j, (soil_id, soil_type) in enumerate(soil_types.items()):
+                    table[(state_id, soil_id)] = _compute_recommendations(states.name(state_id), soil_type, scores[i, j])
+        _recommendation_table = table
+        _table_version = version
+        print(f"Recommendation table built: {len(table)} entries.")
+    return _recommendation_table
+
+@timed('recommendations')
+def get_recommendations(state_name, soil_type):
+    table = build_recommendation_table()
+    key = _recommendation_key(state_name, soil_type)
+    entry = table.get(key)
+    if entry is None:
+        entry = _compute_recommendations(state_name, soil_type)
+        # Only remember known pairs so arbitrary input cannot grow the table
+        scorer = _lookup_tables['scorer']
+        if key[0] in _lookup_tables['profiles'] and scorer is not None and scorer.soil_row(key[1]) is not None:
+            with _table_lock:
+                table[key] = entry
+    recommendations, error = entry
+    return copy.deepcopy(recommendations), error
+
+# --- BATCH SCORING ---
+def score_matrix(state_names, soil_types):
+    """Suitability scores (0-7) of every crop for each state and soil type.
+
+    Returns an int8 array of shape (len(state_names), len(soil_types), len(scored_crops())).
+    Known states without climate data only receive soil points. Raises
+    ValueError for a bare string instead of a list, for state names the entity
+    registry does not know and for soil types that have no nutrient data.
+    """
+    build_recommendation_table()
+    scorer = _lookup_tables['scorer']
+    if scorer is None:
+        raise ValueError("A required data file is missing.")
+    return scorer.score(state_names, soil_types)
+
+def scored_crops():
+    """Crop labels in the order of the last axis of score_matrix."""
+    build_recommendation_table()
+    scorer = _lookup_tables['scorer']
+    return list(scorer.crop_labels) if scorer is not None else []
+
 # --- EXPOSE GLOBALS FOR app.py ---
 def get_production_df():
     return _load_production_df()
@@ -0,0 +1,94 @@
+"""Staged application startup.
+
+app.py registers its slow startup work (heavy imports, dataset loads, model
+loads with a dummy forward pass) as named stages. They either run inline
+while app.py is imported (AGRIBUDDY_WARMUP=eager, the default) or on a
+background thread (AGRIBUDDY_WARMUP=background), so the server can bind
+and answer /healthz straight away. Requests that need a stage wait for it.
+Each stage records its state and duration for /healthz.
+"""
+import os
+import threading
+import time
+import traceback
+
+WARMUP_MODE = os.environ.get('AGRIBUDDY_WARMUP', 'eager')
+
+
+class Warmup:
+    def __init__(self, started=None):
+        # perf_counter() value that startup times are measured from
+        self.started = started if started is not None else time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, fn):
+        self.stages[name] = {
+            'fn': fn, 'state': 'idle', 'seconds': None, 'finished_at': None,
+            'error': None, 'done': threading.Event(),
+        }
+
+    def _schedule(self, names):
+        with self._lock:
+            names = [name for name in names if self.stages[name]['state'] in ('idle', 'failed')]
+            for name in names:
+                stage = self.stages[name]
+                stage['state'], stage['error'] = 'pending', None
+                stage['done'].clear()
+        return names
+
+    def _run(self, names):
+        for name in names:
+            stage = self.stages[name]
+            stage['state'] = 'running'
+            start = time.perf_counter()
+            try:
+                stage['fn']()
+                stage['state'] = 'done'
+            except Exception as e:
+                print(f"Warning: Startup stage '{name}' failed: {e}")
+                traceback.print_exc()
+                stage['state'], stage['error'] = 'failed', str(e)
+            end = time.perf_counter()
+            stage['seconds'] = round(end - start, 3)
+            stage['finished_at'] = round(end - self.started, 3)
+            print(f"Startup stage '{name}' {stage['state']} in {stage['seconds']:.2f}s")
+            stage['done'].set()
+
+    def run(self, names, background=False):
+        """Run stages in order, inline or on a daemon thread."""
+        names = self._schedule(names)
+        if not names:
+            return
+        if background:
+            threading.Thread(target=self._run, args=(names,), name='warmup', daemon=True).start()
+        else:
+            self._run(names)
+
+    def wait(self, *names, timeout=None):
+        """Block until the named stages have finished; stages that were never
+        scheduled do not block. Returns False on timeout."""
+        for name in names:
+            stage = self.stages.get(name)
+            if stage is not None and stage['state'] != 'idle':
+                if not stage['done'].wait(timeout):
+                    return False
+        return True
+
+    def ready(self):
+        return all(stage['state'] in ('idle', 'done') for stage in self.stages.values())
+
+    def report(self):
+        stages = {
+            name: {'state': stage['state'], 'seconds': stage['seconds'], 'error': stage['error']}
+            for name, stage in self.stages.items()
+        }
+        finished = [s['finished_at'] for s in self.stages.values() if s['finished_at'] is not None]
+        running = any(s['state'] in ('pending', 'running') for s in self.stages.values())
+        return {
+            'mode': WARMUP_MODE,
+            'ready': self.ready(),
+            'uptime_seconds': round(time.perf_counter() - self.started, 3),
+            'ready_after_seconds': max(finished) if finished and not running else None,
+            'stages': stages,
+        }
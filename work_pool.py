@@ -0,0 +1,154 @@
+"""Bounded pool for the CPU-heavy part of requests, with backpressure.
+
+Soil and leaf predictions, rainfall forecasts and recommendations run on a
+WorkPool instead of the request thread. A request thread waits for its task,
+so gunicorn needs more threads than the pool has slots; the spare threads
+keep /healthz and the cached pages answering while the pool is busy.
+
+The pool runs at most `workers` tasks at a time and queues up to `max_queue`
+more. Beyond that, run() raises Overloaded with status 429 straight away. A
+task that is not finished by its deadline raises Overloaded with status 503.
+If it was still queued it is dropped; if it is running it is marked
+cancelled, and long tasks stop at their next check_cancelled(). Both carry a
+Retry-After estimate from the recent task durations.
+
+Configure with AGRIBUDDY_WORKERS (default 2), AGRIBUDDY_QUEUE_DEPTH
+(default 4) and AGRIBUDDY_TASK_TIMEOUT (seconds, default 30).
+"""
+import contextvars
+import math
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+DEFAULT_WORKERS = int(os.environ.get('AGRIBUDDY_WORKERS', '2'))
+DEFAULT_QUEUE_DEPTH = int(os.environ.get('AGRIBUDDY_QUEUE_DEPTH', '4'))
+DEFAULT_TIMEOUT = float(os.environ.get('AGRIBUDDY_TASK_TIMEOUT', '30'))
+MAX_RETRY_AFTER = 60
+# Weight of the latest task in the running mean duration
+DURATION_SMOOTHING = 0.2
+
+_current_task = contextvars.ContextVar('work_pool_task', default=None)
+
+
+class Overloaded(Exception):
+    """The pool refused a task (429) or gave up waiting for it (503)."""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Cancelled(Exception):
+    """Raised inside a task whose caller has stopped waiting for it."""
+
+
+def check_cancelled():
+    """Stop the current pool task if its caller has given up on it; a no-op
+    outside the pool."""
+    task = _current_task.get()
+    if task is not None and task.is_set():
+        raise Cancelled("Task cancelled after its deadline")
+
+
+class WorkPool:
+    def __init__(self, workers=DEFAULT_WORKERS, max_queue=DEFAULT_QUEUE_DEPTH, timeout=DEFAULT_TIMEOUT, name='work'):
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self.timeout = timeout
+        self.name = name
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.mean_seconds = None
+        self._in_flight = 0
+        self._running = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+
+    def _ensure_executor(self):
+        # Created lazily, and again in a forked child, since threads do not survive fork
+        if self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f"pool-{self.name}")
+                self._in_flight = self._running = 0
+                self._pid = os.getpid()
+        return self._executor
+
+    def retry_after(self):
+        """Seconds until a slot is likely to be free, for Retry-After."""
+        mean = self.mean_seconds or 1.0
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(mean * max(1, self._in_flight) / self.workers)))
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and return its result, within
+        `timeout` seconds (default: the pool's) of being submitted.
+
+        The task sees the caller's context variables, so Flask's `g` and the
+        request's Server-Timing stages work inside it."""
+        executor = self._ensure_executor()
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise Overloaded(f"Server busy: {self._in_flight} requests are already being processed. "
+                                 f"Please try again shortly.", 429, self.retry_after())
+            self._in_flight += 1
+        cancelled = threading.Event()
+        try:
+            future = executor.submit(contextvars.copy_context().run, self._call, cancelled, fn, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        future.add_done_callback(self._finished)
+        try:
+            return future.result(timeout=timeout)
+        except (FutureTimeout, CancelledError):
+            cancelled.set()
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise Overloaded(f"The request took longer than {timeout:g}s. Please try again shortly.",
+                             503, self.retry_after())
+
+    def _call(self, cancelled, fn, args, kwargs):
+        if cancelled.is_set():
+            raise Cancelled("Task cancelled before it started")
+        _current_task.set(cancelled)
+        with self._lock:
+            self._running += 1
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                if self.mean_seconds is None:
+                    self.mean_seconds = seconds
+                else:
+                    self.mean_seconds += DURATION_SMOOTHING * (seconds - self.mean_seconds)
+
+    def _finished(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'running': self._running,
+                'queued': self._in_flight - self._running,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'mean_seconds': round(self.mean_seconds, 4) if self.mean_seconds is not None else None,
+            }
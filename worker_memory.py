@@ -0,0 +1,60 @@
+"""Per-process memory report for gunicorn workers (Linux only).
+
+RSS counts every resident page, including pages shared with the master and
+the other workers. PSS divides shared pages among the processes that map
+them, so the sum of PSS is the real memory cost of the whole server.
+
+    python worker_memory.py <gunicorn master pid>
+"""
+import sys
+
+
+def memory_stats(pid='self'):
+    """RSS, PSS, shared and private memory of a process in KiB."""
+    stats = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    stats[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        'rss': stats.get('Rss', 0),
+        'pss': stats.get('Pss', 0),
+        'shared': stats.get('Shared_Clean', 0) + stats.get('Shared_Dirty', 0),
+        'private': stats.get('Private_Clean', 0) + stats.get('Private_Dirty', 0),
+    }
+
+
+def format_stats(stats):
+    return ', '.join(f"{key}={value / 1024:.1f}MiB" for key, value in stats.items())
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", 'r') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def main(argv):
+    if len(argv) != 2:
+        print(__doc__.strip().splitlines()[-1].strip())
+        return 2
+    master = int(argv[1])
+    total_pss = 0
+    for role, pid in [('master', master)] + [('worker', p) for p in _children(master)]:
+        stats = memory_stats(pid)
+        if stats is None:
+            continue
+        total_pss += stats['pss']
+        print(f"{role:<7} {pid:>7}  {format_stats(stats)}")
+    print(f"total PSS {total_pss / 1024:.1f}MiB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
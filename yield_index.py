@@ -0,0 +1,150 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from datacache import load_frame
+from entities import crops, states, UNKNOWN
+
+
+class YieldIndex:
+    """Mean yields per crop, nationally and per state, from merged_crop_data.csv.
+
+    Crops and states are encoded to their entities.py IDs when the index is
+    built, so `national` is an array indexed by crop ID and `by_state` one
+    indexed by (state ID, crop ID); NaN where there is no yield. Crop names
+    the registry does not know are left out.
+    """
+
+    def __init__(self, national=None, by_state=None, source=None):
+        self.national = np.asarray(national if national is not None else [], dtype=np.float64)
+        self.by_state = np.asarray(by_state if by_state is not None else np.empty((0, len(self.national))),
+                                   dtype=np.float64)
+        self.source = source
+
+    @classmethod
+    def from_frame(cls, merged_df, source=None):
+        if merged_df.empty or not {'Crop', 'Yield', 'State_Name'}.issubset(merged_df.columns):
+            return cls(source=source)
+        crop_ids = crops.encode(merged_df['Crop'])
+        state_ids = states.encode(merged_df['State_Name'], add=True)
+        yields = pd.to_numeric(merged_df['Yield'], errors='coerce').to_numpy(dtype=np.float64)
+        valid = (crop_ids != UNKNOWN) & ~np.isnan(yields)
+        n_crops, n_states = len(crops), len(states)
+        national = _means(crop_ids[valid], yields[valid], n_crops)
+        in_state = valid & (state_ids != UNKNOWN)
+        cells = state_ids[in_state].astype(np.int64) * n_crops + crop_ids[in_state]
+        by_state = _means(cells, yields[in_state], n_states * n_crops).reshape(n_states, n_crops)
+        return cls(national, by_state, source)
+
+    def national_yield(self, crop_id):
+        return self.yields(None, [crop_id])[1][0]
+
+    def state_yield(self, state_id, crop_id):
+        return self.yields(state_id, [crop_id])[0][0]
+
+    def yields(self, state_id, crop_ids):
+        """(state yields, national yields) of the crop IDs, as lists; NaN for
+        unknown IDs (None, UNKNOWN, or crops added after the index was built).
+        Callers pass the handful of crops of one recommendation, for which
+        plain indexing is cheaper than building arrays."""
+        n_crops = len(self.national)
+        row = self.by_state[state_id] if state_id is not None and 0 <= state_id < len(self.by_state) else None
+        state, national = [], []
+        for crop_id in crop_ids:
+            if crop_id is not None and 0 <= crop_id < n_crops:
+                national.append(float(self.national[crop_id]))
+                state.append(float(row[crop_id]) if row is not None else np.nan)
+            else:
+                national.append(np.nan)
+                state.append(np.nan)
+        return state, national
+
+    def save(self, path):
+        # Stored by name: IDs of crops and states added from the data depend on load order
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        n_states, n_crops = self.by_state.shape
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'source': self.source,
+                'crops': crops.names[:n_crops],
+                'states': states.names[:n_states],
+                'national': _nulls(self.national),
+                'by_state': [_nulls(row) for row in self.by_state],
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        crop_ids = crops.ids(data['crops'])
+        if any(crop_id != UNKNOWN and crops.name(crop_id) != name for name, crop_id in zip(data['crops'], crop_ids)):
+            # Saved before some of its crops became aliases of others; rebuild it
+            raise ValueError("built with older crop names")
+        state_ids = np.array([states.add(name) for name in data['states']], dtype=np.int32)
+        national = np.full(len(crops), np.nan)
+        by_state = np.full((len(states), len(crops)), np.nan)
+        known = crop_ids != UNKNOWN
+        national[crop_ids[known]] = np.array(data['national'], dtype=np.float64)[known]
+        if len(state_ids):
+            saved = np.array(data['by_state'], dtype=np.float64).reshape(len(state_ids), len(crop_ids))
+            by_state[np.ix_(state_ids, crop_ids[known])] = saved[:, known]
+        return cls(national, by_state, data.get('source'))
+
+
+def _means(keys, values, size):
+    counts = np.bincount(keys, minlength=size)
+    sums = np.bincount(keys, weights=values, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def _nulls(values):
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def _source_signature(csv_path):
+    st = os.stat(csv_path)
+    return [os.path.basename(csv_path), st.st_mtime_ns, st.st_size]
+
+
+def build_yield_index(csv_path, cache_path=None):
+    """Load the yield index from cache_path, rebuilding it if the CSV changed.
+
+    Only the State_Name, Crop and Yield columns are read from the data
+    cache, and the frame is dropped as soon as the index is built.
+    """
+    try:
+        signature = _source_signature(csv_path)
+    except OSError as e:
+        print(f"Warning: Failed to load merged_crop_data.csv: {e}")
+        return YieldIndex()
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            index = YieldIndex.load(cache_path)
+            if index.source == signature:
+                print("Yield index loaded from cache.")
+                return index
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable yield index cache: {e}")
+
+    try:
+        merged_df = load_frame(csv_path, columns=('State_Name', 'Crop', 'Yield'))
+    except Exception as e:
+        print(f"Warning: Failed to load merged_crop_data.csv: {e}")
+        return YieldIndex()
+    index = YieldIndex.from_frame(merged_df, source=signature)
+    del merged_df
+    print(f"Yield index built: {int((~np.isnan(index.national)).sum())} crops, "
+          f"{int((~np.isnan(index.by_state)).any(axis=1).sum())} states.")
+
+    if cache_path:
+        try:
+            index.save(cache_path)
+        except OSError as e:
+            print(f"Warning: Could not save yield index cache: {e}")
+    return index